@@ -1026,7 +1026,8 @@ async function renderPaginaActual({ fueCambioDePagina = false } = {}) {
     real.addEventListener("play", () => {
       if (window.PZ && PZ.trackVideoView) PZ.trackVideoView(entry.nombre, { club: entry.loc || null, cancha: entry.can || null, lado: entry.lado || null });
     });
-    const preview = createPreviewOverlay(entry.url, entry.duracion || 60, card, entry.poster_url);
+    // preview_url: rendición 480p liviana que genera la ingesta; el real sigue siendo el 1080p.
+    const preview = createPreviewOverlay(entry.preview_url || entry.url, entry.duracion || 60, card, entry.poster_url);
     preview.style.width = "100%"; preview.style.borderRadius = "8px";
     wrap.appendChild(real); wrap.appendChild(preview); card.appendChild(wrap);
 
@@ -21,11 +21,15 @@ el caso "seguir la jugada"). 1 keyframe = encuadre fijo.
 """
 import os, sys, json, re, subprocess, tempfile, datetime, urllib.parse
 
-import requests
 import dropbox
 import firebase_admin
 from firebase_admin import credentials, firestore
 
+from dropbox_client import get_client, api_usage_summary
+from dropbox_transfer import http_download_to_file, upload_file
+from media_probe import probe
+from index_dispatch import Despachador
+
 DROPBOX_BASE = "/Puntazo/Locaciones"
 GITHUB_REPO = "isaacsaltiel/puntazo_web_v2"
 MAX_PER_RUN = 8
@@ -44,17 +48,11 @@ def init_firestore():
 
 # ── Dropbox ────────────────────────────────────────────────
 def connect_dropbox():
-    return dropbox.Dropbox(
-        app_key=os.environ["DROPBOX_APP_KEY"],
-        app_secret=os.environ["DROPBOX_APP_SECRET"],
-        oauth2_refresh_token=os.environ["DROPBOX_REFRESH_TOKEN"],
-    )
+    return get_client()
 
 
 def dbx_upload(dbx, local_path, dropbox_path):
-    with open(local_path, "rb") as f:
-        dbx.files_upload(f.read(), dropbox_path,
-                         mode=dropbox.files.WriteMode("overwrite"))
+    upload_file(dbx, local_path, dropbox_path)
     try:
         link = dbx.sharing_create_shared_link_with_settings(dropbox_path)
         url = link.url
@@ -73,12 +71,8 @@ def dbx_upload(dbx, local_path, dropbox_path):
 
 # ── ffmpeg helpers ─────────────────────────────────────────
 def ffprobe_dims(path):
-    out = subprocess.check_output([
-        "ffprobe", "-v", "error", "-select_streams", "v:0",
-        "-show_entries", "stream=width,height", "-of", "csv=p=0:s=x", path
-    ]).decode().strip()
-    w, h = out.split("x")[:2]
-    return int(w), int(h)
+    d = probe(path)
+    return int(d["width"]), int(d["height"])
 
 
 def lerp_expr(points, var="t"):
@@ -145,16 +139,13 @@ def render(src_path, out_path, trim_in, trim_out, reframe):
 
 
 # ── Indexación (reusa el workflow existente) ───────────────
-def dispatch_index(loc, can, lado):
-    pat = os.environ.get("PAT_GITHUB")
-    if not pat:
-        log("[WARN] sin PAT_GITHUB; omito dispatch de índice"); return
-    requests.post(
-        f"https://api.github.com/repos/{GITHUB_REPO}/dispatches",
-        headers={"Authorization": "token " + pat, "Accept": "application/vnd.github+json"},
-        json={"event_type": "gestionar_indice", "client_payload": {"loc": loc, "can": can, "lado": lado}},
-        timeout=30,
-    )
+# Un pedido por clip editado; los lados se agrupan y salen en un solo dispatch
+# (ver index_dispatch.py). Lo que quede pendiente se emite al final de main().
+DESPACHO = Despachador(GITHUB_REPO)
+
+
+def dispatch_index(loc, can, lado, name=""):
+    DESPACHO.pedir(loc, can, lado, name)
 
 
 # ── Main ───────────────────────────────────────────────────
@@ -174,8 +165,7 @@ def process_doc(db, dbx, doc):
     tmp = tempfile.mkdtemp()
     src = os.path.join(tmp, "src.mp4"); out = os.path.join(tmp, "out.mp4")
     try:
-        r = requests.get(src_url, timeout=120); r.raise_for_status()
-        with open(src, "wb") as f: f.write(r.content)
+        http_download_to_file(src_url, src)
         render(src, out, tin, tout, d.get("reframe") or {})
 
         now = datetime.datetime.now()
@@ -187,7 +177,7 @@ def process_doc(db, dbx, doc):
         ref.update({"status": "done", "result_video_url": url, "result_name": name,
                     "consumed_at": firestore.SERVER_TIMESTAMP,
                     "state_updated_at": firestore.SERVER_TIMESTAMP})
-        dispatch_index(club, court, lado)
+        dispatch_index(club, court, lado, name)
         log(f"[OK] {doc.id} -> {name}")
     except subprocess.CalledProcessError as e:
         ref.update({"status": "error", "error_reason": "ffmpeg_failed"}); log("[ERR] ffmpeg", e)
@@ -200,11 +190,16 @@ def main():
     q = db.collection("clip_edits").where("status", "==", "pending").limit(MAX_PER_RUN)
     docs = list(q.stream())
     log(f"pending clip_edits: {len(docs)}")
-    for doc in docs:
-        try:
-            process_doc(db, dbx, doc)
-        except Exception as e:
-            log("[ERR doc]", doc.id, e)
+    try:
+        for doc in docs:
+            try:
+                process_doc(db, dbx, doc)
+            except Exception as e:
+                log("[ERR doc]", doc.id, e)
+    finally:
+        DESPACHO.vaciar()   # lo pendiente de la ventana no puede morir con el runner
+    log(DESPACHO.resumen())
+    log(api_usage_summary())
     log("done")
 
 
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+dropbox_client.py — Cliente Dropbox compartido por todos los scripts del pipeline.
+
+  - Un solo cliente por proceso (get_client) con pool de conexiones keep-alive:
+    sin handshakes TLS repetidos por clip ni por llamada.
+  - Auth con refresh token: el SDK renueva el access token cuando expira, así que
+    sirve para corridas largas (supervisor ~5h48m) sin token de vida corta fijo.
+  - Reintentos: 429 respetando Retry-After y 5xx con backoff (SDK) + errores de
+    red (conexión/timeout) con backoff exponencial, solo en rutas idempotentes: si
+    se perdió la respuesta de un upload/borrado/movida/link, repetirlo devolvería
+    conflict/not_found por algo que sí salió. Esas rutas (NO_IDEMPOTENTES) propagan
+    el error de red y quien llama decide (dropbox_transfer retoma por offset).
+  - Conteo de llamadas a la API por ruta durante la corrida (api_usage_summary).
+
+Env:
+  DROPBOX_APP_KEY / DROPBOX_APP_SECRET / DROPBOX_REFRESH_TOKEN
+  DBX_MAX_CONNECTIONS      -> tamaño del pool keep-alive (default 16)
+  DBX_RETRIES_ON_ERROR     -> reintentos en 5xx y errores de red (default 5)
+  DBX_RETRIES_ON_RATELIMIT -> reintentos en 429 (default 10)
+"""
+import os
+import time
+import random
+from collections import Counter
+from threading import Lock
+
+import requests
+import dropbox
+
+MAX_CONNECTIONS       = int(os.environ.get("DBX_MAX_CONNECTIONS", "16"))
+RETRIES_ON_ERROR      = int(os.environ.get("DBX_RETRIES_ON_ERROR", "5"))
+RETRIES_ON_RATELIMIT  = int(os.environ.get("DBX_RETRIES_ON_RATELIMIT", "10"))
+
+# Rutas que cambian estado y no se pueden repetir a ciegas tras una respuesta perdida
+NO_IDEMPOTENTES = frozenset({
+    "files/upload", "files/upload_session/append_v2", "files/upload_session/finish",
+    "files/upload_session/finish_batch_v2",
+    "files/delete_v2", "files/delete_batch", "files/copy_v2", "files/copy_batch_v2",
+    "files/move_v2", "files/move_batch_v2", "files/create_folder_v2",
+    "sharing/create_shared_link_with_settings",
+})
+
+_lock = Lock()
+_client = None
+_calls = Counter()     # ruta → requests HTTP (incluye reintentos)
+_events = Counter()    # rate_limit / server_error / network_error / refresh
+
+
+class PuntazoDropbox(dropbox.Dropbox):
+    """dropbox.Dropbox que cuenta cada request y reintenta errores de red."""
+
+    def request_json_string(self, host, func_name, *args, **kwargs):
+        with _lock:
+            _calls[func_name] += 1
+        try:
+            return super().request_json_string(host, func_name, *args, **kwargs)
+        except dropbox.exceptions.RateLimitError:
+            with _lock:
+                _events["rate_limit"] += 1
+            raise
+        except dropbox.exceptions.InternalServerError:
+            with _lock:
+                _events["server_error"] += 1
+            raise
+
+    def request_json_string_with_retry(self, host, route_name, *args, **kwargs):
+        if route_name in NO_IDEMPOTENTES:
+            return super().request_json_string_with_retry(host, route_name, *args, **kwargs)
+        return _retry_network(super().request_json_string_with_retry, host, route_name, *args, **kwargs)
+
+    def refresh_access_token(self, *args, **kwargs):
+        with _lock:
+            _events["refresh"] += 1
+        return _retry_network(super().refresh_access_token, *args, **kwargs)
+
+
+def _retry_network(fn, *args, **kwargs):
+    """Reintenta `fn` ante errores de conexión/timeout con backoff exponencial."""
+    attempt = 0
+    while True:
+        try:
+            return fn(*args, **kwargs)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            attempt += 1
+            with _lock:
+                _events["network_error"] += 1
+            if attempt > RETRIES_ON_ERROR:
+                raise
+            time.sleep(min(2 ** attempt * random.random(), 30))
+
+
+def get_client() -> PuntazoDropbox:
+    """Cliente compartido del proceso (se crea en la primera llamada)."""
+    global _client
+    with _lock:
+        if _client is None:
+            _client = PuntazoDropbox(
+                app_key=os.environ["DROPBOX_APP_KEY"],
+                app_secret=os.environ["DROPBOX_APP_SECRET"],
+                oauth2_refresh_token=os.environ["DROPBOX_REFRESH_TOKEN"],
+                session=dropbox.create_session(max_connections=MAX_CONNECTIONS),
+                max_retries_on_error=RETRIES_ON_ERROR,
+                max_retries_on_rate_limit=RETRIES_ON_RATELIMIT,
+            )
+        return _client
+
+
+def api_calls() -> dict:
+    with _lock:
+        return dict(_calls)
+
+
+def api_usage_summary() -> str:
+    """Una línea con el total de llamadas, eventos y las rutas más usadas."""
+    with _lock:
+        total = sum(_calls.values())
+        top = ", ".join(f"{r}={n}" for r, n in _calls.most_common(6))
+        ev = " ".join(f"{k}={v}" for k, v in sorted(_events.items()))
+    return f"Dropbox API: {total} llamadas ({top or '—'}){' | ' + ev if ev else ''}"
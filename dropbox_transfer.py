@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+dropbox_transfer.py — Transferencias por streaming compartidas por los pipelines
+(procesar_videos_ffmpeg.py, clip_edit_ci.py).
+
+  - Descargas: se escriben a disco por chunks, nunca se carga el clip completo en RAM.
+  - Subidas: upload session de Dropbox con chunks acotados (sirve para >150 MB),
+    reanudando desde el offset que reporta Dropbox si un chunk falla.
+  - Verificación final: tamaño y content_hash de Dropbox contra el archivo local.
+
+La memoria pico es ~CHUNK_SIZE por transferencia, sin importar el tamaño del clip.
+
+Env:
+  DBX_CHUNK_MB       -> tamaño de chunk para subir/bajar (default 8)
+  DBX_MAX_RETRIES    -> reintentos por chunk antes de abortar (default 5)
+"""
+import os
+import time
+import hashlib
+from pathlib import Path
+
+import requests
+import dropbox
+
+CHUNK_SIZE  = int(os.environ.get("DBX_CHUNK_MB", "8")) * 1024 * 1024
+MAX_RETRIES = int(os.environ.get("DBX_MAX_RETRIES", "5"))
+
+# Bloque fijo del algoritmo content_hash de Dropbox (no configurable).
+DROPBOX_HASH_BLOCK = 4 * 1024 * 1024
+
+
+class TransferError(RuntimeError):
+    pass
+
+
+def dropbox_content_hash(path: Path) -> str:
+    """content_hash de Dropbox: sha256 de la concatenación de sha256 por bloques de 4 MB."""
+    overall = hashlib.sha256()
+    with Path(path).open("rb") as f:
+        for block in iter(lambda: f.read(DROPBOX_HASH_BLOCK), b""):
+            overall.update(hashlib.sha256(block).digest())
+    return overall.hexdigest()
+
+
+def dropbox_content_hash_bytes(data: bytes) -> str:
+    """Igual que dropbox_content_hash, para contenido en memoria."""
+    overall = hashlib.sha256()
+    for i in range(0, len(data), DROPBOX_HASH_BLOCK):
+        overall.update(hashlib.sha256(data[i:i + DROPBOX_HASH_BLOCK]).digest())
+    return overall.hexdigest()
+
+
+def _write_stream(chunks, dest: Path) -> int:
+    dest = Path(dest)
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    written = 0
+    with dest.open("wb") as f:
+        for chunk in chunks:
+            if chunk:
+                f.write(chunk)
+                written += len(chunk)
+    return written
+
+
+def download_to_file(dbx: dropbox.Dropbox, dropbox_path: str, dest: Path):
+    """Descarga `dropbox_path` a `dest` por chunks. Devuelve el FileMetadata."""
+    md, resp = dbx.files_download(dropbox_path)
+    try:
+        written = _write_stream(resp.iter_content(chunk_size=CHUNK_SIZE), dest)
+    finally:
+        resp.close()
+    if md.size is not None and written != md.size:
+        raise TransferError(f"descarga incompleta de {dropbox_path}: {written}/{md.size} bytes")
+    return md
+
+
+def http_download_to_file(url: str, dest: Path, timeout: int = 120) -> int:
+    """Descarga una URL (p.ej. link raw de Dropbox) a `dest` por chunks. Devuelve bytes escritos."""
+    with requests.get(url, stream=True, timeout=timeout) as r:
+        r.raise_for_status()
+        written = _write_stream(r.iter_content(chunk_size=CHUNK_SIZE), dest)
+        expected = r.headers.get("Content-Length")
+    if expected and not r.headers.get("Content-Encoding") and written != int(expected):
+        raise TransferError(f"descarga incompleta de {url}: {written}/{expected} bytes")
+    return written
+
+
+def _correct_offset(err) -> int | None:
+    """Si Dropbox rechazó un chunk por offset incorrecto, devuelve el offset que espera."""
+    e = getattr(err, "error", None)
+    # append_v2 → UploadSessionAppendError; finish → UploadSessionFinishError.lookup_failed
+    if hasattr(e, "is_lookup_failed") and e.is_lookup_failed():
+        e = e.get_lookup_failed()
+    if hasattr(e, "is_incorrect_offset") and e.is_incorrect_offset():
+        return e.get_incorrect_offset().correct_offset
+    return None
+
+
+def _ya_subido(dbx: dropbox.Dropbox, dropbox_path: str, local_path: Path, size: int):
+    """
+    FileMetadata si `dropbox_path` ya es exactamente `local_path` (mismo tamaño y
+    content_hash); None si no. Sirve cuando un finish reintentado tras perder la
+    respuesta choca con la sesión ya cerrada: el primero sí llegó.
+    """
+    try:
+        md = dbx.files_get_metadata(dropbox_path)
+    except dropbox.exceptions.ApiError:
+        return None
+    if getattr(md, "size", None) == size and getattr(md, "content_hash", None) == dropbox_content_hash(local_path):
+        return md
+    return None
+
+
+def _with_retries(fn, what: str):
+    delay = 1.0
+    for attempt in range(1, MAX_RETRIES + 1):
+        try:
+            return fn()
+        except (requests.exceptions.RequestException, dropbox.exceptions.InternalServerError,
+                dropbox.exceptions.RateLimitError) as e:
+            if attempt == MAX_RETRIES:
+                raise TransferError(f"{what} falló tras {MAX_RETRIES} intentos: {e}") from e
+            wait = getattr(e, "backoff", None) or delay
+            time.sleep(wait)
+            delay = min(delay * 2, 30)
+
+
+def upload_file(dbx: dropbox.Dropbox, local_path: Path, dropbox_path: str,
+                mode=dropbox.files.WriteMode.overwrite):
+    """
+    Sube `local_path` a `dropbox_path` con upload session (o files_upload si cabe en
+    un chunk), reanudando chunks fallidos. Verifica tamaño y content_hash al final.
+    Devuelve el FileMetadata.
+    """
+    local_path = Path(local_path)
+    size = local_path.stat().st_size
+
+    with local_path.open("rb") as f:
+        if size <= CHUNK_SIZE:
+            data = f.read()
+            md = _with_retries(lambda: dbx.files_upload(data, dropbox_path, mode=mode),
+                               f"upload {dropbox_path}")
+        else:
+            first = f.read(CHUNK_SIZE)
+            start = _with_retries(lambda: dbx.files_upload_session_start(first),
+                                  f"session_start {dropbox_path}")
+            cursor = dropbox.files.UploadSessionCursor(session_id=start.session_id, offset=f.tell())
+            commit = dropbox.files.CommitInfo(path=dropbox_path, mode=mode)
+            md = None
+            while md is None:
+                f.seek(cursor.offset)
+                chunk = f.read(CHUNK_SIZE)
+                last = cursor.offset + len(chunk) >= size
+                try:
+                    if last:
+                        md = _with_retries(lambda: dbx.files_upload_session_finish(chunk, cursor, commit),
+                                           f"session_finish {dropbox_path}")
+                    else:
+                        _with_retries(lambda: dbx.files_upload_session_append_v2(chunk, cursor),
+                                      f"session_append {dropbox_path}@{cursor.offset}")
+                        cursor.offset += len(chunk)
+                except dropbox.exceptions.ApiError as e:
+                    # Un reintento que sí llegó a Dropbox deja el offset adelantado:
+                    # se reanuda desde donde Dropbox dice que va. Un finish repetido
+                    # cuyo primer intento ya cerró la sesión cuenta si el archivo quedó igual.
+                    correct = _correct_offset(e)
+                    if correct is None:
+                        md = _ya_subido(dbx, dropbox_path, local_path, size) if last else None
+                        if md is None:
+                            raise
+                        continue
+                    cursor.offset = correct
+
+    if md.size != size:
+        raise TransferError(f"tamaño no coincide en {dropbox_path}: {md.size} != {size}")
+    if md.content_hash and md.content_hash != dropbox_content_hash(local_path):
+        raise TransferError(f"content_hash no coincide en {dropbox_path}")
+    return md
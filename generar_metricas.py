@@ -3,13 +3,11 @@ import os, re, json, hashlib, base64
 from datetime import datetime, timezone
 from zoneinfo import ZoneInfo
 
-import dropbox
 from github import Github
 
+from storage import get_storage, Archivo
+
 # ========= Configuración =========
-DROPBOX_APP_KEY = os.environ["DROPBOX_APP_KEY"]
-DROPBOX_APP_SECRET = os.environ["DROPBOX_APP_SECRET"]
-DROPBOX_REFRESH_TOKEN = os.environ["DROPBOX_REFRESH_TOKEN"]
 GITHUB_TOKEN = os.environ.get("PAT_GITHUB")  # requerido para subir al repo
 
 DROPBOX_BASE = "/Puntazo/Locaciones"
@@ -26,15 +24,11 @@ TZ_MX = ZoneInfo("America/Mexico_City")
 def ensure_local_path(path: str):
     os.makedirs(os.path.dirname(path), exist_ok=True)
 
-def connect_dropbox():
-    return dropbox.Dropbox(
-        app_key=DROPBOX_APP_KEY,
-        app_secret=DROPBOX_APP_SECRET,
-        oauth2_refresh_token=DROPBOX_REFRESH_TOKEN
-    )
+def connect_storage():
+    return get_storage()
 
-def dropbox_upload_bytes(dbx, content_bytes: bytes, path: str):
-    dbx.files_upload(content_bytes, path, mode=dropbox.files.WriteMode("overwrite"))
+def storage_upload_bytes(st, content_bytes: bytes, path: str):
+    st.subir_bytes(content_bytes, path)
 
 def gh_repo():
     if not GITHUB_TOKEN: return None
@@ -66,12 +60,12 @@ def read_seen_ids():
             return set(ln.strip() for ln in txt.splitlines() if ln.strip())
     return set()
 
-def write_seen_ids(dbx, ids_set):
+def write_seen_ids(st, ids_set):
     text = "\n".join(sorted(ids_set)) + ("\n" if ids_set else "")
     ensure_local_path(SEEN_IDS_PATH)
     with open(SEEN_IDS_PATH, "w", encoding="utf-8") as f:
         f.write(text)
-    dropbox_upload_bytes(dbx, text.encode("utf-8"), f"{DROPBOX_METRICS_DIR}/videos_seen_ids.txt")
+    storage_upload_bytes(st, text.encode("utf-8"), f"{DROPBOX_METRICS_DIR}/videos_seen_ids.txt")
     repo = gh_repo()
     if repo:
         _, sha = gh_get_text(repo, SEEN_IDS_PATH)
@@ -89,11 +83,11 @@ def read_metrics_csv():
             return txt or header
     return header
 
-def write_metrics_csv(dbx, text):
+def write_metrics_csv(st, text):
     ensure_local_path(METRICS_CSV_PATH)
     with open(METRICS_CSV_PATH, "w", encoding="utf-8") as f:
         f.write(text)
-    dropbox_upload_bytes(dbx, text.encode("utf-8"), f"{DROPBOX_METRICS_DIR}/videos_log.csv")
+    storage_upload_bytes(st, text.encode("utf-8"), f"{DROPBOX_METRICS_DIR}/videos_log.csv")
     repo = gh_repo()
     if repo:
         _, sha = gh_get_text(repo, METRICS_CSV_PATH)
@@ -166,12 +160,12 @@ def compute_stats_from_csv(csv_text: str):
         "generated_at_utc": datetime.now(timezone.utc).isoformat()
     }
 
-def write_metrics_stats(dbx, stats_obj):
+def write_metrics_stats(st, stats_obj):
     text = json.dumps(stats_obj, ensure_ascii=False, indent=2)
     ensure_local_path(METRICS_JSON_PATH)
     with open(METRICS_JSON_PATH, "w", encoding="utf-8") as f:
         f.write(text)
-    dropbox_upload_bytes(dbx, text.encode("utf-8"), f"{DROPBOX_METRICS_DIR}/videos_stats.json")
+    storage_upload_bytes(st, text.encode("utf-8"), f"{DROPBOX_METRICS_DIR}/videos_stats.json")
     repo = gh_repo()
     if repo:
         _, sha = gh_get_text(repo, METRICS_JSON_PATH)
@@ -183,28 +177,25 @@ def stable_id(loc, can, lado, nombre):
 
 # ========= Lógica principal =========
 def main():
-    dbx = connect_dropbox()
+    st = connect_storage()
 
     # 1) Listado completo (recursivo) bajo /Puntazo/Locaciones
-    print("[INFO] Listando Dropbox recursivamente…")
-    res = dbx.files_list_folder(DROPBOX_BASE, recursive=True)
-    entries = res.entries[:]
-    while res.has_more:
-        res = dbx.files_list_folder_continue(res.cursor)
-        entries += res.entries
+    print(f"[INFO] Listando {st.nombre} recursivamente…")
+    entries, _ = st.listar(DROPBOX_BASE, recursivo=True)
 
     # 2) Filtrar solo archivos .mp4 en hojas /{loc}/{can}/{lado}/file.mp4
     mp4s = []
     pat = re.compile(r"^/Puntazo/Locaciones/([^/]+)/([^/]+)/([^/]+)/([^/]+\.mp4)$", re.IGNORECASE)
     for e in entries:
-        if isinstance(e, dropbox.files.FileMetadata) and e.name.lower().endswith(".mp4"):
-            m = pat.match(e.path_lower)
+        if (isinstance(e, Archivo) and e.name.lower().endswith(".mp4")
+                and not e.name.lower().endswith(".preview.mp4")):
+            m = pat.match(e.ruta)
             if not m: 
                 continue
             loc, can, lado, _fname = m.group(1), m.group(2), m.group(3), m.group(4)
             mp4s.append((loc, can, lado, e))
 
-    print(f"[INFO] Videos detectados en Dropbox: {len(mp4s)}")
+    print(f"[INFO] Videos detectados en {st.nombre}: {len(mp4s)}")
 
     # 3) Cargar CSV e índice
     existing_csv = read_metrics_csv()
@@ -231,9 +222,9 @@ def main():
     if new_rows:
         lines.extend(new_rows)
         merged_csv = "\n".join(lines) + "\n"
-        write_metrics_csv(dbx, merged_csv)
+        write_metrics_csv(st, merged_csv)
         seen_ids.update(new_ids)
-        write_seen_ids(dbx, seen_ids)
+        write_seen_ids(st, seen_ids)
         csv_for_stats = merged_csv
         print(f"[OK] CSV actualizado: +{len(new_rows)} filas nuevas")
     else:
@@ -242,8 +233,9 @@ def main():
 
     # 5) Stats ordenadas y publicación
     stats = compute_stats_from_csv(csv_for_stats)
-    write_metrics_stats(dbx, stats)
+    write_metrics_stats(st, stats)
     print("[OK] Métricas generadas y publicadas (CSV + JSON).")
+    print(f"[INFO] {st.resumen()}")
 
 if __name__ == "__main__":
     main()
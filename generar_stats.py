@@ -19,9 +19,9 @@ import sys
 from collections import defaultdict
 from datetime import datetime, timezone
 from io import StringIO
-from github import Github, Auth
 
-GITHUB_TOKEN = os.environ.get("PAT_GITHUB")
+from github_publisher import Publicador
+
 GITHUB_REPO  = "isaacsaltiel/puntazo_web_v2"
 CONFIG_PATH  = "data/config_locations.json"
 LOG_PATH     = "data/metrics/videos_log.csv"
@@ -30,48 +30,21 @@ INDEX_PATH   = "data/videos_index.json"
 
 
 # ── GitHub helpers ────────────────────────────────────────────
-def get_repo():
-    if not GITHUB_TOKEN:
-        return None
-    return Github(auth=Auth.Token(GITHUB_TOKEN)).get_repo(GITHUB_REPO)
-
-
-def read_file_from_github(path: str, repo=None) -> str | None:
-    if repo:
-        try:
-            c = repo.get_contents(path, ref=repo.default_branch)
-            return c.decoded_content.decode("utf-8")
-        except Exception as e:
-            print(f"[WARN] GitHub read {path}: {e}")
+def read_file_from_github(path: str, pub: Publicador) -> str | None:
+    content = pub.leer(path)
+    if content is not None:
+        return content
     if os.path.exists(path):
         with open(path, encoding="utf-8") as f:
             return f.read()
     return None
 
 
-def upload_to_github(content: str, path: str, message: str, repo=None):
-    if not repo:
-        print("[WARN] Sin repo GitHub — no se sube archivo.")
-        return
-    branch = repo.default_branch
-    try:
-        existing = repo.get_contents(path, ref=branch)
-        repo.update_file(existing.path, message, content, existing.sha, branch=branch)
-        print(f"[OK] {path} actualizado")
-    except Exception as e:
-        if "404" in str(e):
-            repo.create_file(path, message, content, branch=branch)
-            print(f"[OK] {path} creado")
-        else:
-            print(f"[ERROR] upload {path}: {e}")
-
-
-def save_local_and_upload(content: str, local_path: str, github_path: str, msg: str, repo=None):
+def save_local(content: str, local_path: str):
     os.makedirs(os.path.dirname(local_path), exist_ok=True)
     with open(local_path, "w", encoding="utf-8") as f:
         f.write(content)
     print(f"[DEBUG] Guardado local: {local_path}")
-    upload_to_github(content, github_path, msg, repo)
 
 
 # ── CSV helper ────────────────────────────────────────────────
@@ -103,17 +76,17 @@ def aggregate_log(rows):
 # ── Main ──────────────────────────────────────────────────────
 def main():
     print("[stats] Generando stats_summary.json y videos_index.json…")
-    repo     = get_repo()
+    pub      = Publicador(GITHUB_REPO)
     now_iso  = datetime.now(timezone.utc).isoformat()
 
     # ── 1. Config ────────────────────────────────────────────
-    cfg_raw = read_file_from_github(CONFIG_PATH, repo)
+    cfg_raw = read_file_from_github(CONFIG_PATH, pub)
     if not cfg_raw:
         print("[ERROR] No se pudo leer config_locations.json"); sys.exit(1)
     config = json.loads(cfg_raw)
 
     # ── 2. Log CSV (histórico) ────────────────────────────────
-    log_raw = read_file_from_github(LOG_PATH, repo)
+    log_raw = read_file_from_github(LOG_PATH, pub)
     log_rows = parse_log_csv(log_raw) if log_raw else []
     historial = aggregate_log(log_rows)
     print(f"[stats] {len(log_rows)} filas en videos_log.csv")
@@ -161,12 +134,12 @@ def main():
                 base_path   = f"data/Locaciones/{loc_id}/{can_id}/{lado_id}"
 
                 # Leer recientes
-                rec_raw  = read_file_from_github(f"{base_path}/videos_recientes.json", repo)
+                rec_raw  = read_file_from_github(f"{base_path}/videos_recientes.json", pub)
                 rec_data = json.loads(rec_raw) if rec_raw else {}
                 rec_vids = rec_data.get("videos", [])
 
                 # Leer vitrina
-                vit_raw  = read_file_from_github(f"{base_path}/videos_vitrina.json", repo)
+                vit_raw  = read_file_from_github(f"{base_path}/videos_vitrina.json", pub)
                 vit_data = json.loads(vit_raw) if vit_raw else {}
                 vit_vids = vit_data.get("videos", [])
 
@@ -211,10 +184,8 @@ def main():
 
     # ── 4. Guardar stats_summary.json ─────────────────────────
     stats_content = json.dumps(summary, indent=2, ensure_ascii=False)
-    save_local_and_upload(
-        stats_content, STATS_PATH, STATS_PATH,
-        f"[stats] Actualizar stats_summary.json — {now_iso[:16]}", repo,
-    )
+    save_local(stats_content, STATS_PATH)
+    pub.agregar(STATS_PATH, stats_content)
 
     # ── 5. Guardar videos_index.json (índice global) ──────────
     index_data = {
@@ -223,14 +194,16 @@ def main():
         "videos":      videos_index,
     }
     index_content = json.dumps(index_data, indent=2, ensure_ascii=False)
-    save_local_and_upload(
-        index_content, INDEX_PATH, INDEX_PATH,
-        f"[index] Actualizar videos_index.json — {now_iso[:16]}", repo,
-    )
+    save_local(index_content, INDEX_PATH)
+    pub.agregar(INDEX_PATH, index_content)
+
+    # ── 6. Un solo commit con ambos ───────────────────────────
+    pub.publicar(f"[stats] Actualizar stats_summary.json y videos_index.json — {now_iso[:16]}")
 
     print(f"[stats] OK — {summary['totales']['videos_activos']} recientes "
           f"+ {summary['totales']['videos_vitrina']} vitrina "
           f"= {len(videos_index)} videos indexados")
+    print(f"[stats] {pub.resumen()}")
 
 
 if __name__ == "__main__":
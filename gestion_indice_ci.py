@@ -4,26 +4,53 @@ Por cada loc/can/lado:
   - videos_recientes.json  → últimas 24 h (lógica original, sin cambios)
   - videos_vitrina.json    → videos más viejos para completar a MIN_VITRINA=5
                              Solo se generan links si recientes < MIN_VITRINA.
+
+Un solo proceso puede indexar muchos lados (--lados LOC/CAN/LADO ... o --todos
+desde config_locations.json): un cliente de storage compartido, listados y links
+en paralelo (GESTION_WORKERS lados a la vez; cada listado es incremental desde el
+cursor guardado, ver index_state.py), una sola precarga de links para
+todo el lote y la publicación a GitHub al final, en un solo commit
+(github_publisher.py).
+
+Los JSON solo se reescriben/publican si cambió su contenido: la huella (sha256
+sin generado_el) se compara con la versión ya publicada, y videos_recientes.json
+no se vuelve a subir al storage si ya tiene esa misma versión. Con el supervisor
+reindexando cada minuto, la mayoría de las vueltas no escribe nada.
+
+Uso:
+    python gestion_indice_ci.py --loc Scorpion --can Cancha1 --lado LadoA
+    python gestion_indice_ci.py --lados Scorpion/Cancha1/LadoA Scorpion/Cancha1/LadoB
+    python gestion_indice_ci.py --todos
+    python gestion_indice_ci.py --daemon --lados Scorpion/Cancha1/LadoA
+
+--daemon indexa los lados dados y queda esperando cambios bajo /Puntazo/Locaciones
+(longpoll: sin cuota mientras no pasa nada); cada ráfaga de cambios reindexa solo
+los lados tocados, así que un clip aparece en segundos. Sale con SIGTERM.
 """
 
 import os
+import sys
 import argparse
-import dropbox
+import hashlib
 import json
 import re
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta, timezone
-from urllib.parse import urlparse, parse_qsl, urlencode, urlunparse
-from github import Github, Auth
+
+from storage import get_storage, Archivo, StorageError, CursorInvalido, LoteStorage
+from dropbox_transfer import dropbox_content_hash_bytes
+from link_cache import LinkCache
+from index_state import IndexState
+from github_publisher import Publicador
 
 # ──────────────────────────────────────────
 # Config
 # ──────────────────────────────────────────
-DROPBOX_APP_KEY       = os.environ["DROPBOX_APP_KEY"]
-DROPBOX_APP_SECRET    = os.environ["DROPBOX_APP_SECRET"]
-DROPBOX_REFRESH_TOKEN = os.environ["DROPBOX_REFRESH_TOKEN"]
-GITHUB_TOKEN          = os.environ.get("PAT_GITHUB")
-
 VALID_SUFFIX         = ".mp4"
+PREVIEW_SUFFIX       = ".preview.mp4"   # preview liviano que sube la ingesta junto al clip
 RETENTION_HOURS      = 24          # ventana para videos_recientes.json
 VITRINA_LOOKBACK_DAYS = 14         # hasta cuántos días hacia atrás buscar para vitrina
 MIN_VITRINA          = 5           # mínimo de videos que siempre debe haber
@@ -37,98 +64,108 @@ MIN_VITRINA          = 5           # mínimo de videos que siempre debe haber
 VITRINA_MAX          = 400         # tope duro de videos por lado en la vitrina
 DROPBOX_BASE         = "/Puntazo/Locaciones"
 GITHUB_REPO          = "isaacsaltiel/puntazo_web_v2"
+LOCATIONS_JSON       = os.environ.get("LOCATIONS_JSON", "data/config_locations.json")
+WORKERS              = int(os.environ.get("GESTION_WORKERS", "8"))   # lados en paralelo
+# Huella del contenido (sin generado_el): si coincide con lo ya publicado no se
+# reescribe el JSON ni se vuelve a subir a GitHub/storage. true = publicar siempre.
+FORZAR_PUBLICACION   = os.environ.get("FORZAR_PUBLICACION", "false").lower() == "true"
+VOLATILES            = ("generado_el",)
+
+# Modo daemon (--daemon): longpoll sobre DROPBOX_BASE, reindexa solo los lados que cambian
+DAEMON_LONGPOLL      = int(os.environ.get("GESTION_LONGPOLL_SECONDS", "300"))   # 30..480 en Dropbox
+DAEMON_DEBOUNCE      = float(os.environ.get("GESTION_DEBOUNCE_SECONDS", "3"))    # junta la ráfaga clip+jpg+preview
+DAEMON_MAX_RUNTIME   = int(os.environ.get("GESTION_DAEMON_MAX_SECONDS", "0"))    # 0 = hasta SIGTERM
+IGNORAR_CAMBIOS      = ("videos_recientes.json",)                                # los escribe el propio índice
 
 
 # ──────────────────────────────────────────
-# Dropbox helpers
+# Storage helpers (Dropbox o árbol local, ver storage.py)
 # ──────────────────────────────────────────
-def connect_dropbox():
-    print("[DEBUG] Conectando a Dropbox…")
-    return dropbox.Dropbox(
-        app_key=DROPBOX_APP_KEY,
-        app_secret=DROPBOX_APP_SECRET,
-        oauth2_refresh_token=DROPBOX_REFRESH_TOKEN,
-    )
+def connect_storage():
+    st = get_storage()
+    print(f"[DEBUG] Conectando a storage ({st.nombre})…")
+    return st
 
 
-def to_direct_dropbox_url(url: str, mode: str = "raw") -> str:
-    u = urlparse(url)
-    q = dict(parse_qsl(u.query, keep_blank_values=True))
-    if mode == "dl":
-        q.pop("raw", None); q["dl"] = "1"
-    else:
-        q.pop("dl", None); q["raw"] = "1"
-    return urlunparse((u.scheme, u.netloc, u.path, u.params, urlencode(q), u.fragment))
+def generate_public_url(links: LinkCache, entry: Archivo):
+    """Link público permanente del archivo: de la caché si su rev no cambió, si no lo pide."""
+    return links.url(entry)
 
 
-def generate_public_url(dbx, path):
-    """Obtiene (o reutiliza) un link público permanente de Dropbox."""
-    try:
-        link = dbx.sharing_create_shared_link_with_settings(path)
-    except dropbox.exceptions.ApiError as e:
-        if (hasattr(e, "error")
-                and hasattr(e.error, "is_shared_link_already_exists")
-                and e.error.is_shared_link_already_exists()):
-            resp = dbx.sharing_list_shared_links(path=path, direct_only=True)
-            if resp.links:
-                link = resp.links[0]
-            else:
-                print(f"[WARN] No hay links existentes para {path}")
-                return None
-        else:
-            print(f"[ERROR] al generar URL pública para {path}: {e}")
-            return None
-    return to_direct_dropbox_url(link.url, mode="raw")
+def find_sibling(mp4_name: str, by_name: dict, suffix: str):
+    if not mp4_name.endswith(VALID_SUFFIX):
+        return None
+    return by_name.get((mp4_name[: -len(VALID_SUFFIX)] + suffix).lower())
 
 
-def find_sibling_poster_url(dbx, mp4_name: str, jpg_by_name: dict):
+def find_sibling_poster_url(links: LinkCache, mp4_name: str, jpg_by_name: dict):
     """poster_url para un clip: busca la miniatura hermana <base>.jpg en la MISMA
     carpeta de Dropbox (convención: la NUC sube CLIP.jpg junto a CLIP.mp4) y le
     genera su propio link público directo. No se puede derivar de la URL del .mp4
     porque cada archivo de Dropbox tiene su propio token de share.
     Aditivo: si no hay jpg hermana, devuelve None y el item no lleva poster_url."""
-    if not mp4_name.endswith(VALID_SUFFIX):
-        return None
-    jpg = jpg_by_name.get((mp4_name[: -len(VALID_SUFFIX)] + ".jpg").lower())
+    jpg = find_sibling(mp4_name, jpg_by_name, ".jpg")
     if not jpg:
         return None
-    return generate_public_url(dbx, jpg.path_lower)
+    return generate_public_url(links, jpg)
+
+
+def find_sibling_preview_url(links: LinkCache, mp4_name: str, preview_by_name: dict):
+    """preview_url para un clip: <base>.preview.mp4 en la misma carpeta (lo genera
+    procesar_videos_ffmpeg.py en el mismo encode). Aditivo como poster_url."""
+    prev = find_sibling(mp4_name, preview_by_name, PREVIEW_SUFFIX)
+    if not prev:
+        return None
+    return generate_public_url(links, prev)
 
 
 # ──────────────────────────────────────────
 # GitHub helpers
 # ──────────────────────────────────────────
-def upload_to_github(json_data: str, github_path: str, message: str = None):
-    if not GITHUB_TOKEN:
-        print("[WARN] Sin PAT_GITHUB — omitiendo subida a GitHub.")
-        return
-    g      = Github(auth=Auth.Token(GITHUB_TOKEN))
-    repo   = g.get_repo(GITHUB_REPO)
-    branch = repo.default_branch
-    msg    = message or f"CI: actualizar {github_path.split('/')[-1]}"
-    print(f"[DEBUG] Subiendo {github_path} → GitHub ({branch})")
-    try:
-        contents = repo.get_contents(github_path, ref=branch)
-        repo.update_file(contents.path, msg, json_data, contents.sha, branch=branch)
-        print(f"[OK] {github_path} actualizado")
-    except Exception as e:
-        if "404" in str(e):
-            try:
-                repo.create_file(github_path, msg, json_data, branch=branch)
-                print(f"[OK] {github_path} creado")
-            except Exception as inner:
-                print(f"[ERROR] No se pudo crear {github_path}: {inner}")
-        else:
-            print(f"[ERROR] No se pudo subir {github_path}: {e}")
-
-
-def save_and_upload(data: dict, local_path: str, github_path: str, label: str):
+def save_local(content: str, local_path: str) -> None:
     os.makedirs(os.path.dirname(local_path), exist_ok=True)
-    content = json.dumps(data, indent=2, ensure_ascii=False)
     with open(local_path, "w", encoding="utf-8") as f:
         f.write(content)
-    print(f"[DEBUG] {label} guardado localmente → {local_path}")
-    upload_to_github(content, github_path, f"CI: actualizar {label}")
+
+
+def huella(data: dict) -> str:
+    """sha256 del JSON sin campos volátiles (timestamps): cambia solo si cambia la lista."""
+    estable = {k: v for k, v in data.items() if k not in VOLATILES}
+    return hashlib.sha256(json.dumps(estable, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def contenido_si_cambio(data: dict, local_path: str):
+    """
+    Compara `data` con la versión ya publicada (la del checkout, o la que dejó la
+    vuelta anterior del supervisor). No escribe nada: el JSON local se actualiza
+    recién cuando el commit sale (indexar), así un publish fallido se reintenta.
+    Devuelve (contenido vigente, cambió).
+    """
+    if not FORZAR_PUBLICACION:
+        try:
+            with open(local_path, "r", encoding="utf-8") as f:
+                previo = f.read()
+            if huella(json.loads(previo)) == huella(data):
+                return previo, False
+        except (OSError, ValueError, AttributeError):
+            pass
+    return json.dumps(data, indent=2, ensure_ascii=False), True
+
+
+PUBLICADOR = None   # uno por proceso: el daemon lo reusa entre vueltas (get_repo una sola vez)
+
+
+def publish(archivos: dict, etiqueta: str) -> Publicador:
+    """Sube a GitHub todos los JSON generados en la corrida ({ruta: contenido}) en un solo commit."""
+    global PUBLICADOR
+    if PUBLICADOR is None:
+        PUBLICADOR = Publicador(GITHUB_REPO)
+    pub = PUBLICADOR
+    pub.archivos.clear()   # lo de una vuelta fallida se regenera: no arrastrarlo
+    for github_path, content in archivos.items():
+        pub.agregar(github_path, content)
+    pub.publicar(f"CI: actualizar índice — {etiqueta}")
+    return pub
 
 
 # ──────────────────────────────────────────
@@ -148,117 +185,163 @@ def parse_fecha_from_nombre(nombre: str) -> str:
 
 
 # ──────────────────────────────────────────
-# Main
+# Por lado: listar → clasificar → generar JSON
 # ──────────────────────────────────────────
-def main():
-    parser = argparse.ArgumentParser()
-    parser.add_argument("--loc",  required=True)
-    parser.add_argument("--can",  required=True)
-    parser.add_argument("--lado", required=True)
-    args = parser.parse_args()
-
-    loc, can, lado = args.loc, args.can, args.lado
-    folder_path = f"{DROPBOX_BASE}/{loc}/{can}/{lado}"
-    print(f"[DEBUG] Carpeta objetivo: {folder_path}")
+print_lock = threading.Lock()
+
+
+class Lado:
+    """Estado de un loc/can/lado entre el listado y la generación de sus JSON."""
+
+    def __init__(self, loc: str, can: str, lado: str):
+        self.loc, self.can, self.lado = loc, can, lado
+        self.folder_path = f"{DROPBOX_BASE}/{loc}/{can}/{lado}"
+        self.recientes = []
+        self.vitrina = []
+        self.jpg_by_name = {}
+        self.preview_by_name = {}
+        self.indice_storage = None   # videos_recientes.json tal como está hoy en el storage
+        self.evitadas = {"github": 0, "storage": 0}
+        self.duplicados = []         # encolados para borrar en lote
+        self.ok = False
+
+    def log(self, msg: str):
+        with print_lock:
+            print(f"{self.loc}/{self.can}/{self.lado} │ {msg}", flush=True)
+
+    def publicables(self) -> list:
+        """Clips a publicar + sus miniaturas/previews: todo lo que necesita link."""
+        clips = self.recientes + self.vitrina[:VITRINA_MAX]
+        return clips + [
+            sib for e in clips
+            for sib in (find_sibling(e.name, self.jpg_by_name, ".jpg"),
+                        find_sibling(e.name, self.preview_by_name, PREVIEW_SUFFIX)) if sib
+        ]
+
+
+def clasificar_lado(st, estado: IndexState, lote: LoteStorage, lado: Lado, now_utc: datetime) -> Lado:
+    cutoff_recientes = now_utc - timedelta(hours=RETENTION_HOURS)
+    cutoff_vitrina   = now_utc - timedelta(days=VITRINA_LOOKBACK_DAYS)
 
-    dbx = connect_dropbox()
-    now_utc = datetime.now(timezone.utc)
+    def fuera_de_ventana(e: Archivo) -> bool:
+        # clips/miniaturas más viejos que la vitrina ya no se publican: fuera del estado
+        return e.name.lower().endswith((VALID_SUFFIX, ".jpg")) and get_mod_time_utc(e) <= cutoff_vitrina
 
-    # ── Listar carpeta con paginación ──────────────────────────
+    # ── Listar carpeta: solo cambios desde el cursor guardado (o completo) ──
     try:
-        result  = dbx.files_list_folder(folder_path)
-        entries = list(result.entries)
-        while result.has_more:
-            result = dbx.files_list_folder_continue(result.cursor)
-            entries.extend(result.entries)
-        print(f"[DEBUG] Archivos encontrados: {len(entries)}")
-    except dropbox.exceptions.ApiError as e:
-        print(f"[ERROR] No se pudo acceder a {folder_path}: {e}")
-        return
+        entries, modo = estado.listar(st, lado.folder_path, podar=fuera_de_ventana)
+        lado.log(f"[DEBUG] Archivos vigentes: {len(entries)} (listado {modo})")
+    except StorageError as e:
+        lado.log(f"[ERROR] No se pudo acceder a {lado.folder_path}: {e}")
+        return lado
 
     # Índice de miniaturas hermanas (.jpg) por nombre, para emitir poster_url.
-    jpg_by_name = {
+    lado.jpg_by_name = {
         e.name.lower(): e
         for e in entries
-        if isinstance(e, dropbox.files.FileMetadata) and e.name.lower().endswith(".jpg")
+        if isinstance(e, Archivo) and e.name.lower().endswith(".jpg")
     }
-    print(f"[DEBUG] Miniaturas .jpg encontradas: {len(jpg_by_name)}")
-
-    cutoff_recientes = now_utc - timedelta(hours=RETENTION_HOURS)
-    cutoff_vitrina   = now_utc - timedelta(days=VITRINA_LOOKBACK_DAYS)
+    lado.log(f"[DEBUG] Miniaturas .jpg encontradas: {len(lado.jpg_by_name)}")
+    lado.preview_by_name = {
+        e.name.lower(): e
+        for e in entries
+        if isinstance(e, Archivo) and e.name.lower().endswith(PREVIEW_SUFFIX)
+    }
+    lado.indice_storage = next(
+        (e for e in entries if isinstance(e, Archivo) and e.name == "videos_recientes.json"), None
+    )
 
     # ── Clasificar archivos ────────────────────────────────────
     # Sólo .mp4; descartar duplicados por nombre base
     nombres_base_vistos: set = set()
-    recientes_entries  = []   # mod_time > cutoff_recientes
-    vitrina_candidates = []   # cutoff_vitrina < mod_time <= cutoff_recientes
 
     for entry in entries:
-        if not (isinstance(entry, dropbox.files.FileMetadata)
-                and entry.name.endswith(VALID_SUFFIX)):
+        if not (isinstance(entry, Archivo)
+                and entry.name.endswith(VALID_SUFFIX)
+                and not entry.name.lower().endswith(PREVIEW_SUFFIX)):
             continue
 
         mod_utc   = get_mod_time_utc(entry)
         nombre_b  = re.sub(r" \(\d+\)$", "",
                             entry.name[: -len(VALID_SUFFIX)])
 
-        # Eliminar duplicados
+        # Eliminar duplicados (en lote, con los de todos los lados: ver indexar)
         if nombre_b in nombres_base_vistos:
-            try:
-                dbx.files_delete_v2(entry.path_lower)
-                print(f"[INFO] Eliminado duplicado: {entry.name}")
-            except Exception as e2:
-                print(f"[WARN] No se pudo eliminar duplicado {entry.name}: {e2}")
+            lote.borrar(entry.ruta)
+            lado.duplicados.append(entry)
             continue
         nombres_base_vistos.add(nombre_b)
 
         if mod_utc > cutoff_recientes:
-            recientes_entries.append(entry)
+            lado.recientes.append(entry)
         elif mod_utc > cutoff_vitrina:
-            vitrina_candidates.append(entry)
+            lado.vitrina.append(entry)
         # Si es más viejo que VITRINA_LOOKBACK_DAYS → ignorar
 
     # ── Ordenar: más reciente primero ─────────────────────────
-    recientes_entries.sort(key=get_mod_time_utc, reverse=True)
-    vitrina_candidates.sort(key=get_mod_time_utc, reverse=True)
+    lado.recientes.sort(key=get_mod_time_utc, reverse=True)
+    lado.vitrina.sort(key=get_mod_time_utc, reverse=True)
+    lado.ok = True
+    return lado
 
-    # ── Generar videos_recientes.json (lógica original) ───────
-    videos_recientes = []
-    for entry in recientes_entries:
-        url = generate_public_url(dbx, entry.path_lower)
+
+def items_con_links(links: LinkCache, lado: Lado, entries: list, etiqueta: str) -> list:
+    items = []
+    for entry in entries:
+        url = generate_public_url(links, entry)
         if url:
             item = {
                 "nombre": entry.name,
                 "url":    url,
                 "fecha":  parse_fecha_from_nombre(entry.name),
             }
-            poster = find_sibling_poster_url(dbx, entry.name, jpg_by_name)
+            poster = find_sibling_poster_url(links, entry.name, lado.jpg_by_name)
             if poster:
                 item["poster_url"] = poster
-            videos_recientes.append(item)
+            preview = find_sibling_preview_url(links, entry.name, lado.preview_by_name)
+            if preview:
+                item["preview_url"] = preview
+            items.append(item)
         else:
-            print(f"[WARN] Sin URL para {entry.name}")
+            lado.log(f"[WARN] Sin URL {etiqueta}para {entry.name}")
+    return items
+
+
+def generar_lado(st, links: LinkCache, lado: Lado, now_utc: datetime) -> dict:
+    """Genera videos_recientes.json y videos_vitrina.json. Devuelve {ruta repo: contenido} de los que cambiaron."""
+    loc, can, lad = lado.loc, lado.can, lado.lado
+    base = f"data/Locaciones/{loc}/{can}/{lad}"
+    archivos = {}
 
+    # ── Generar videos_recientes.json (lógica original) ───────
+    videos_recientes = items_con_links(links, lado, lado.recientes, "")
     output_recientes = {
         "videos":       videos_recientes,
         "generado_el":  now_utc.isoformat(),
-        "loc": loc, "can": can, "lado": lado,
+        "loc": loc, "can": can, "lado": lad,
     }
-    local_rec   = f"data/Locaciones/{loc}/{can}/{lado}/videos_recientes.json"
-    github_rec  = local_rec
-    save_and_upload(output_recientes, local_rec, github_rec, "videos_recientes.json")
-
-    # Subir también a Dropbox (comportamiento original)
-    try:
-        with open(local_rec, "rb") as f:
-            dbx.files_upload(f.read(),
-                             folder_path + "/videos_recientes.json",
-                             mode=dropbox.files.WriteMode("overwrite"))
-        print("[OK] videos_recientes.json actualizado en Dropbox")
-    except Exception as e:
-        print(f"[WARN] No se pudo subir videos_recientes.json a Dropbox: {e}")
+    local_rec = f"{base}/videos_recientes.json"
+    contenido_rec, cambio = contenido_si_cambio(output_recientes, local_rec)
+    if cambio:
+        archivos[local_rec] = contenido_rec
+        lado.log(f"[DEBUG] videos_recientes.json cambió → {local_rec}")
+    else:
+        lado.evitadas["github"] += 1
+        lado.log("[DEBUG] videos_recientes.json sin cambios → no se republica")
+
+    # Subir también al storage (comportamiento original), salvo que ya tenga estos mismos bytes
+    datos_rec = contenido_rec.encode("utf-8")
+    en_storage = lado.indice_storage
+    if en_storage and en_storage.content_hash == dropbox_content_hash_bytes(datos_rec):
+        lado.evitadas["storage"] += 1
+    else:
+        try:
+            st.subir_bytes(datos_rec, lado.folder_path + "/videos_recientes.json")
+            lado.log(f"[OK] videos_recientes.json actualizado en {st.nombre}")
+        except Exception as e:
+            lado.log(f"[WARN] No se pudo subir videos_recientes.json a {st.nombre}: {e}")
 
-    print(f"[DEBUG] Videos recientes: {len(videos_recientes)}")
+    lado.log(f"[DEBUG] Videos recientes: {len(videos_recientes)}")
 
     # ── Generar videos_vitrina.json — VENTANA COMPLETA de 14 días ─────
     #
@@ -267,44 +350,249 @@ def main():
     # lunes. Los links de Dropbox son permanentes → reutilizamos si ya existen.
     #
     videos_vitrina = []
-    if vitrina_candidates:
-        recortado = len(vitrina_candidates) > VITRINA_MAX
+    if lado.vitrina:
+        recortado = len(lado.vitrina) > VITRINA_MAX
         if recortado:
-            print(f"[WARN] {len(vitrina_candidates)} candidatos superan VITRINA_MAX="
-                  f"{VITRINA_MAX}; se publican los {VITRINA_MAX} más recientes y se "
-                  f"DESCARTAN {len(vitrina_candidates) - VITRINA_MAX} más viejos.")
-        for entry in vitrina_candidates[:VITRINA_MAX]:
-            url = generate_public_url(dbx, entry.path_lower)
-            if url:
-                item = {
-                    "nombre": entry.name,
-                    "url":    url,
-                    "fecha":  parse_fecha_from_nombre(entry.name),
-                }
-                poster = find_sibling_poster_url(dbx, entry.name, jpg_by_name)
-                if poster:
-                    item["poster_url"] = poster
-                videos_vitrina.append(item)
-            else:
-                print(f"[WARN] Sin URL vitrina para {entry.name}")
-        print(f"[DEBUG] Videos vitrina obtenidos: {len(videos_vitrina)} "
-              f"(ventana de {VITRINA_LOOKBACK_DAYS} días)")
+            lado.log(f"[WARN] {len(lado.vitrina)} candidatos superan VITRINA_MAX="
+                     f"{VITRINA_MAX}; se publican los {VITRINA_MAX} más recientes y se "
+                     f"DESCARTAN {len(lado.vitrina) - VITRINA_MAX} más viejos.")
+        videos_vitrina = items_con_links(links, lado, lado.vitrina[:VITRINA_MAX], "vitrina ")
+        lado.log(f"[DEBUG] Videos vitrina obtenidos: {len(videos_vitrina)} "
+                 f"(ventana de {VITRINA_LOOKBACK_DAYS} días)")
     else:
-        print(f"[DEBUG] Sin videos entre 24 h y {VITRINA_LOOKBACK_DAYS} días; vitrina vacía")
+        lado.log(f"[DEBUG] Sin videos entre 24 h y {VITRINA_LOOKBACK_DAYS} días; vitrina vacía")
 
     output_vitrina = {
         "videos":      videos_vitrina,
         "generado_el": now_utc.isoformat(),
-        "loc": loc, "can": can, "lado": lado,
+        "loc": loc, "can": can, "lado": lad,
     }
-    local_vit  = f"data/Locaciones/{loc}/{can}/{lado}/videos_vitrina.json"
-    github_vit = local_vit
-    save_and_upload(output_vitrina, local_vit, github_vit, "videos_vitrina.json")
+    local_vit = f"{base}/videos_vitrina.json"
+    contenido_vit, cambio = contenido_si_cambio(output_vitrina, local_vit)
+    if cambio:
+        archivos[local_vit] = contenido_vit
+        lado.log(f"[DEBUG] videos_vitrina.json cambió → {local_vit}")
+    else:
+        lado.evitadas["github"] += 1
+        lado.log("[DEBUG] videos_vitrina.json sin cambios → no se republica")
 
     total = len(videos_recientes) + len(videos_vitrina)
-    print(f"[OK] Total disponibles para vitrina: {total} videos "
-          f"({len(videos_recientes)} recientes + {len(videos_vitrina)} históricos)")
+    lado.log(f"[OK] Total disponibles para vitrina: {total} videos "
+             f"({len(videos_recientes)} recientes + {len(videos_vitrina)} históricos)")
+    return archivos
+
+
+def lados_de_config(path: str = LOCATIONS_JSON) -> list:
+    """Todos los (loc, can, lado) de config_locations.json."""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    out = []
+    for loc in data.get("locaciones", []):
+        loc_id = loc.get("id") or loc.get("nombre")
+        for cancha in loc.get("cancha", []):
+            can_id = cancha.get("id") or cancha.get("nombre")
+            for lado in cancha.get("lados", []):
+                lado_id = lado.get("id") or lado.get("nombre")
+                if loc_id and can_id and lado_id:
+                    out.append((loc_id, can_id, lado_id))
+    return out
+
+
+# ──────────────────────────────────────────
+# Indexar un conjunto de lados (una corrida, o una vuelta del daemon)
+# ──────────────────────────────────────────
+def indexar(st, estado: IndexState, links: LinkCache, triples: list) -> list:
+    """Lista, genera y publica (un commit) los lados de `triples`. Devuelve los Lado fallidos."""
+    now_utc = datetime.now(timezone.utc)
+    lados = [Lado(*t) for t in triples]
+    print(f"[DEBUG] Lados a indexar: {len(lados)} (workers={min(WORKERS, len(lados))})")
+
+    with ThreadPoolExecutor(max_workers=min(WORKERS, len(lados))) as ex:
+        # 1) Listar y clasificar todos los lados; los duplicados salen en un solo lote
+        lote = LoteStorage(st)
+        list(ex.map(lambda l: clasificar_lado(st, estado, lote, l, now_utc), lados))
+        if len(lote):
+            borrados = lote.enviar()
+            for l in lados:
+                for d in l.duplicados:
+                    if borrados.get(d.ruta):
+                        l.log(f"[WARN] No se pudo eliminar duplicado {d.name}: {borrados[d.ruta]}")
+                    else:
+                        l.log(f"[INFO] Eliminado duplicado: {d.name}")
+
+        # 2) Links: caché persistente por rev + una sola precarga masiva para todo el lote
+        links.precargar([a for l in lados if l.ok for a in l.publicables()])
+
+        # 3) JSON por lado (links en paralelo entre lados)
+        archivos, con_cambios = {}, []
+        futs = {ex.submit(generar_lado, st, links, l, now_utc): l for l in lados if l.ok}
+        fallidos = [l for l in lados if not l.ok]
+        for fut in as_completed(futs):
+            try:
+                generados = fut.result()
+                archivos.update(generados)
+                if generados:
+                    con_cambios.append(futs[fut])
+            except Exception as e:
+                futs[fut].log(f"[ERROR] {e}")
+                fallidos.append(futs[fut])
+
+    links.guardar()   # antes de publicar: si algo falla después, los links nuevos no se pierden
+    estado.guardar()
+    etiqueta = (f"{lados[0].loc}/{lados[0].can}/{lados[0].lado}" if len(lados) == 1
+                else f"{len(lados) - len(fallidos)} lados")
+    pub = publish(archivos, etiqueta)
+    if pub.error:
+        # Sin commit no se toca el JSON local: la próxima vuelta vuelve a ver la diferencia y reintenta
+        print(f"[ERROR] Publicación fallida; {len(con_cambios)} lados quedan pendientes de publicar")
+        fallidos += con_cambios
+    else:
+        for ruta, contenido in archivos.items():
+            save_local(contenido, ruta)
+
+    print(f"[OK] Lados: {len(lados) - len(fallidos)} OK, {len(fallidos)} con error"
+          + (f" ({', '.join(f'{l.loc}/{l.can}/{l.lado}' for l in fallidos)})" if fallidos else ""))
+    ok = [l for l in lados if l.ok and l not in fallidos]
+    ev_gh = sum(l.evitadas["github"] for l in ok)
+    ev_st = sum(l.evitadas["storage"] for l in ok)
+    print(f"[OK] Escrituras evitadas por huella sin cambios: {ev_gh + ev_st}/{3 * len(ok)} "
+          f"(GitHub {ev_gh}/{2 * len(ok)}, {st.nombre} {ev_st}/{len(ok)})")
+    print(f"[DEBUG] {pub.resumen()}")
+    return fallidos
+
+
+# ──────────────────────────────────────────
+# Modo daemon: longpoll sobre DROPBOX_BASE → reindexar solo los lados tocados
+# ──────────────────────────────────────────
+PARAR = threading.Event()   # SIGTERM: terminar la vuelta en curso y salir
+
+
+def lados_afectados(entries, conocidos: dict) -> set:
+    """
+    (loc, can, lado) con cambios relevantes en `entries` (cambios recursivos bajo
+    DROPBOX_BASE). Se ignora lo que escribe el propio índice (videos_recientes.json).
+    `conocidos` traduce la ruta en minúsculas de Dropbox al nombre real del lado.
+    """
+    base = DROPBOX_BASE.lower().rstrip("/") + "/"
+    out = set()
+    for e in entries:
+        ruta = e.ruta.lower()
+        if not ruta.startswith(base) or e.name in IGNORAR_CAMBIOS or e.name.endswith(".tmp"):
+            continue
+        partes = ruta[len(base):].split("/")
+        if len(partes) != 4:
+            continue
+        clave = tuple(partes[:3])
+        if clave in conocidos:
+            out.add(conocidos[clave])
+        else:
+            print(f"[WARN] Cambio en {'/'.join(clave)}, que no está en {LOCATIONS_JSON}; se ignora")
+    return out
+
+
+def correr_daemon(st, estado: IndexState, links: LinkCache, iniciales: list) -> None:
+    """
+    Indexa `iniciales` y después queda esperando cambios bajo DROPBOX_BASE con
+    longpoll (no consume cuota). Al despertar espera DAEMON_DEBOUNCE segundos para
+    juntar la ráfaga (clip + .jpg + preview) y reindexa solo los lados tocados.
+    Los lados que fallaron se reintentan aunque el longpoll vuelva sin cambios.
+    Sale por DAEMON_MAX_RUNTIME o SIGTERM (PARAR).
+    """
+    inicio = time.monotonic()
+    conocidos = {tuple(x.lower() for x in t): t for t in lados_de_config() + iniciales}
+    cursor = st.cursor_actual(DROPBOX_BASE, recursivo=True)
+    print(f"[DEBUG] Daemon: longpoll {DAEMON_LONGPOLL}s, debounce {DAEMON_DEBOUNCE:g}s, "
+          f"presupuesto {DAEMON_MAX_RUNTIME or '∞'}s, {len(conocidos)} lados conocidos")
+    reintentar = set()
+    if iniciales:
+        reintentar = {(l.loc, l.can, l.lado) for l in indexar(st, estado, links, iniciales)}
+    vueltas = 0
+    while not PARAR.is_set():
+        restante = DAEMON_MAX_RUNTIME - (time.monotonic() - inicio) if DAEMON_MAX_RUNTIME else DAEMON_LONGPOLL
+        if restante <= 0:
+            print("[DEBUG] Daemon: fin del presupuesto de tiempo")
+            break
+        try:
+            if st.esperar_cambios(cursor, min(DAEMON_LONGPOLL, restante)):
+                PARAR.wait(DAEMON_DEBOUNCE)
+                entries, cursor = st.cambios(cursor)
+            elif reintentar:
+                entries = []
+            else:
+                continue
+        except CursorInvalido as e:
+            print(f"[WARN] Cursor de {DROPBOX_BASE} inválido ({e}); se reindexan todos los lados conocidos")
+            cursor = st.cursor_actual(DROPBOX_BASE, recursivo=True)
+            entries = None
+        except Exception as e:
+            print(f"[WARN] Longpoll/cambios falló ({e}); pausa de {DAEMON_DEBOUNCE * 10:g}s")
+            PARAR.wait(DAEMON_DEBOUNCE * 10)
+            continue
+
+        afectados = sorted(set(conocidos.values()) if entries is None
+                           else lados_afectados(entries, conocidos) | reintentar)
+        if not afectados:
+            continue
+        vueltas += 1
+        print(f"\n[DEBUG] Vuelta {vueltas}: {', '.join('/'.join(t) for t in afectados)}")
+        try:
+            reintentar = {(l.loc, l.can, l.lado) for l in indexar(st, estado, links, afectados)}
+        except Exception as e:
+            print(f"[ERROR] Vuelta {vueltas}: {e}")
+            reintentar = set(afectados)
+
+    if PARAR.is_set():
+        print("[DEBUG] SIGTERM: daemon detenido tras la vuelta en curso")
+    print(f"[DEBUG] Daemon: {vueltas} vueltas en {time.monotonic() - inicio:.0f}s")
+
+
+# ──────────────────────────────────────────
+# Main
+# ──────────────────────────────────────────
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--loc")
+    parser.add_argument("--can")
+    parser.add_argument("--lado")
+    parser.add_argument("--lados", nargs="+", default=[], metavar="LOC/CAN/LADO",
+                        help="varios lados en un solo proceso")
+    parser.add_argument("--todos", action="store_true",
+                        help=f"todos los lados de {LOCATIONS_JSON}")
+    parser.add_argument("--daemon", action="store_true",
+                        help="indexar los lados dados y quedar esperando cambios (longpoll)")
+    args = parser.parse_args()
+
+    triples = []
+    if args.loc or args.can or args.lado:
+        if not (args.loc and args.can and args.lado):
+            parser.error("--loc, --can y --lado van juntos")
+        triples.append((args.loc, args.can, args.lado))
+    for t in args.lados:
+        partes = t.strip("/").split("/")
+        if len(partes) != 3 or not all(partes):
+            parser.error(f"lado inválido: {t} (esperado LOC/CAN/LADO)")
+        triples.append(tuple(partes))
+    if args.todos:
+        triples += lados_de_config()
+    triples = list(dict.fromkeys(triples))
+    if not (triples or args.daemon):
+        parser.error("indicar --loc/--can/--lado, --lados o --todos (o --daemon)")
+
+    st = connect_storage()
+    estado = IndexState()
+    links = LinkCache(st)
+    fallidos = []
+    if args.daemon:
+        signal.signal(signal.SIGTERM, lambda *_: PARAR.set())
+        correr_daemon(st, estado, links, triples)
+    else:
+        fallidos = indexar(st, estado, links, triples)
 
+    print(f"[DEBUG] {estado.resumen()}")
+    print(f"[DEBUG] {links.resumen()}")
+    print(f"[DEBUG] {st.resumen()}")
+    if triples and len(fallidos) == len(triples):
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()
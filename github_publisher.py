@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+github_publisher.py — Publica varios archivos en el repo web como UN solo commit.
+
+En vez de get_contents + update_file por archivo (2 llamadas y 1 commit cada
+uno), junta todo lo generado en la corrida y lo escribe con la Git Data API:
+
+    ref de la rama → commit base → árbol nuevo (contenidos inline) → commit → mover ref
+
+Son 5 llamadas y 1 commit por publicación sin importar cuántos archivos haya (más
+1 get_repo al crear el Publicador; conviene reusarlo entre publicaciones). Si el árbol nuevo
+queda igual al base (nada cambió) no se crea commit. Si otra corrida movió la
+rama entre medio (no fast-forward), se rehace sobre la punta nueva, hasta
+GITHUB_PUBLISH_RETRIES veces.
+
+Lecturas (leer): un solo get_git_tree recursivo de la rama da el sha de cada blob;
+si el archivo del checkout local tiene el mismo sha de blob se lee de disco, y solo
+los que difieren se piden con get_git_blob. Lo que no está en el árbol no cuesta nada.
+
+Env:
+  PAT_GITHUB               -> token (sin token no se publica nada)
+  GITHUB_PUBLISH_RETRIES   -> reintentos ante no fast-forward (default 4)
+"""
+import os
+import time
+import base64
+import hashlib
+from pathlib import Path
+
+from github import Github, Auth, GithubException, InputGitTreeElement
+
+GITHUB_TOKEN    = os.environ.get("PAT_GITHUB")
+GITHUB_REPO     = "isaacsaltiel/puntazo_web_v2"
+PUBLISH_RETRIES = int(os.environ.get("GITHUB_PUBLISH_RETRIES", "4"))
+
+
+class Publicador:
+    def __init__(self, repo_name: str = GITHUB_REPO, token: str = GITHUB_TOKEN, repo=None):
+        self.archivos = {}      # ruta en el repo → contenido (str)
+        self.llamadas = 0
+        self.error = None       # excepción de la última publicar() fallida
+        self.repo_name = repo_name
+        self.gh = Github(auth=Auth.Token(token)) if repo is None and token else None
+        self.repo = repo
+        self.blobs = None       # ruta → sha del blob en la punta de la rama (leer)
+
+    def _conectar(self) -> bool:
+        """Resuelve el repo (get_repo) la primera vez que hace falta; False si no hay token."""
+        if self.repo is None and self.gh:
+            self.repo = self._api(self.gh.get_repo, self.repo_name)
+        return self.repo is not None
+
+    def agregar(self, ruta: str, contenido: str) -> None:
+        self.archivos[ruta] = contenido
+
+    def _arbol(self) -> dict:
+        """ruta → sha de blob de toda la rama, con un solo get_git_tree recursivo (se cachea)."""
+        if self.blobs is None:
+            arbol = self._api(self.repo.get_git_tree, self.repo.default_branch, recursive=True)
+            if arbol.raw_data.get("truncated"):
+                raise RuntimeError("árbol truncado")
+            self.blobs = {e.path: e.sha for e in arbol.tree if e.type == "blob"}
+        return self.blobs
+
+    def leer(self, ruta: str):
+        """
+        Contenido actual de `ruta` en la rama por defecto; None si no existe o no hay repo.
+        Si la copia local (misma ruta en el checkout) es el mismo blob, no se pide nada.
+        """
+        try:
+            if not self._conectar():
+                return None
+            try:
+                sha = self._arbol().get(ruta)
+            except RuntimeError:   # repo enorme: archivo por archivo
+                return self._api(self.repo.get_contents, ruta, ref=self.repo.default_branch).decoded_content.decode("utf-8")
+            if sha is None:
+                return None
+            local = Path(ruta)
+            if local.is_file():
+                datos = local.read_bytes()
+                if hashlib.sha1(b"blob %d\0" % len(datos) + datos).hexdigest() == sha:
+                    return datos.decode("utf-8")
+            blob = self._api(self.repo.get_git_blob, sha)
+            return base64.b64decode(blob.content).decode("utf-8")
+        except Exception as e:
+            if not (isinstance(e, GithubException) and e.status == 404):
+                print(f"[WARN] GitHub read {ruta}: {e}")
+            return None
+
+    def _api(self, fn, *args, **kwargs):
+        self.llamadas += 1
+        return fn(*args, **kwargs)
+
+    def _intento(self, branch: str, mensaje: str):
+        ref = self._api(self.repo.get_git_ref, f"heads/{branch}")
+        base = self._api(self.repo.get_git_commit, ref.object.sha)
+        elementos = [InputGitTreeElement(ruta, "100644", "blob", content=contenido)
+                     for ruta, contenido in sorted(self.archivos.items())]
+        arbol = self._api(self.repo.create_git_tree, elementos, base.tree)
+        if arbol.sha == base.tree.sha:
+            return None
+        commit = self._api(self.repo.create_git_commit, mensaje, arbol, [base])
+        self._api(ref.edit, commit.sha, force=False)
+        return commit.sha
+
+    def publicar(self, mensaje: str):
+        """
+        Sube todos los archivos agregados en un commit. Devuelve el sha, o None si no
+        hubo commit; si fue por error, queda en self.error y los archivos no se descartan.
+        """
+        self.error = None
+        if not self.archivos:
+            return None
+        if not (self.repo or self.gh):
+            print("[WARN] Sin PAT_GITHUB — omitiendo subida a GitHub.")
+            return None
+        print(f"[DEBUG] Publicando {len(self.archivos)} archivos en GitHub en un commit")
+        for intento in range(1, PUBLISH_RETRIES + 2):
+            try:
+                self._conectar()
+                branch = self.repo.default_branch
+                sha = self._intento(branch, mensaje)
+            except Exception as e:   # GithubException, o de red (requests ConnectionError/Timeout)
+                # 422 "Update is not a fast forward": otra corrida commiteó entre medio
+                if isinstance(e, GithubException) and e.status == 422 and intento <= PUBLISH_RETRIES:
+                    print(f"[WARN] {branch} se movió durante la publicación; reintento {intento}/{PUBLISH_RETRIES}")
+                    time.sleep(min(2 ** intento, 10))
+                    continue
+                print(f"[ERROR] No se pudo publicar en GitHub: {e}")
+                self.error = e
+                return None
+            if sha:
+                print(f"[OK] Commit {sha[:7]} con {len(self.archivos)} archivos")
+            else:
+                print("[OK] GitHub ya estaba al día; sin commit")
+            self.archivos.clear()
+            self.blobs = None   # la rama cambió: la próxima lectura rehace el árbol
+            return sha
+        return None
+
+    def resumen(self) -> str:
+        s = f"GitHub: {self.llamadas} llamadas a la API"
+        if self.gh and self.gh.rate_limiting[1]:
+            restantes, limite = self.gh.rate_limiting
+            s += f" (rate limit: {restantes}/{limite} restantes)"
+        return s
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+index_dispatch.py — Pedidos de reindexación (gestionar_indice) agrupados.
+
+En vez de un repository_dispatch por clip, cada pedido marca su (loc, can, lado)
+como pendiente; los pendientes se deduplican y salen juntos en UN dispatch con
+client_payload {"lados": ["loc/can/lado", ...], "pedidos": N, "clips": [...]}
+(gestion_indice.yml valida los lados y los pasa a gestion_indice_ci.py --lados;
+"clips" es solo contexto para el log, hasta CLIPS_MAX nombres).
+
+Ventana: el primer pedido de una tanda la abre; los que llegan dentro de
+DISPATCH_WINDOW_SECONDS se suman, y la tanda sale con el primer pedido que la
+encuentra vencida o con vaciar(). Ventana 0 = un dispatch por pedido (como antes).
+
+Los pendientes viven en memoria o, con DISPATCH_PENDING_PATH, en un JSON con
+flock: así se agrupan también los pedidos de procesos distintos (un CLI por clip).
+La cola de una ráfaga solo sale con vaciar(), así que quien agrupa tiene que
+garantizarlo: clip_edit_ci.py lo hace en un finally y procesar_ffmpeg.yml corre
+`dispatch_gestionar_indice.py --flush` al final del job (if: always()).
+
+Modo archivo: con DISPATCH_QUEUE_PATH, cada tanda se agrega como una línea JSON
+a ese archivo en lugar de llamar a GitHub (pruebas locales, sin token).
+
+Env:
+  DISPATCH_WINDOW_SECONDS  -> ventana de agrupado (default 60)
+  DISPATCH_PENDING_PATH    -> JSON de pendientes compartido entre procesos (vacío = en memoria)
+  DISPATCH_QUEUE_PATH      -> cola local JSONL (vacío = repository_dispatch a GitHub)
+  PAT_GITHUB / GH_PAT      -> token para repository_dispatch
+"""
+import os
+import json
+import time
+import fcntl
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+import requests
+
+DISPATCH_WINDOW_SECONDS = float(os.environ.get("DISPATCH_WINDOW_SECONDS", "60"))
+DISPATCH_PENDING_PATH   = os.environ.get("DISPATCH_PENDING_PATH", "")
+DISPATCH_QUEUE_PATH     = os.environ.get("DISPATCH_QUEUE_PATH", "")
+EVENT_TYPE              = "gestionar_indice"
+CLIPS_MAX               = 50   # nombres de clip que viajan en el payload (el resto solo cuenta)
+
+
+class Despachador:
+    def __init__(self, repo: str, ventana: float = DISPATCH_WINDOW_SECONDS,
+                 pendientes_path: str = DISPATCH_PENDING_PATH, cola_path: str = DISPATCH_QUEUE_PATH):
+        self.repo = repo
+        self.ventana = ventana
+        self.pendientes_path = Path(pendientes_path).resolve() if pendientes_path else None
+        self.cola_path = Path(cola_path).resolve() if cola_path else None
+        self.memoria = {"lados": {}, "clips": [], "desde": 0}
+        self.stats = {"pedidos": 0, "dispatches": 0}
+
+    @contextmanager
+    def _estado(self):
+        """Pendientes {"lados": {lado: pedidos}, "desde": ts del primero}, bajo flock si son compartidos."""
+        if not self.pendientes_path:
+            yield self.memoria
+            return
+        self.pendientes_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.pendientes_path, "a+", encoding="utf-8") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            f.seek(0)
+            try:
+                estado = json.loads(f.read() or "{}")
+            except ValueError:
+                estado = {}
+            estado.setdefault("lados", {}); estado.setdefault("clips", []); estado.setdefault("desde", 0)
+            yield estado
+            f.seek(0); f.truncate()
+            f.write(json.dumps(estado, ensure_ascii=False))
+            f.flush()
+
+    def _emitir(self, lados: list, pedidos: int, clips: list) -> bool:
+        payload = {"event_type": EVENT_TYPE,
+                   "client_payload": {"lados": lados, "pedidos": pedidos, "clips": clips[:CLIPS_MAX]}}
+        if self.cola_path:
+            self.cola_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.cola_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({**payload, "emitido_el": datetime.now(timezone.utc).isoformat()},
+                                   ensure_ascii=False) + "\n")
+            print(f"📮 gestionar_indice → cola {self.cola_path}: {', '.join(lados)} ({pedidos} pedidos)")
+            return True
+        token = os.environ.get("PAT_GITHUB") or os.environ.get("GH_PAT")
+        if not (self.repo and token):
+            print("❌ Falta repo o PAT_GITHUB/GH_PAT; los lados quedan pendientes")
+            return False
+        try:
+            r = requests.post(f"https://api.github.com/repos/{self.repo}/dispatches",
+                              headers={"Authorization": f"Bearer {token}",
+                                       "Accept": "application/vnd.github+json"},
+                              json=payload, timeout=30)
+        except requests.RequestException as e:
+            print(f"❌ repository_dispatch falló: {e}; los lados quedan pendientes")
+            return False
+        if r.status_code >= 300:
+            print(f"❌ repository_dispatch falló: {r.status_code} {r.text}; los lados quedan pendientes")
+            return False
+        print(f"📮 Disparado gestionar_indice → {', '.join(lados)} ({pedidos} pedidos)")
+        return True
+
+    def _vaciar(self, estado: dict) -> list:
+        if not estado["lados"]:
+            return []
+        lados = sorted(estado["lados"])
+        pedidos = sum(estado["lados"].values())
+        if not self._emitir(lados, pedidos, estado["clips"]):
+            return []
+        estado["lados"] = {}
+        estado["clips"] = []
+        estado["desde"] = 0
+        self.stats["dispatches"] += 1
+        return lados
+
+    def pedir(self, loc: str, can: str, lado: str, clip: str = "") -> list:
+        """Marca el lado como pendiente; si la ventana de la tanda venció, la emite. Devuelve lo emitido."""
+        self.stats["pedidos"] += 1
+        with self._estado() as estado:
+            clave = f"{loc}/{can}/{lado}"
+            if not estado["lados"]:
+                estado["desde"] = time.time()
+            estado["lados"][clave] = estado["lados"].get(clave, 0) + 1
+            if clip and len(estado["clips"]) < CLIPS_MAX:
+                estado["clips"].append(clip)
+            if time.time() - estado["desde"] >= self.ventana:
+                return self._vaciar(estado)
+            print(f"⏳ {clave} pendiente de reindexar ({len(estado['lados'])} lados en la tanda)")
+            return []
+
+    def vaciar(self) -> list:
+        """Emite ya lo pendiente (fin de lote). Devuelve los lados emitidos."""
+        with self._estado() as estado:
+            return self._vaciar(estado)
+
+    def resumen(self) -> str:
+        s = self.stats
+        return f"Reindexación: {s['pedidos']} pedidos → {s['dispatches']} dispatches"
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+index_state.py — Listado incremental por lado para gestion_indice_ci.py.
+
+Por cada carpeta loc/can/lado guarda el cursor de list_folder y los archivos ya
+conocidos. La corrida siguiente solo pide los cambios desde ese cursor
+(storage.cambios: altas, modificaciones, borrados; un renombre llega como borrado
++ alta) y los aplica sobre lo guardado, así que el costo del listado crece con lo
+subido desde la última vez y no con la historia del lado. Sin estado, o si el
+storage invalida el cursor (reset), se rehace el listado completo.
+
+Los archivos que ya no pueden volver a publicarse (más viejos que la ventana de
+la vitrina) se podan del estado con el predicado que pasa quien lista, para que
+el JSON no crezca con la historia.
+
+Es un solo JSON para todos los lados, escrito atómico (tmp + os.replace) al
+final de la corrida y solo si cambió.
+
+Env:
+  INDEX_STATE_PATH   -> JSON del estado (default .cache/indice.json; vacío = listado completo siempre)
+"""
+import os
+import json
+from datetime import datetime
+from pathlib import Path
+from threading import Lock
+
+from storage import Archivo, Borrado, CursorInvalido
+
+INDEX_STATE_PATH = os.environ.get("INDEX_STATE_PATH", ".cache/indice.json")
+
+
+def _a_json(a: Archivo) -> list:
+    return [a.name, a.ruta, a.size, a.server_modified.isoformat(), a.client_modified.isoformat(), a.version,
+            a.content_hash]
+
+
+def _de_json(v: list) -> Archivo:
+    name, ruta, size, srv, cli, version, *content_hash = v   # estados viejos: sin content_hash
+    return Archivo(name, ruta, size, datetime.fromisoformat(srv), datetime.fromisoformat(cli), version,
+                   content_hash[0] if content_hash else None)
+
+
+class IndexState:
+    def __init__(self, path=INDEX_STATE_PATH):
+        self.path = Path(path).resolve() if path else None
+        self.data = {"v": 1, "lados": {}}
+        self.sucio = False
+        self.lock = Lock()
+        self.stats = {"incremental": 0, "completo": 0, "cambios": 0}
+        if self.path:
+            try:
+                data = json.loads(self.path.read_text(encoding="utf-8"))
+                if data.get("v") == 1 and isinstance(data.get("lados"), dict):
+                    self.data = data
+            except (FileNotFoundError, ValueError):
+                pass
+
+    def listar(self, st, carpeta: str, podar=None) -> tuple[list, str]:
+        """
+        Archivos actuales de `carpeta` y cómo se obtuvieron ("incremental (N cambios)"
+        o "completo"). `podar(archivo) -> bool` descarta del estado lo que ya no sirve.
+        StorageError si no se puede listar.
+        """
+        clave = carpeta.lower()
+        with self.lock:
+            previo = self.data["lados"].get(clave)
+        archivos = modo = None
+        if self.path and previo and previo.get("cursor"):
+            try:
+                entries, cursor = st.cambios(previo["cursor"])
+                archivos = {r: _de_json(v) for r, v in previo["archivos"].items()}
+                for e in entries:
+                    if isinstance(e, Archivo):
+                        archivos[e.ruta.lower()] = e
+                    elif isinstance(e, Borrado):
+                        archivos.pop(e.ruta.lower(), None)
+                modo = f"incremental ({len(entries)} cambios)"
+                with self.lock:
+                    self.stats["incremental"] += 1
+                    self.stats["cambios"] += len(entries)
+            except CursorInvalido as e:
+                print(f"[WARN] Cursor de {carpeta} inválido ({e}); listado completo")
+        if archivos is None:
+            entries, cursor = st.listar(carpeta)
+            archivos = {e.ruta.lower(): e for e in entries if isinstance(e, Archivo)}
+            modo = "completo"
+            with self.lock:
+                self.stats["completo"] += 1
+
+        if podar:
+            archivos = {r: a for r, a in archivos.items() if not podar(a)}
+        nuevo = {"cursor": cursor, "archivos": {r: _a_json(a) for r, a in archivos.items()}}
+        with self.lock:
+            if nuevo != previo:
+                self.data["lados"][clave] = nuevo
+                self.sucio = True
+        return list(archivos.values()), modo
+
+    def guardar(self) -> None:
+        with self.lock:
+            if not (self.path and self.sucio):
+                return
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(self.data, ensure_ascii=False, separators=(",", ":")), encoding="utf-8")
+            os.replace(tmp, self.path)
+            self.sucio = False
+
+    def resumen(self) -> str:
+        s = self.stats
+        return (f"Listados: {s['incremental']} incrementales ({s['cambios']} cambios), "
+                f"{s['completo']} completos ({self.path or 'sin estado'})")
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+ingest_journal.py — Bitácora persistente del lote de procesar_videos_ffmpeg.py.
+
+Registra por clip la última etapa completada (descargado → renderizado → subido →
+borrado) junto con el sha256 de cada artefacto. Los artefactos viven en un
+directorio estable por clip (no en un mkdtemp), así que si el runner se cae a
+mitad de lote la siguiente corrida:
+  - no vuelve a descargar si input.mp4 sigue ahí y coincide su hash,
+  - no vuelve a codificar si output.mp4 sigue ahí y coincide su hash,
+  - solo reintenta la subida / el borrado del original.
+
+Cada escritura es atómica (tmp + os.replace): un corte a media escritura deja la
+versión anterior, nunca un JSON roto.
+
+Antes de guardar la bitácora en la caché de Actions se poda (python ingest_journal.py):
+vencidos fuera, workdirs huérfanos fuera y artefactos acotados a JOURNAL_CACHE_MAX_MB,
+para que los output.mp4 no se coman la cuota de caché del repo (la de medios).
+
+Env (solo para el modo script):
+  JOURNAL_DIR, JOURNAL_TTL_H   -> mismos que procesar_videos_ffmpeg.py
+  JOURNAL_CACHE_MAX_MB         -> tope de artefactos que se guardan (default 1024)
+"""
+import os
+import json
+import shutil
+import time
+from pathlib import Path
+from threading import Lock
+
+JOURNAL_DIR          = os.environ.get("JOURNAL_DIR", ".cache/journal")
+JOURNAL_TTL_H        = float(os.environ.get("JOURNAL_TTL_H", "48"))
+JOURNAL_CACHE_MAX_MB = float(os.environ.get("JOURNAL_CACHE_MAX_MB", "1024"))
+
+ETAPAS = ("descargado", "renderizado", "subido", "borrado")
+
+
+class Journal:
+    def __init__(self, root: Path, ttl_hours: float = 48):
+        self.root = Path(root).resolve()
+        self.path = self.root / "journal.json"
+        self.ttl = ttl_hours * 3600
+        self.lock = Lock()
+        self.root.mkdir(parents=True, exist_ok=True)
+        try:
+            self.data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            self.data = {}
+
+    def _flush(self) -> None:
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self.data, ensure_ascii=False, indent=1, sort_keys=True), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+    def workdir(self, nombre: str) -> Path:
+        d = self.root / "trabajo" / Path(nombre).stem
+        d.mkdir(parents=True, exist_ok=True)
+        return d
+
+    def get(self, nombre: str) -> dict:
+        with self.lock:
+            return dict(self.data.get(nombre) or {})
+
+    def alcanzo(self, nombre: str, etapa: str) -> bool:
+        """¿El clip ya completó `etapa` (o una posterior)?"""
+        actual = self.get(nombre).get("etapa")
+        return actual in ETAPAS and ETAPAS.index(actual) >= ETAPAS.index(etapa)
+
+    def marcar(self, nombre: str, etapa: str, **hashes) -> None:
+        with self.lock:
+            entry = self.data.setdefault(nombre, {})
+            entry["etapa"] = etapa
+            entry["ts"] = time.time()
+            entry.update(hashes)
+            self._flush()
+
+    def limpiar_artefactos(self, nombre: str) -> None:
+        shutil.rmtree(self.root / "trabajo" / Path(nombre).stem, ignore_errors=True)
+
+    def cerrar(self, nombre: str) -> None:
+        """Clip terminado: fuera de la bitácora y sin artefactos."""
+        with self.lock:
+            self.data.pop(nombre, None)
+            self._flush()
+        self.limpiar_artefactos(nombre)
+
+    def purgar_viejos(self) -> list:
+        """Descarta entradas (y artefactos) más viejos que el TTL. Devuelve los nombres."""
+        ahora = time.time()
+        with self.lock:
+            viejos = [n for n, e in self.data.items() if ahora - e.get("ts", 0) > self.ttl]
+        for n in viejos:
+            self.cerrar(n)
+        return viejos
+
+    def pendientes(self) -> dict:
+        with self.lock:
+            return {n: e.get("etapa") for n, e in self.data.items()}
+
+    def podar(self, max_mb: float) -> tuple:
+        """
+        Purga lo vencido y los workdirs sin entrada; si los artefactos siguen pasando
+        de max_mb, cierra los clips más viejos que todavía dependen de ellos (sin
+        artefacto esa etapa se rehace igual). Lo ya "subido" no necesita artefactos y
+        queda. Devuelve (MB antes, MB después).
+        """
+        trabajo = self.root / "trabajo"
+        mb = lambda d: sum(f.stat().st_size for f in d.rglob("*") if f.is_file()) / 1e6
+        antes = mb(trabajo) if trabajo.exists() else 0.0
+        self.purgar_viejos()
+        with self.lock:
+            vivos = {Path(n).stem for n in self.data}
+        for d in (trabajo.iterdir() if trabajo.exists() else []):
+            if d.name not in vivos:
+                shutil.rmtree(d, ignore_errors=True)
+        tamanos = {d.name: mb(d) for d in trabajo.iterdir()} if trabajo.exists() else {}
+        total = sum(tamanos.values())
+        with self.lock:
+            por_edad = sorted(self.data.items(), key=lambda kv: kv[1].get("ts", 0))
+        for nombre, e in por_edad:
+            if total <= max_mb:
+                break
+            if e.get("etapa") in ("subido", "borrado"):
+                continue
+            total -= tamanos.get(Path(nombre).stem, 0.0)
+            self.cerrar(nombre)
+        return antes, max(total, 0.0)
+
+
+if __name__ == "__main__":
+    j = Journal(JOURNAL_DIR, JOURNAL_TTL_H)
+    antes, despues = j.podar(JOURNAL_CACHE_MAX_MB)
+    print(f"🧹 Bitácora podada: {antes:.0f} MB → {despues:.0f} MB de artefactos "
+          f"(tope {JOURNAL_CACHE_MAX_MB:g} MB), {len(j.pendientes())} clips en curso")
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+ingest_scheduler.py — Prioridad del backlog de Entrantes para procesar_videos_ffmpeg.py.
+
+Cada clip pendiente recibe un puntaje:
+  + W_VIVO      si su lado tiene latido reciente (heartbeats.txt, ≤ HB_TTL_SECONDS):
+                hay jugadores en la cancha esperando su puntazo. Crece a medida que
+                el clip se acerca/pasa DEADLINE_VIVO_MIN desde que llegó.
+                (mitad si late otro lado de la misma cancha)
+  + W_EDAD      × log(1 + minutos en cola): lo viejo sube despacio, nunca se muere de hambre
+  - W_COSTO     × MB / 100: a igualdad, primero lo barato de codificar
+  - W_JUSTICIA  × clips del mismo club ya elegidos en este lote: un club con
+                cientos de pendientes no acapara el lote entero (no aplica a
+                lados en vivo: esos van siempre primero)
+
+Env (todas opcionales):
+  PRIO_W_VIVO / PRIO_W_EDAD / PRIO_W_COSTO / PRIO_W_JUSTICIA, DEADLINE_VIVO_MIN,
+  HB_PATH, HB_TTL_SECONDS (mismos que supervisor_core.py)
+"""
+import os
+import math
+import json
+from datetime import datetime, timezone
+from typing import NamedTuple, Optional
+
+W_VIVO            = float(os.environ.get("PRIO_W_VIVO", "10"))
+W_EDAD            = float(os.environ.get("PRIO_W_EDAD", "1"))
+W_COSTO           = float(os.environ.get("PRIO_W_COSTO", "0.5"))
+W_JUSTICIA        = float(os.environ.get("PRIO_W_JUSTICIA", "1.5"))
+DEADLINE_VIVO_MIN = float(os.environ.get("DEADLINE_VIVO_MIN", "5"))
+
+HB_PATH           = os.environ.get("HB_PATH", "/PUNTAZO/ENTRANTES/heartbeats.txt")
+HB_TTL_SECONDS    = int(os.environ.get("HB_TTL_SECONDS", "300"))
+
+
+class Prioridad(NamedTuple):
+    nombre: str
+    puntaje: float
+    vivo: bool
+    llegada: Optional[datetime]
+
+
+def _utc(s: str) -> Optional[datetime]:
+    try:
+        dt = datetime.fromisoformat(s.replace("Z", "+00:00"))
+    except (AttributeError, ValueError):
+        return None
+    return dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt.astimezone(timezone.utc)
+
+
+def latidos(data: dict) -> dict:
+    """heartbeats.txt ya parseado → {(loc, can, lado): último latido UTC}."""
+    out = {}
+    for v in (data.get("pis") or {}).values():
+        last = _utc(v.get("last") or "")
+        clave = (v.get("loc"), v.get("can"), v.get("lado"))
+        if last and all(clave) and (clave not in out or last > out[clave]):
+            out[clave] = last
+    return out
+
+
+def lados_vivos(data: dict, ahora: Optional[datetime] = None) -> set:
+    ahora = ahora or datetime.now(timezone.utc)
+    return {k for k, t in latidos(data).items() if (ahora - t).total_seconds() <= HB_TTL_SECONDS}
+
+
+def leer_lados_vivos(st) -> set:
+    """Lados con latido reciente según HB_PATH en el storage; vacío si no se puede leer."""
+    try:
+        return lados_vivos(json.loads(st.leer_bytes(HB_PATH).decode("utf-8") or "{}"))
+    except Exception:
+        return set()
+
+
+def priorizar(pendientes: dict, patron, vivos: set, limite: int,
+              ahora: Optional[datetime] = None) -> list:
+    """
+    Ordena `pendientes` ({nombre: {size, modificado}}) por puntaje y devuelve los
+    primeros `limite` como [Prioridad]. La justicia por club se aplica de forma
+    greedy: cada clip de backlog elegido de un club baja W_JUSTICIA al resto de
+    ese club. Los nombres que no cumplen `patron` van al final con puntaje -inf
+    (igual que ordenar_plan con los que no tienen timestamp): se planifican, no se pierden.
+    """
+    ahora = ahora or datetime.now(timezone.utc)
+    canchas_vivas = {(loc, can) for loc, can, _ in vivos}
+    base = []; sin_patron = []
+    for nombre, info in pendientes.items():
+        m = patron.match(nombre)
+        if not m:
+            sin_patron.append(Prioridad(nombre, float("-inf"), False, _utc((info or {}).get("modificado") or "")))
+            continue
+        lado = (m.group("loc"), m.group("can"), m.group("lado"))
+        llegada = _utc((info or {}).get("modificado") or "")
+        edad_min = max(0.0, (ahora - llegada).total_seconds() / 60) if llegada else 0.0
+        p = W_EDAD * math.log1p(edad_min) - W_COSTO * ((info or {}).get("size") or 0) / 1e8
+        vivo = lado in vivos
+        if vivo:
+            p += W_VIVO * (1 + min(edad_min / DEADLINE_VIVO_MIN, 2))
+        elif lado[:2] in canchas_vivas:
+            p += W_VIVO / 2
+        base.append(Prioridad(nombre, p, vivo, llegada))
+
+    def ajustado(prio: Prioridad) -> float:
+        if prio.vivo:
+            return prio.puntaje
+        return prio.puntaje - W_JUSTICIA * por_club.get(prio.nombre.split("_", 1)[0], 0)
+
+    elegidos = []; por_club = {}
+    restantes = sorted(base, key=lambda x: -x.puntaje)
+    while restantes and len(elegidos) < limite:
+        i = max(range(len(restantes)), key=lambda k: ajustado(restantes[k]))
+        prio = restantes.pop(i)
+        elegidos.append(prio._replace(puntaje=round(ajustado(prio), 2)))
+        if not prio.vivo:
+            club = prio.nombre.split("_", 1)[0]
+            por_club[club] = por_club.get(club, 0) + 1
+    return elegidos + sin_patron[:max(0, limite - len(elegidos))]
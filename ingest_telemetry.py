@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+ingest_telemetry.py — Telemetría por clip de procesar_videos_ffmpeg.py.
+
+Cada clip terminado (ok o fallido) deja un registro JSON en una línea del JSONL:
+duración y espera en cola por etapa, bytes bajados/subidos, duración de entrada
+y salida, fps de encode, velocidad (× tiempo real) y latencia llegada → publicado
+(separada entre canchas en vivo y backlog). Al final de la corrida
+resumen() da p50/p95 por métrica para dimensionar runners y detectar regresiones.
+
+El JSONL se abre en modo append: varias corridas se acumulan en el mismo archivo.
+"""
+import json
+import math
+from pathlib import Path
+from threading import Lock
+
+
+def percentil(valores: list, p: float) -> float:
+    """Percentil por rango más cercano (p en 0..100)."""
+    v = sorted(valores)
+    if not v:
+        return 0.0
+    k = max(0, math.ceil(p / 100 * len(v)) - 1)
+    return v[k]
+
+
+class Telemetry:
+    def __init__(self, path: Path):
+        self.path = Path(path).resolve()
+        self.lock = Lock()
+        self.registros = []
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    def registrar(self, registro: dict) -> None:
+        linea = json.dumps(registro, ensure_ascii=False, sort_keys=True)
+        with self.lock:
+            self.registros.append(registro)
+            with self.path.open("a", encoding="utf-8") as f:
+                f.write(linea + "\n")
+
+    def _series(self) -> dict:
+        series = {}
+        def agregar(nombre, valor):
+            if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+                series.setdefault(nombre, []).append(valor)
+        for r in self.registros:
+            if not r.get("ok"):
+                continue
+            for etapa, t in (r.get("etapas") or {}).items():
+                agregar(f"{etapa} s", t.get("s"))
+                agregar(f"{etapa} espera s", t.get("espera"))
+            for campo in ("render_s", "fps_encode", "speed", "descarga_mbps", "subida_mbps"):
+                agregar(campo, r.get(campo))
+            agregar(f"latencia_s {'vivo' if r.get('vivo') else 'backlog'}", r.get("latencia_s"))
+        return series
+
+    def resumen(self) -> list:
+        """Líneas 'métrica  p50  p95  n' de los clips OK de esta corrida."""
+        lineas = []
+        for nombre, v in self._series().items():
+            lineas.append(f"{nombre:<18} p50={percentil(v, 50):8.2f}  p95={percentil(v, 95):8.2f}  n={len(v)}")
+        return lineas
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+link_cache.py — Caché persistente ruta → link público para gestion_indice_ci.py.
+
+Cada entrada guarda la URL directa y la versión del archivo (rev en Dropbox) con
+la que se obtuvo; si el archivo cambia, la entrada deja de valer y se vuelve a
+pedir el link. Cuando una corrida tiene muchos faltantes (caché fría o vencida)
+se precarga de una vez con el listado paginado de links compartidos de la cuenta
+(storage.links_compartidos), así que solo los archivos realmente nuevos llegan a
+crear link.
+
+El JSON se escribe atómico (tmp + os.replace) al final de la corrida y solo si
+cambió. Es seguro entre hilos: gestion_indice_ci.py genera varios lados a la vez
+con una sola caché. Las entradas que no se usan en LINK_CACHE_TTL_DAYS se descartan.
+
+Env:
+  LINK_CACHE_PATH          -> JSON de la caché (default .cache/links.json; vacío = sin caché)
+  LINK_PREFILL_MIN         -> faltantes a partir de los cuales conviene precargar (default 20)
+  LINK_PREFILL_TTL_HOURS   -> cada cuánto se permite repetir la precarga (default 24)
+  LINK_CACHE_TTL_DAYS      -> días sin uso antes de descartar una entrada (default 30)
+"""
+import os
+import json
+import time
+from threading import Lock
+from pathlib import Path
+
+LINK_CACHE_PATH        = os.environ.get("LINK_CACHE_PATH", ".cache/links.json")
+LINK_PREFILL_MIN       = int(os.environ.get("LINK_PREFILL_MIN", "20"))
+LINK_PREFILL_TTL_HOURS = float(os.environ.get("LINK_PREFILL_TTL_HOURS", "24"))
+LINK_CACHE_TTL_DAYS    = float(os.environ.get("LINK_CACHE_TTL_DAYS", "30"))
+
+
+class LinkCache:
+    def __init__(self, st, path=LINK_CACHE_PATH):
+        self.st = st
+        self.path = Path(path).resolve() if path else None
+        self.data = {"v": 1, "precarga": 0, "links": {}}
+        self.sucio = False
+        self.lock = Lock()
+        self.stats = {"cache": 0, "precargados": 0, "creados": 0, "sin_link": 0}
+        if self.path:
+            try:
+                data = json.loads(self.path.read_text(encoding="utf-8"))
+                if data.get("v") == 1 and isinstance(data.get("links"), dict):
+                    self.data = data
+            except (FileNotFoundError, ValueError):
+                pass
+
+    def _vigente(self, archivo) -> dict:
+        e = self.data["links"].get(archivo.ruta.lower())
+        return e if e and e.get("rev") == archivo.version else None
+
+    def _guardar_entrada(self, ruta: str, url: str, rev) -> None:
+        with self.lock:
+            self.data["links"][ruta.lower()] = {"url": url, "rev": rev, "usado": time.time()}
+            self.sucio = True
+
+    def precargar(self, archivos: list) -> None:
+        """
+        Si faltan LINK_PREFILL_MIN o más links, trae todos los compartidos de una vez.
+        Solo se guardan los que cubren un faltante (misma ruta y rev); el resto de la
+        cuenta no entra a la caché.
+        """
+        faltan = {a.ruta.lower(): a for a in archivos if not self._vigente(a)}
+        vencida = time.time() - self.data.get("precarga", 0) > LINK_PREFILL_TTL_HOURS * 3600
+        if len(faltan) < LINK_PREFILL_MIN or not vencida:
+            return
+        n = 0
+        try:
+            for ruta, url, rev in self.st.links_compartidos():
+                a = faltan.get(ruta.lower())
+                if a and a.version == rev:
+                    self._guardar_entrada(ruta, url, rev)
+                    n += 1
+        except Exception as e:
+            print(f"[WARN] Precarga de links falló ({e}); se piden uno por uno")
+            return
+        self.data["precarga"] = time.time()
+        self.sucio = True
+        self.stats["precargados"] += n
+        print(f"[DEBUG] Precarga de links: {n}/{len(faltan)} faltantes ya tenían link compartido")
+
+    def url(self, archivo):
+        """Link público directo de `archivo` (Archivo de storage); None si no se pudo."""
+        with self.lock:
+            e = self._vigente(archivo)
+            if e:
+                self.stats["cache"] += 1
+                if time.time() - e.get("usado", 0) > 86400:
+                    e["usado"] = time.time(); self.sucio = True
+                return e["url"]
+        url = self.st.link_publico(archivo.ruta)   # fuera del lock: es la llamada lenta
+        with self.lock:
+            self.stats["creados" if url else "sin_link"] += 1
+        if not url:
+            return None
+        self._guardar_entrada(archivo.ruta, url, archivo.version)
+        return url
+
+    def guardar(self) -> None:
+        with self.lock:
+            if not (self.path and self.sucio):
+                return
+            limite = time.time() - LINK_CACHE_TTL_DAYS * 86400
+            self.data["links"] = {r: e for r, e in self.data["links"].items() if e.get("usado", 0) >= limite}
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(self.data, ensure_ascii=False, separators=(",", ":")), encoding="utf-8")
+            os.replace(tmp, self.path)
+            self.sucio = False
+
+    def resumen(self) -> str:
+        s = self.stats
+        return (f"Links: {s['cache']} de caché ({s['precargados']} por precarga), {s['creados']} pedidos "
+                f"al storage, {s['sin_link']} sin link ({len(self.data['links'])} en {self.path or 'memoria'})")
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+media_probe.py — Un solo ffprobe (JSON) por archivo, con memo en proceso y caché
+persistente para assets estáticos (intro/outro de clubs, segmentos normalizados).
+
+probe(path) devuelve un descriptor con todo lo que piden los pipelines:
+  width, height, fps ("30000/1001"), vcodec, profile, pix_fmt, duration,
+  has_audio, acodec, sample_rate, channels, channel_layout, streams (crudo).
+
+Con persistent=True el descriptor se guarda en PROBE_CACHE_PATH indexado por el
+sha256 del contenido, así que sobrevive entre corridas y se invalida solo si el
+archivo cambia.
+
+Env:
+  PROBE_CACHE_PATH  -> JSON de la caché persistente (default .cache/probe.json)
+"""
+import os
+import json
+import hashlib
+import subprocess
+from pathlib import Path
+from threading import Lock
+
+PROBE_CACHE_PATH = Path(os.environ.get("PROBE_CACHE_PATH", ".cache/probe.json")).resolve()
+
+_lock = Lock()
+_memo: dict = {}          # (ruta, mtime_ns, tamaño) → descriptor
+_hash_memo: dict = {}     # (ruta, mtime_ns, tamaño) → sha256
+_persistent = None        # sha256 → descriptor (se carga al primer uso)
+
+
+class ProbeError(RuntimeError):
+    pass
+
+
+def _stat_key(p: Path) -> tuple:
+    st = p.stat()
+    return (str(p), st.st_mtime_ns, st.st_size)
+
+
+def sha256_file(p: Path) -> str:
+    """sha256 del contenido (memoizado por ruta+mtime+tamaño durante la corrida)."""
+    p = Path(p)
+    key = _stat_key(p)
+    with _lock:
+        if key in _hash_memo:
+            return _hash_memo[key]
+    h = hashlib.sha256()
+    with p.open("rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    with _lock:
+        _hash_memo[key] = h.hexdigest()
+    return _hash_memo[key]
+
+
+def _load_persistent() -> dict:
+    global _persistent
+    if _persistent is None:
+        try:
+            _persistent = json.loads(PROBE_CACHE_PATH.read_text(encoding="utf-8"))
+        except Exception:
+            _persistent = {}
+    return _persistent
+
+
+def _save_persistent() -> None:
+    PROBE_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    tmp = PROBE_CACHE_PATH.with_suffix(".tmp")
+    tmp.write_text(json.dumps(_persistent, indent=1, sort_keys=True), encoding="utf-8")
+    os.replace(tmp, PROBE_CACHE_PATH)
+
+
+def _run_ffprobe(p: Path) -> dict:
+    try:
+        out = subprocess.check_output(
+            ["ffprobe", "-v", "error", "-show_streams", "-show_format", "-of", "json", str(p)],
+            text=True, stderr=subprocess.STDOUT, timeout=30
+        )
+        raw = json.loads(out)
+    except Exception as e:
+        raise ProbeError(f"ffprobe falló para {p}: {e}") from e
+
+    streams = raw.get("streams") or []
+    v = next((s for s in streams if s.get("codec_type") == "video"), {})
+    a = next((s for s in streams if s.get("codec_type") == "audio"), {})
+    try:
+        duration = float((raw.get("format") or {}).get("duration"))
+    except (TypeError, ValueError):
+        duration = None
+    fps = v.get("r_frame_rate") or ""
+    try:
+        num, den = fps.split("/")
+        if int(num) <= 0 or int(den) <= 0:
+            fps = ""
+    except ValueError:
+        fps = ""
+    return {
+        "width":          v.get("width"),
+        "height":         v.get("height"),
+        "fps":            fps or None,
+        "vcodec":         v.get("codec_name"),
+        "profile":        v.get("profile"),
+        "pix_fmt":        v.get("pix_fmt"),
+        "duration":       duration,
+        "has_audio":      bool(a),
+        "acodec":         a.get("codec_name"),
+        "sample_rate":    int(a["sample_rate"]) if a.get("sample_rate") else None,
+        "channels":       a.get("channels"),
+        "channel_layout": a.get("channel_layout"),
+        "streams":        streams,
+    }
+
+
+def probe(path, persistent: bool = False) -> dict:
+    """
+    Descriptor de medios de `path` (un solo ffprobe por archivo/versión).
+    persistent=True: además consulta/guarda la caché en disco por hash de contenido
+    (usar solo con archivos que no cambian, p.ej. assets de clubs).
+    Lanza ProbeError si ffprobe no puede leer el archivo.
+    """
+    p = Path(path).resolve()
+    key = _stat_key(p)
+    with _lock:
+        if key in _memo:
+            return _memo[key]
+
+    digest = sha256_file(p) if persistent else None
+    if digest:
+        with _lock:
+            desc = _load_persistent().get(digest)
+        if desc:
+            with _lock:
+                _memo[key] = desc
+            return desc
+
+    desc = _run_ffprobe(p)
+    with _lock:
+        _memo[key] = desc
+        if digest:
+            _load_persistent()[digest] = desc
+            _save_persistent()
+    return desc
@@ -1,33 +1,21 @@
 #!/usr/bin/env python3
 import os
 import re
-import requests
 import dropbox
 import cloudinary
 import cloudinary.uploader
 import cloudinary.api
 import time
-from base64 import b64encode
-
-# === Autenticación dinámica con refresh_token ===
-APP_KEY = os.environ["DROPBOX_APP_KEY"]
-APP_SECRET = os.environ["DROPBOX_APP_SECRET"]
-REFRESH_TOKEN = os.environ["DROPBOX_REFRESH_TOKEN"]
-
-auth_header = b64encode(f"{APP_KEY}:{APP_SECRET}".encode()).decode()
-res = requests.post(
-    "https://api.dropbox.com/oauth2/token",
-    headers={"Authorization": f"Basic {auth_header}"},
-    data={
-        "grant_type": "refresh_token",
-        "refresh_token": REFRESH_TOKEN,
-    },
-)
-res.raise_for_status()
-ACCESS_TOKEN = res.json()["access_token"]
-
-# === Inicializa Dropbox con token renovado ===
-dbx = dropbox.Dropbox(ACCESS_TOKEN)
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from threading import Lock
+
+from dropbox_client import get_client, api_usage_summary
+from storage import DropboxStorage, LoteStorage
+
+# === Cliente Dropbox compartido (refresh token + keep-alive + reintentos) ===
+dbx = get_client()
+# Originales de Entrantes ya guardados: se borran todos juntos al final (files_delete_batch)
+BORRADOS = LoteStorage(DropboxStorage(dbx))
 
 # === Selección dinámica de cuenta de Cloudinary ===
 use_second = os.getenv("USE_SECOND_CLOUDINARY", "false").lower() == "true"
@@ -48,90 +36,199 @@ cloudinary.config(cloud_name=CLOUD_NAME, api_key=API_KEY, api_secret=API_SECRET)
 CARPETA_ENTRANTES = "/Puntazo/Entrantes"
 CARPETA_RAIZ = "/Puntazo/Locaciones"
 
+# === Concurrencia: subidas a Cloudinary + save_url en paralelo, un solo poller ===
+WORKERS = int(os.environ.get("CLOUDINARY_WORKERS", "4"))
+POLL_SECONDS = float(os.environ.get("SAVE_URL_POLL_SECONDS", "5"))
+SAVE_URL_TIMEOUT = float(os.environ.get("SAVE_URL_TIMEOUT_SECONDS", "900"))   # por clip
+
 # === Patrón para extraer loc, can, lado ===
 PATRON_VIDEO = re.compile(r"^(?P<loc>[^_]+)_(?P<can>[^_]+)_(?P<lado>[^_]+)_\d{8}_\d{6}\.mp4$")
 
-# === Lista de videos en Entrantes ===
-res = dbx.files_list_folder(CARPETA_ENTRANTES)
-videos_nuevos = [entry for entry in res.entries if entry.name.endswith(".mp4")]
+print_lock = Lock()
+def log(msg: str):
+    with print_lock:
+        print(msg, flush=True)
 
-if not videos_nuevos:
-    print("✅ No hay videos nuevos por procesar.")
-    exit()
 
-# === Procesar videos ===
-for video in videos_nuevos:
-    nombre = video.name
-    match = PATRON_VIDEO.match(nombre)
+def listar_entrantes() -> list:
+    """Todos los .mp4 de Entrantes (paginado completo)."""
+    res = dbx.files_list_folder(CARPETA_ENTRANTES)
+    entries = list(res.entries)
+    while res.has_more:
+        res = dbx.files_list_folder_continue(res.cursor)
+        entries += res.entries
+    return [e for e in entries if isinstance(e, dropbox.files.FileMetadata) and e.name.endswith(".mp4")]
 
-    if not match:
-        print(f"⚠️ Nombre no válido: {nombre}")
-        continue
 
-    loc, can, lado = match.group("loc"), match.group("can"), match.group("lado")
-    ruta_origen = f"{CARPETA_ENTRANTES}/{nombre}"
-    ruta_destino = f"{CARPETA_RAIZ}/{loc}/{can}/{lado}/{nombre}"
+# === Logo por club: una consulta a Cloudinary por club y corrida ===
+_logos: dict = {}        # loc → existe
+_logo_locks: dict = {}
+_logos_lock = Lock()
 
-    print(f"🚀 Procesando: {nombre}")
+def logo_existe(loc: str) -> bool:
+    with _logos_lock:
+        lock = _logo_locks.setdefault(loc, Lock())
+    with lock:
+        if loc not in _logos:
+            try:
+                cloudinary.api.resource(loc)
+                _logos[loc] = True
+            except Exception:
+                _logos[loc] = False
+                log(f"⚠️ Logo de \"{loc}\" no encontrado en Cloudinary. Se usará solo el logo principal.")
+        return _logos[loc]
 
-    # 1. Link temporal de Dropbox
-    temp_link = dbx.files_get_temporary_link(ruta_origen).link
 
-    # 2. Preparar URL Cloudinary con overlays
-    logo_public_id = loc
-    logo_overlay_id = loc
+def public_id(job: dict) -> str:
+    return f"videos_con_marca/{job['base_name']}"
+
 
-    segundo_logo_existe = True
-    try:
-        cloudinary.api.resource(logo_public_id)
-    except Exception:
-        segundo_logo_existe = False
-        print(f"⚠️ Logo de \"{loc}\" no encontrado en Cloudinary. Se usará solo el logo principal.")
+def enviar(job: dict) -> dict:
+    """Link temporal → upload a Cloudinary → files_save_url. Devuelve el job con su async_job_id."""
+    nombre, loc = job["nombre"], job["loc"]
+    log(f"🚀 Procesando: {nombre}")
 
-    base_name = os.path.splitext(nombre)[0]
+    # 1. Link temporal de Dropbox
+    temp_link = dbx.files_get_temporary_link(job["ruta_origen"]).link
+
+    # 2. Preparar URL Cloudinary con overlays
     url_cloudinary = f"https://res.cloudinary.com/{CLOUD_NAME}/video/upload"
     url_cloudinary += f"/l_puntazo_video,w_0.5/fl_layer_apply,g_north_west,x_30,y_30"
-    if segundo_logo_existe:
-        url_cloudinary += f"/l_{logo_overlay_id},w_0.5/fl_layer_apply,g_north_east,x_15,y_15"
-    url_cloudinary += f"/q_auto,f_mp4/videos_con_marca/{base_name}.mp4"
+    if logo_existe(loc):
+        url_cloudinary += f"/l_{loc},w_0.5/fl_layer_apply,g_north_east,x_15,y_15"
+    url_cloudinary += f"/q_auto,f_mp4/{public_id(job)}.mp4"
 
     # 3. Subir video a Cloudinary
     cloudinary.uploader.upload(
         temp_link,
         resource_type="video",
-        public_id=f"videos_con_marca/{base_name}",
+        public_id=public_id(job),
         overwrite=True
     )
 
-    # 4. Guardar video procesado en carpeta final de Dropbox
-    save_result = dbx.files_save_url(ruta_destino, url_cloudinary)
-    print(f"✅ Video guardado en carpeta final: {ruta_destino}")
-
+    # 4. Guardar video procesado en carpeta final de Dropbox (job asíncrono de Dropbox)
+    save_result = dbx.files_save_url(job["ruta_destino"], url_cloudinary)
+    job["async_job_id"] = None
     if hasattr(save_result, "is_complete") and not save_result.is_complete():
-        job_id = None
         try:
-            job_id = save_result.get_async_job_id()
+            job["async_job_id"] = save_result.get_async_job_id()
         except Exception:
-            job_id = getattr(save_result, "async_job_id", None)
-        if job_id:
-            max_intentos = 180
-            intentos = 0
-            while intentos < max_intentos:
-                status = dbx.files_save_url_check_job_status(job_id)
-                if status.is_complete():
-                    break
-                if status.is_failed():
-                    print(f"⚠️ Falló la descarga de {nombre} desde Cloudinary a Dropbox.")
-                    cloudinary.uploader.destroy(f"videos_con_marca/{base_name}", resource_type="video")
-                    print(f"🗑️ Eliminado de Cloudinary: videos_con_marca/{base_name}")
+            job["async_job_id"] = getattr(save_result, "async_job_id", None)
+    job["t_envio"] = time.monotonic()
+    return job
+
+
+def finalizar(job: dict, ok: bool) -> None:
+    """Borra el intermedio de Cloudinary; si el clip quedó guardado, encola el borrado del original."""
+    cloudinary.uploader.destroy(public_id(job), resource_type="video")
+    log(f"🗑️ Eliminado de Cloudinary: {public_id(job)}")
+    if ok:
+        log(f"✅ Video guardado en carpeta final: {job['ruta_destino']}")
+        BORRADOS.borrar(job["ruta_origen"])
+
+
+def estado_save_url(job: dict) -> str:
+    """Estado del save_url del job: "ok", "fallo" o "pendiente"."""
+    if not job["async_job_id"]:
+        return "ok"
+    status = dbx.files_save_url_check_job_status(job["async_job_id"])
+    if status.is_complete():
+        return "ok"
+    if status.is_failed():
+        return "fallo"
+    return "pendiente"
+
+
+def main():
+    videos_nuevos = listar_entrantes()
+    if not videos_nuevos:
+        log("✅ No hay videos nuevos por procesar.")
+        return
+
+    jobs = []
+    for video in videos_nuevos:
+        match = PATRON_VIDEO.match(video.name)
+        if not match:
+            log(f"⚠️ Nombre no válido: {video.name}")
+            continue
+        loc, can, lado = match.group("loc"), match.group("can"), match.group("lado")
+        jobs.append({
+            "nombre": video.name, "loc": loc,
+            "base_name": os.path.splitext(video.name)[0],
+            "ruta_origen": f"{CARPETA_ENTRANTES}/{video.name}",
+            "ruta_destino": f"{CARPETA_RAIZ}/{loc}/{can}/{lado}/{video.name}",
+        })
+    log(f"📋 {len(jobs)} videos → {WORKERS} subidas en paralelo, poll cada {POLL_SECONDS:g}s")
+
+    ok_count = fail_count = 0
+    with ThreadPoolExecutor(max_workers=WORKERS) as ex:
+        envios = {ex.submit(enviar, job): job for job in jobs}
+        cierres = {}    # future de finalizar → (job, guardado)
+        en_curso = []   # jobs con save_url enviado, esperando a Dropbox
+
+        # Un solo poller: recoge envíos terminados y cada POLL_SECONDS consulta todos
+        # los save_url pendientes (el lote tarda lo que su clip más lento)
+        proximo_poll = time.monotonic()
+        while envios or en_curso:
+            espera = max(0.0, proximo_poll - time.monotonic())
+            if envios:
+                hechos, _ = wait(envios, timeout=espera, return_when=FIRST_COMPLETED)
+                for fut in hechos:
+                    job = envios.pop(fut)
+                    try:
+                        en_curso.append(fut.result())
+                    except Exception as e:
+                        fail_count += 1
+                        log(f"❌ FAIL: {job['nombre']} → envío: {e}")
+            elif espera:
+                time.sleep(espera)
+            if time.monotonic() < proximo_poll:
+                continue
+            proximo_poll = time.monotonic() + POLL_SECONDS
+
+            seguir = []
+            for job in en_curso:
+                try:
+                    estado = estado_save_url(job)
+                except Exception as e:
+                    log(f"⚠️ No se pudo consultar el save_url de {job['nombre']}: {e}")
+                    estado = "pendiente"
+                if estado == "pendiente" and time.monotonic() - job["t_envio"] > SAVE_URL_TIMEOUT:
+                    log(f"⚠️ {job['nombre']}: save_url sin terminar tras {SAVE_URL_TIMEOUT:.0f}s; "
+                        f"el original queda en Entrantes")
+                    estado = "vencido"
+                if estado == "pendiente":
+                    seguir.append(job)
                     continue
-                intentos += 1
-                time.sleep(5)
-
-    cloudinary.uploader.destroy(f"videos_con_marca/{base_name}", resource_type="video")
-    print(f"🗑️ Eliminado de Cloudinary: videos_con_marca/{base_name}")
-
-    dbx.files_delete_v2(ruta_origen)
-    print(f"🗑️ Eliminado de Entrantes: {ruta_origen}")
-
-print("🏁 Todos los videos fueron procesados y distribuidos.")
+                if estado == "fallo":
+                    log(f"⚠️ Falló la descarga de {job['nombre']} desde Cloudinary a Dropbox.")
+                cierres[ex.submit(finalizar, job, estado == "ok")] = (job, estado == "ok")
+            en_curso = seguir
+
+        for fut, (job, guardado) in cierres.items():
+            try:
+                fut.result()
+                if guardado:
+                    ok_count += 1
+                else:
+                    fail_count += 1
+            except Exception as e:
+                fail_count += 1
+                log(f"❌ FAIL: {job['nombre']} → cierre: {e}")
+
+    # Originales de Entrantes: un solo lote para todos los clips guardados
+    if len(BORRADOS):
+        for ruta, err in sorted(BORRADOS.enviar().items()):
+            if err:
+                ok_count -= 1
+                fail_count += 1
+                log(f"❌ FAIL: {ruta} → no se pudo borrar de Entrantes: {err}")
+            else:
+                log(f"🗑️ Eliminado de Entrantes: {ruta}")
+
+    log(f"🏁 Procesados: OK={ok_count} FALLIDOS={fail_count} de {len(jobs)}")
+    log(f"📡 {api_usage_summary()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,26 +3,32 @@
 
 import os
 import re
+import json
+import hashlib
 import sys
 import shutil
 import tempfile
 import subprocess
+import time
+import queue
+import signal
+import threading
 from pathlib import Path
-from base64 import b64encode
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
 from typing import Optional, Tuple
 
-import requests
-import dropbox
 from threading import Lock
 
+from storage import get_storage, Archivo, Borrado, CursorInvalido, NoEncontrado, LoteStorage
+from media_probe import probe, sha256_file, ProbeError
+from ingest_journal import Journal
+from ingest_telemetry import Telemetry
+from ingest_scheduler import Prioridad, priorizar, leer_lados_vivos
+
 # =========================
 #  Configuración por entorno
 # =========================
-APP_KEY         = os.environ["DROPBOX_APP_KEY"]
-APP_SECRET      = os.environ["DROPBOX_APP_SECRET"]
-REFRESH_TOKEN   = os.environ["DROPBOX_REFRESH_TOKEN"]
-
 LOGO1_PATH      = Path(os.environ.get("LOGO1_PATH", "logos/logo_borde_bicolor.png")).resolve()
 CLUBS_ROOT      = Path(os.environ.get("CLUBS_ROOT", "clubs")).resolve()
 DEBUG           = os.environ.get("DEBUG", "false").lower() in ("1", "true", "yes")
@@ -33,16 +39,87 @@ MAX_PARALLEL         = int(os.environ.get("MAX_PARALLEL", "2"))
 THREADS_PER_FFMPEG   = int(os.environ.get("THREADS_PER_FFMPEG", "2"))
 BATCH_LIMIT          = int(os.environ.get("BATCH_LIMIT", "20"))
 NEWEST_FIRST         = os.environ.get("NEWEST_FIRST", "true").lower() in ("1","true","yes")
+# Orden del lote: "deadline" = puntaje por latido de la cancha, edad, costo y justicia
+# entre clubs (ingest_scheduler.py); "fecha" = orden por timestamp según NEWEST_FIRST
+PRIORIDAD            = os.environ.get("PRIORIDAD", "deadline").lower()
+
+# Pipeline por etapas (descarga → render → subida); PIPELINE=false vuelve a un clip por worker
+PIPELINE             = os.environ.get("PIPELINE", "true").lower() in ("1","true","yes")
+DOWNLOAD_WORKERS     = int(os.environ.get("DOWNLOAD_WORKERS", "2"))
+ENCODE_WORKERS       = int(os.environ.get("ENCODE_WORKERS", str(MAX_PARALLEL)))
+UPLOAD_WORKERS       = int(os.environ.get("UPLOAD_WORKERS", "2"))
+PIPELINE_QUEUE       = int(os.environ.get("PIPELINE_QUEUE", "2"))
+MAX_CLIPS_EN_DISCO   = int(os.environ.get("MAX_CLIPS_EN_DISCO",
+                           str(DOWNLOAD_WORKERS + ENCODE_WORKERS + UPLOAD_WORKERS + 2 * PIPELINE_QUEUE)))
+
+# Planificador de paralelismo: "auto" decide encodes simultáneos × hilos por ffmpeg según
+# cores/RAM/disco y lo ajusta durante el lote; "static" usa ENCODE_WORKERS × THREADS_PER_FFMPEG
+PARALLEL_PLAN        = os.environ.get("PARALLEL_PLAN", "auto").lower()
+MEM_POR_ENCODE_MB    = int(os.environ.get("MEM_POR_ENCODE_MB", "900"))
+DISCO_POR_CLIP_MB    = int(os.environ.get("DISCO_POR_CLIP_MB", "400"))
+PLAN_AJUSTE_CADA     = int(os.environ.get("PLAN_AJUSTE_CADA", "2"))   # clips entre ajustes
+
+# Render: "single" = logos + intro/outro en un solo encode; "two_stage" = flujo original
+RENDER_MODE          = os.environ.get("RENDER_MODE", "single").lower()
+RENDER_BENCHMARK     = os.environ.get("RENDER_BENCHMARK", "false").lower() in ("1","true","yes")
+# Audio del original en copia (-c:a copy) cuando ya es compatible (AAC; para concatenar con
+# intro/outro además 48 kHz estéreo y alineado con el video); si no, se transcodifica a AAC
+AUDIO_PASSTHROUGH    = os.environ.get("AUDIO_PASSTHROUGH", "true").lower() in ("1","true","yes")
+AUDIO_DESFASE_MAX    = float(os.environ.get("AUDIO_DESFASE_MAX", "0.05"))   # s entre inicio de audio y video
+
+# Caché de intro/outro ya normalizados (se ensamblan con concat demuxer + -c copy)
+SEGMENT_CACHE        = os.environ.get("SEGMENT_CACHE", "true").lower() in ("1","true","yes")
+SEGMENT_CACHE_DIR    = Path(os.environ.get("SEGMENT_CACHE_DIR", ".cache/segmentos")).resolve()
+
+# Placa de logos pre-compuesta por club (un solo overlay, sin scale, por clip)
+OVERLAY_PLATE        = os.environ.get("OVERLAY_PLATE", "true").lower() in ("1","true","yes")
+PLATE_CACHE_DIR      = Path(os.environ.get("PLATE_CACHE_DIR", ".cache/placas")).resolve()
 
-# Opcional: pruebas locales sin Dropbox
+# Derivados web en el mismo encode: preview liviano + poster JPEG, subidos como
+# hermanos del clip (<clip>.preview.mp4 y <clip>.jpg)
+PREVIEWS             = os.environ.get("PREVIEWS", "true").lower() in ("1","true","yes")
+PREVIEW_ALTO         = int(os.environ.get("PREVIEW_ALTO", "480"))
+PREVIEW_CRF          = os.environ.get("PREVIEW_CRF", "30")
+PREVIEW_MAXRATE      = os.environ.get("PREVIEW_MAXRATE", "800k")
+POSTER_ALTO          = int(os.environ.get("POSTER_ALTO", "720"))
+POSTER_SEG           = float(os.environ.get("POSTER_SEG", "1.5"))
+
+# Bitácora por clip (etapa + hashes) para reanudar un lote interrumpido sin repetir
+# descargas ni encodes; los artefactos viven en JOURNAL_DIR/trabajo/<clip>
+JOURNAL              = os.environ.get("JOURNAL", "true").lower() in ("1","true","yes")
+JOURNAL_DIR          = Path(os.environ.get("JOURNAL_DIR", ".cache/journal")).resolve()
+JOURNAL_TTL_H        = float(os.environ.get("JOURNAL_TTL_H", "48"))
+
+# Telemetría por clip (un JSON por línea, append); vacío = desactivada
+TELEMETRIA_PATH      = os.environ.get("TELEMETRIA_PATH", ".cache/telemetria/ingest.jsonl")
+
+# Modo daemon: el proceso queda vivo esperando Entrantes (longpoll sobre el cursor) y
+# corre lotes chicos a medida que llegan clips, con cliente, cachés, planificador y
+# bitácora ya calientes. No arranca un lote nuevo si quedan menos de DAEMON_MARGEN
+# segundos del presupuesto; sale solo tras DAEMON_IDLE_EXIT sin trabajo ni latidos.
+DAEMON               = os.environ.get("DAEMON", "false").lower() in ("1","true","yes")
+DAEMON_MAX_RUNTIME   = int(os.environ.get("DAEMON_MAX_RUNTIME_SECONDS", "20700"))   # ~5h45m
+DAEMON_MARGEN        = int(os.environ.get("DAEMON_MARGEN_SECONDS", "900"))
+DAEMON_POLL          = int(os.environ.get("DAEMON_POLL_SECONDS", "120"))
+DAEMON_IDLE_EXIT     = int(os.environ.get("DAEMON_IDLE_EXIT_SECONDS", "1800"))      # 0 = nunca
+DAEMON_BATCH_LIMIT   = int(os.environ.get("DAEMON_BATCH_LIMIT", "6"))
+DAEMON_REINTENTO     = int(os.environ.get("DAEMON_REINTENTO_SECONDS", "600"))       # pausa tras un FAIL
+
+# Opcional: prueba rápida de un solo clip sin storage (para el flujo completo sin red:
+# STORAGE_BACKEND=local + STORAGE_LOCAL_ROOT, ver storage.py)
 DRY_RUN        = os.environ.get("DRY_RUN", "false").lower() in ("1", "true", "yes")
 LOCAL_INPUT    = Path(os.environ.get("LOCAL_INPUT", "input_demo.mp4")).resolve()
 LOCAL_OUTDIR   = Path(os.environ.get("LOCAL_OUTDIR", "_out")).resolve()
 
-# Rutas en Dropbox
+# Rutas en el storage (Dropbox, o el árbol local con STORAGE_BACKEND=local)
 CARPETA_ENTRANTES = os.environ.get("ENTRANTES", "/Puntazo/Entrantes")
 CARPETA_RAIZ      = os.environ.get("DESTINO_RAIZ", "/Puntazo/Locaciones")
 
+# Estado del listado incremental de Entrantes (cursor + pendientes): en el storage, o en un
+# archivo local si ESTADO_ENTRANTES_LOCAL está definido; ambos vacíos = listado completo siempre.
+ESTADO_ENTRANTES       = os.environ.get("ESTADO_ENTRANTES", "/Puntazo/Estado/entrantes.json")
+ESTADO_ENTRANTES_LOCAL = os.environ.get("ESTADO_ENTRANTES_LOCAL", "")
+
 # Patrón de nombre de archivo: loc_can_lado_YYYYMMDD_HHMMSS.mp4
 PATRON_VIDEO = re.compile(
     r"^(?P<loc>[^_]+)_(?P<can>[^_]+)_(?P<lado>[^_]+)_(?P<date>\d{8})_(?P<time>\d{6})\.mp4$"
@@ -57,59 +134,77 @@ def log(msg: str):
 # =========================
 #  Utilidades
 # =========================
-def get_access_token() -> str:
-    auth_header = b64encode(f"{APP_KEY}:{APP_SECRET}".encode()).decode()
-    res = requests.post(
-        "https://api.dropbox.com/oauth2/token",
-        headers={"Authorization": f"Basic {auth_header}"},
-        data={"grant_type": "refresh_token", "refresh_token": REFRESH_TOKEN},
-        timeout=60,
-    )
-    res.raise_for_status()
-    return res.json()["access_token"]
-
 def run_cmd(cmd: list, cwd: Path = None) -> None:
     if DEBUG:
         log("[CMD] " + " ".join(map(str, cmd)))
     subprocess.run(cmd, check=True, cwd=cwd)
 
+def media(p: Path) -> Optional[dict]:
+    """
+    Descriptor de medios (media_probe, un solo ffprobe por archivo). Los assets de
+    clubs y los segmentos cacheados no cambian → caché persistente por hash.
+    None si no se puede leer.
+    """
+    p = Path(p).resolve()
+    estatico = CLUBS_ROOT in p.parents or SEGMENT_CACHE_DIR in p.parents
+    try:
+        return probe(p, persistent=estatico)
+    except ProbeError as e:
+        if DEBUG:
+            log(f"[PROBE] {e}")
+        return None
+
 def ffprobe_dims(p: Path):
     """Devuelve (w,h) del primer stream de video (fallback 1920x1080)."""
-    try:
-        out = subprocess.check_output(
-            ["ffprobe","-v","error","-select_streams","v:0",
-             "-show_entries","stream=width,height",
-             "-of","csv=s=,:p=0", str(p)],
-            text=True, stderr=subprocess.STDOUT, timeout=30
-        ).strip()
-        w,h = out.split(",")
-        return int(w), int(h)
-    except Exception:
-        return 1920,1080
+    d = media(p)
+    if d and d["width"] and d["height"]:
+        return int(d["width"]), int(d["height"])
+    return 1920,1080
+
+def ffprobe_fps(p: Path) -> str:
+    """r_frame_rate del primer stream de video como fracción ("30000/1001"); fallback "30"."""
+    d = media(p)
+    return (d and d["fps"]) or "30"
 
 def has_audio(p: Path) -> bool:
-    try:
-        out = subprocess.check_output(
-            ["ffprobe","-v","error","-select_streams","a:0",
-             "-show_entries","stream=codec_name","-of","csv=p=0", str(p)],
-            text=True, stderr=subprocess.STDOUT, timeout=30
-        ).strip()
-        return bool(out)
-    except Exception:
-        return False
+    d = media(p)
+    return bool(d and d["has_audio"])
 
 def get_duration(p: Path):
     """Duración en segundos (float) del medio; None si no se puede leer."""
+    d = media(p)
+    return d["duration"] if d else None
+
+def _inicio(d: dict, tipo: str) -> Optional[float]:
+    s = next((s for s in d.get("streams") or [] if s.get("codec_type") == tipo), {})
     try:
-        out = subprocess.check_output(
-            ["ffprobe","-v","error","-show_entries","format=duration",
-             "-of","default=noprint_wrappers=1:nokey=1", str(p)],
-            text=True, stderr=subprocess.STDOUT, timeout=30
-        ).strip()
-        return float(out) if out else None
-    except Exception:
+        return float(s["start_time"])
+    except (KeyError, TypeError, ValueError):
         return None
 
+def decidir_audio(p: Path, concat: bool) -> tuple[bool, str]:
+    """
+    ¿Se puede copiar el audio de `p` tal cual? Sin concat alcanza con AAC (va a un
+    MP4); para el concat demuxer con intro/outro cacheados tiene que coincidir con
+    PERFIL_CODEC (AAC 48 kHz estéreo) y arrancar junto al video, porque no pasa por
+    aresample. Devuelve (copiar, descripción para el log).
+    """
+    d = media(p)
+    if not d or not d["has_audio"]:
+        return False, "sin audio"
+    desc = f"{d.get('acodec')} {d.get('sample_rate')}Hz {d.get('channels')}ch"
+    if not AUDIO_PASSTHROUGH:
+        return False, f"{desc} → AAC (AUDIO_PASSTHROUGH=false)"
+    if d.get("acodec") != "aac":
+        return False, f"{desc} → AAC (códec)"
+    if concat:
+        if d.get("sample_rate") != 48000 or d.get("channels") != 2:
+            return False, f"{desc} → AAC 48000Hz 2ch (perfil de concat)"
+        ta, tv = _inicio(d, "audio"), _inicio(d, "video")
+        if ta is None or tv is None or abs(ta - tv) > AUDIO_DESFASE_MAX:
+            return False, f"{desc} → AAC (desfase audio/video {ta}/{tv})"
+    return True, f"{desc} → copia"
+
 def parse_ts_from_name(name: str) -> Optional[Tuple[int,int,int,int,int,int]]:
     m = PATRON_VIDEO.match(name)
     if not m:
@@ -122,194 +217,1105 @@ def parse_ts_from_name(name: str) -> Optional[Tuple[int,int,int,int,int,int]]:
         return None
 
 # =========================
-#  Procesamiento de un archivo
+#  Render
+# =========================
+def ffmpeg_base() -> list:
+    cmd = ["ffmpeg", "-y", "-hide_banner", "-loglevel", "error", "-fflags", "+genpts"]
+    if DEBUG:
+        cmd.append("-report")
+    return cmd
+
+def overlay_chain(src: str, logos: list, first_idx: int, opts: str = "") -> tuple[list, str]:
+    """
+    Filtros de overlays sobre `src`. `logos` = [(path, ancho, posición)], cuyos
+    inputs empiezan en `first_idx`; ancho None = sin scale. `opts` se agrega a
+    cada overlay. Devuelve (filtros, etiqueta de salida).
+    """
+    filters = []; current = src
+    for n, (_, ancho, pos) in enumerate(logos, 1):
+        if ancho:
+            filters.append(f"[{first_idx + n - 1}:v]scale={ancho}:-1[lg{n}]")
+            logo = f"[lg{n}]"
+        else:
+            logo = f"[{first_idx + n - 1}:v]"   # ya viene al tamaño final (placa)
+        filters.append(f"{current}{logo}overlay={pos}{opts}[ov{n}]")
+        current = f"[ov{n}]"
+    return filters, current
+
+def segment_filters(i: int, vsrc: str, W: int, H: int, audio: bool, dur: float,
+                    fps: Optional[str] = None) -> list:
+    """
+    Normaliza el segmento i (video desde `vsrc`) a WxH, 48 kHz estéreo → [v{i}][a{i}].
+    Con `fps` además fija la cadencia (necesario para concatenar con -c copy).
+    """
+    fparts = [
+        f"{vsrc}scale={W}:{H}:force_original_aspect_ratio=decrease,"
+        f"pad={W}:{H}:(ow-iw)/2:(oh-ih)/2,setsar=1,setpts=PTS-STARTPTS{f',fps={fps}' if fps else ''}[v{i}]"
+    ]
+    if audio:
+        fparts.append(
+            f"[{i}:a]aformat=channel_layouts=stereo,aresample=sample_rate=48000:async=1:first_pts=0,asetpts=PTS-STARTPTS[a{i}]"
+        )
+    else:
+        fparts.append(f"anullsrc=r=48000:cl=stereo,atrim=0:{max(dur, 0.01)},asetpts=PTS-STARTPTS[a{i}]")
+    return fparts
+
+def encode_args(salida: Path) -> list:
+    return [
+        "-c:v","libx264","-threads",str(hilos_ffmpeg()),
+        "-pix_fmt","yuv420p","-c:a","aac","-movflags","+faststart",
+        str(salida)
+    ]
+
+# Perfil fijo para todo lo que se concatena con -c copy (intro/outro cacheados y cuerpo).
+PERFIL_CODEC = "h264-high-yuv420p_aac-48000-stereo_tb90000"
+
+def encode_args_canonico(salida: Path, audio_copia: bool = False) -> list:
+    audio = ["-c:a","copy"] if audio_copia else ["-c:a","aac","-ar","48000","-ac","2"]
+    return [
+        "-c:v","libx264","-profile:v","high","-pix_fmt","yuv420p","-threads",str(hilos_ffmpeg()),
+        "-video_track_timescale","90000",
+        *audio,"-movflags","+faststart",
+        str(salida)
+    ]
+
+def rutas_derivados(workdir: Path) -> tuple[Path, Path]:
+    return workdir / "preview.mp4", workdir / "poster.jpg"
+
+def derivados(vsrc: str, audio: str, dur: float, workdir: Path) -> tuple[list, str, list]:
+    """
+    Parte el cuerpo ya con logos (`vsrc`) con split: una rama sigue al render
+    principal y las otras salen del mismo proceso como preview (PREVIEW_ALTO, CRF
+    alto) y poster JPEG (frame en POSTER_SEG), sin segundo decode del clip.
+    Devuelve (filtros, etiqueta de la rama principal, args de las salidas extra).
+    """
+    preview, poster = rutas_derivados(workdir)
+    t_poster = min(POSTER_SEG, dur / 2) if dur else 0.0
+    filters = [
+        f"{vsrc}split=3[dmain][dprev][dpost]",
+        f"[dprev]scale=-2:{PREVIEW_ALTO},setsar=1[prev]",
+        f"[dpost]select='gte(t,{t_poster:.3f})',scale=-2:{POSTER_ALTO},setsar=1[post]",
+    ]
+    salidas = [
+        "-map", "[prev]", "-map", audio,
+        "-c:v", "libx264", "-preset", "veryfast", "-crf", PREVIEW_CRF,
+        "-maxrate", PREVIEW_MAXRATE, "-bufsize", PREVIEW_MAXRATE,
+        "-pix_fmt", "yuv420p", "-threads", str(hilos_ffmpeg()),
+        "-c:a", "aac", "-b:a", "64k", "-ac", "1", "-movflags", "+faststart", str(preview),
+        "-map", "[post]", "-frames:v", "1", "-q:v", "4", str(poster),
+    ]
+    return filters, "[dmain]", salidas
+
+def render_logos(entrada: Path, logos: list, salida: Path, workdir: Optional[Path] = None,
+                 audio_copia: bool = False) -> None:
+    """
+    Solo overlays (sin intro/outro). Con `workdir` también genera preview y poster ahí.
+    `audio_copia`: el audio va a la salida principal sin reencode (el preview sigue en AAC mono).
+    """
+    cmd = ffmpeg_base() + ["-i", str(entrada)]
+    for path, _, _ in logos:
+        cmd.extend(["-i", str(path)])
+    filters, current = overlay_chain("[0:v]", logos, 1)
+    extra = []
+    if workdir:
+        f2, current, extra = derivados(current, "0:a?", get_duration(entrada) or 0.0, workdir)
+        filters += f2
+    cmd += [
+        "-filter_complex", ";".join(filters),
+        "-map", current, "-map", "0:a?",
+        "-c:v", "libx264", "-threads", str(hilos_ffmpeg()),
+        "-c:a", "copy" if audio_copia else "aac", "-movflags", "+faststart",
+        str(salida), *extra,
+    ]
+    run_cmd(cmd)
+
+def render_dos_etapas(entrada: Path, logos: list, intro: Optional[Path], outro: Optional[Path],
+                      salida: Path, workdir: Path, previews: bool = False, audio_copia: bool = False) -> None:
+    """Flujo original: overlays → output_con_logo.mp4 y luego concat con reencode."""
+    deriv_dir = workdir if previews else None
+    if not intro and not outro:
+        render_logos(entrada, logos, salida, deriv_dir, audio_copia)
+        return
+    body = workdir / "output_con_logo.mp4"
+    render_logos(entrada, logos, body, deriv_dir, audio_copia)
+
+    segs = [p for p in (intro, body, outro) if p]
+    W,H = ffprobe_dims(body)
+    cmd = ffmpeg_base()
+    for p in segs: cmd.extend(["-i", str(p)])
+
+    fparts = []; pairs = []
+    for i, p in enumerate(segs):
+        fparts += segment_filters(i, f"[{i}:v]", W, H, has_audio(p), get_duration(p) or 0.0)
+        pairs.append(f"[v{i}]"); pairs.append(f"[a{i}]")
+    fparts.append("".join(pairs) + f"concat=n={len(segs)}:v=1:a=1[v][a]")
+
+    cmd += ["-filter_complex", ";".join(fparts), "-map", "[v]", "-map", "[a]", *encode_args(salida)]
+    run_cmd(cmd)
+
+def render_un_paso(entrada: Path, logos: list, intro: Optional[Path], outro: Optional[Path],
+                   salida: Path, workdir: Path, previews: bool = False, audio_copia: bool = False) -> None:
+    """
+    Un solo grafo: overlays sobre el cuerpo + scale/pad + concat con intro/outro
+    (anullsrc donde falte audio). El cuerpo se codifica una sola vez. El filtro
+    concat necesita audio decodificado: `audio_copia` solo aplica sin intro/outro.
+    """
+    if not intro and not outro:
+        render_logos(entrada, logos, salida, workdir if previews else None, audio_copia)
+        return
+    segs = [p for p in (intro, entrada, outro) if p]
+    body_idx = segs.index(entrada)
+    W,H = ffprobe_dims(entrada)
+    cmd = ffmpeg_base()
+    for p in segs: cmd.extend(["-i", str(p)])
+    for path, _, _ in logos: cmd.extend(["-i", str(path)])
+
+    fparts, body_v = overlay_chain(f"[{body_idx}:v]", logos, len(segs))
+    extra = []
+    if previews:
+        f2, body_v, extra = derivados(body_v, f"{body_idx}:a?", get_duration(entrada) or 0.0, workdir)
+        fparts += f2
+    pairs = []
+    for i, p in enumerate(segs):
+        vsrc = body_v if i == body_idx else f"[{i}:v]"
+        fparts += segment_filters(i, vsrc, W, H, has_audio(p), get_duration(p) or 0.0)
+        pairs.append(f"[v{i}]"); pairs.append(f"[a{i}]")
+    fparts.append("".join(pairs) + f"concat=n={len(segs)}:v=1:a=1[v][a]")
+
+    cmd += ["-filter_complex", ";".join(fparts), "-map", "[v]", "-map", "[a]", *encode_args(salida), *extra]
+    run_cmd(cmd)
+
+# =========================
+#  Planificador de paralelismo
 # =========================
-def procesar_uno(nombre: str, ACCESS_TOKEN: str | None) -> tuple[str, bool, str]:
+_render_ctx = threading.local()
+
+def hilos_ffmpeg() -> int:
+    """Hilos para el ffmpeg del worker actual (los asigna el planificador)."""
+    return getattr(_render_ctx, "hilos", THREADS_PER_FFMPEG)
+
+def recursos_runner() -> tuple[int, int, int]:
+    """(cores, MB de RAM disponible, MB libres en el disco temporal)."""
+    cores = os.cpu_count() or 1
+    mem_mb = 0
+    try:
+        with open("/proc/meminfo", encoding="utf-8") as f:
+            for ln in f:
+                if ln.startswith("MemAvailable:"):
+                    mem_mb = int(ln.split()[1]) // 1024
+                    break
+    except OSError:
+        pass
+    if not mem_mb:
+        try:
+            mem_mb = os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE") // (1024 * 1024)
+        except (ValueError, OSError, AttributeError):
+            mem_mb = MEM_POR_ENCODE_MB * cores
+    disco_mb = shutil.disk_usage(tempfile.gettempdir()).free // (1024 * 1024)
+    return cores, mem_mb, disco_mb
+
+class Planificador:
     """
-    Procesa un archivo y devuelve (nombre, ok, msg).
+    Cupo de encodes simultáneos + hilos por ffmpeg. En modo auto arranca con
+    cores/2 encodes (acotado por RAM, disco y tamaño del lote) y cada
+    PLAN_AJUSTE_CADA clips mira load average y fps de encode agregados:
+    sube el cupo si sobra CPU y el throughput no empeora, lo baja si hay
+    sobrecarga o si la última subida empeoró el throughput.
     """
-    dbx = None if DRY_RUN else dropbox.Dropbox(ACCESS_TOKEN)
+    def __init__(self, total_clips: int):
+        self.cores, mem_mb, disco_mb = recursos_runner()
+        self.auto = PARALLEL_PLAN == "auto"
+        por_mem   = max(1, mem_mb // MEM_POR_ENCODE_MB)
+        por_disco = max(1, disco_mb // DISCO_POR_CLIP_MB)
+        self.max_en_disco = por_disco
+        if self.auto:
+            self.maximo = max(1, min(self.cores, por_mem, por_disco, max(1, total_clips)))
+            self.limite = max(1, min(self.maximo, -(-self.cores // 2)))
+        else:
+            self.maximo = self.limite = max(1, ENCODE_WORKERS)
+        self.cond = threading.Condition()
+        self.activos = 0
+        self.t_inicio = time.monotonic()
+        # ventana de medición actual
+        self.v_inicio = self.t_inicio; self.v_frames = 0.0; self.v_clips = 0
+        self.prev_fps = None; self.ultimo_cambio = 0
+        # totales
+        self.frames = 0.0; self.segundos_media = 0.0; self.clips = 0
+        self.historial = [(0.0, self.limite, self.hilos())]
+        log(f"🧮 Plan ({PARALLEL_PLAN}): cores={self.cores} RAM libre={mem_mb}MB disco libre={disco_mb}MB "
+            f"→ encodes={self.limite} (máx {self.maximo}) × hilos={self.hilos()}")
+
+    def hilos(self) -> int:
+        if not self.auto:
+            return THREADS_PER_FFMPEG
+        return max(1, self.cores // self.limite)
+
+    def adquirir(self) -> int:
+        with self.cond:
+            while self.activos >= self.limite:
+                self.cond.wait()
+            self.activos += 1
+            return self.hilos()
+
+    def liberar(self, frames: float, segundos_media: float) -> None:
+        with self.cond:
+            self.activos -= 1
+            self.frames += frames; self.segundos_media += segundos_media; self.clips += 1
+            self.v_frames += frames; self.v_clips += 1
+            if self.auto and self.v_clips >= PLAN_AJUSTE_CADA:
+                self._ajustar()
+            self.cond.notify_all()
+
+    def _ajustar(self) -> None:
+        ahora = time.monotonic()
+        fps = self.v_frames / max(ahora - self.v_inicio, 1e-6)
+        try:
+            carga = os.getloadavg()[0]
+        except OSError:
+            carga = 0.0
+        antes = self.limite
+        if carga > self.cores * 1.25 and self.limite > 1:
+            self.limite -= 1; motivo = f"load {carga:.1f} > {self.cores}×1.25"
+        elif self.ultimo_cambio > 0 and self.prev_fps and fps < self.prev_fps * 0.9 and self.limite > 1:
+            self.limite -= 1; motivo = f"fps {fps:.0f} < {self.prev_fps:.0f} tras subir"
+        elif carga < self.cores * 0.75 and self.limite < self.maximo and (not self.prev_fps or fps >= self.prev_fps * 0.95):
+            self.limite += 1; motivo = f"load {carga:.1f} < {self.cores}×0.75"
+        else:
+            motivo = "sin cambio"
+        self.ultimo_cambio = self.limite - antes
+        log(f"🧮 Ajuste: fps encode={fps:.0f} load1={carga:.1f} → encodes {antes}→{self.limite} "
+            f"× hilos={self.hilos()} ({motivo})")
+        if self.limite != antes:
+            self.historial.append((ahora - self.t_inicio, self.limite, self.hilos()))
+        self.prev_fps = fps
+        self.v_inicio = ahora; self.v_frames = 0.0; self.v_clips = 0
+
+    def resumen(self) -> None:
+        wall = max(time.monotonic() - self.t_inicio, 1e-6)
+        pasos = " → ".join(f"{l}×{h}@{t:.0f}s" for t, l, h in self.historial)
+        log(f"🧮 Plan ({PARALLEL_PLAN}) encodes×hilos: {pasos}")
+        log(f"🧮 Throughput: {self.clips / wall * 60:.2f} clips/min | {self.frames / wall:.0f} fps encode | "
+            f"{self.segundos_media / wall:.2f}× tiempo real")
+
+PLAN: Optional[Planificador] = None
+BITACORA: Optional[Journal] = None
+TELEMETRIA: Optional[Telemetry] = None
+COLA: dict = {}   # nombre → Prioridad del lote actual
+BORRADOS: Optional[LoteStorage] = None   # originales de Entrantes a borrar al cerrar el lote
+
+# =========================
+#  Caché de intro/outro normalizados
+# =========================
+_segment_locks: dict = {}
+_cache_lock = Lock()
 
+def segmento_normalizado(loc: str, src: Path, W: int, H: int, fps: str) -> Path:
+    """
+    Devuelve `src` normalizado a (W, H, fps, PERFIL_CODEC) desde SEGMENT_CACHE_DIR,
+    generándolo una sola vez. La clave es el hash del contenido, así que cambiar el
+    intro/outro del club invalida la entrada sin borrar nada a mano.
+    """
+    key = hashlib.sha256(
+        f"{sha256_file(src)}|{W}x{H}|{fps}|{PERFIL_CODEC}".encode()
+    ).hexdigest()[:24]
+    dest = SEGMENT_CACHE_DIR / f"{loc}_{src.stem}_{key}.mp4"
+    if dest.exists():
+        return dest
+    with _cache_lock:
+        lock = _segment_locks.setdefault(key, Lock())
+    with lock:
+        if dest.exists():
+            return dest
+        SEGMENT_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp = dest.with_name(dest.stem + ".tmp.mp4")
+        fparts = segment_filters(0, "[0:v]", W, H, has_audio(src), get_duration(src) or 0.0, fps)
+        cmd = ffmpeg_base() + ["-i", str(src),
+                               "-filter_complex", ";".join(fparts),
+                               "-map", "[v0]", "-map", "[a0]", *encode_args_canonico(tmp)]
+        t0 = time.monotonic()
+        run_cmd(cmd)
+        os.replace(tmp, dest)
+        log(f"   • Caché: {src.parent.name}/{src.name} normalizado {W}x{H}@{fps} en {time.monotonic() - t0:.1f}s")
+    return dest
+
+def placa_logos(loc: str, logos: list, W: int, H: int) -> Path:
+    """
+    Compone todos los logos activos en una sola imagen RGBA transparente de WxH
+    (mismas escalas y posiciones que overlay_chain). Cacheada en PLATE_CACHE_DIR
+    por hash de cada logo + layout + resolución + THIRD_LOGO_ENABLED.
+    """
+    firma = "|".join(f"{sha256_file(p)}:{ancho}:{pos}" for p, ancho, pos in logos)
+    key = hashlib.sha256(f"{firma}|{W}x{H}|third={THIRD_LOGO_ON}".encode()).hexdigest()[:24]
+    dest = PLATE_CACHE_DIR / f"{loc}_{W}x{H}_{key}.png"
+    if dest.exists():
+        return dest
+    with _cache_lock:
+        lock = _segment_locks.setdefault(key, Lock())
+    with lock:
+        if dest.exists():
+            return dest
+        PLATE_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp = dest.with_name(dest.stem + ".tmp.png")
+        cmd = ffmpeg_base() + ["-f", "lavfi", "-i", f"color=c=black@0.0:s={W}x{H},format=rgba"]
+        for path, _, _ in logos: cmd.extend(["-i", str(path)])
+        # format=auto en cada overlay conserva el canal alfa de la base transparente
+        filters, current = overlay_chain("[0:v]", logos, 1, ":format=auto")
+        cmd += ["-filter_complex", ";".join(filters) + f";{current}format=rgba[placa]",
+                "-map", "[placa]", "-frames:v", "1", str(tmp)]
+        run_cmd(cmd)
+        os.replace(tmp, dest)
+        log(f"   • Placa de logos {loc} {W}x{H} generada ({len(logos)} logos)")
+    return dest
+
+def render_con_cache(loc: str, entrada: Path, logos: list, intro: Optional[Path], outro: Optional[Path],
+                     salida: Path, workdir: Path, previews: bool = False, audio_copia: bool = False) -> None:
+    """
+    Codifica solo el cuerpo (logos) con PERFIL_CODEC a la cadencia del original y lo
+    ensambla con los intro/outro cacheados vía concat demuxer, sin reencode.
+    `audio_copia` (decidir_audio con concat=True): el audio del original entra al
+    cuerpo sin pasar por aresample ni AAC.
+    """
+    W,H = ffprobe_dims(entrada)
+    fps = ffprobe_fps(entrada)
+    segs_cache = {p: segmento_normalizado(loc, p, W, H, fps) for p in (intro, outro) if p}
+
+    body = workdir / "cuerpo.mp4"
+    cmd = ffmpeg_base() + ["-i", str(entrada)]
+    for path, _, _ in logos: cmd.extend(["-i", str(path)])
+    fparts, body_v = overlay_chain("[0:v]", logos, 1)
+    extra = []
+    if previews:
+        f2, body_v, extra = derivados(body_v, "0:a?", get_duration(entrada) or 0.0, workdir)
+        fparts += f2
+    seg = segment_filters(0, body_v, W, H, has_audio(entrada), get_duration(entrada) or 0.0, fps)
+    fparts += seg[:1] if audio_copia else seg
+    cmd += ["-filter_complex", ";".join(fparts), "-map", "[v0]", "-map", "0:a:0" if audio_copia else "[a0]",
+            *encode_args_canonico(body, audio_copia), *extra]
+    run_cmd(cmd)
+
+    lista = workdir / "concat.txt"
+    partes = [segs_cache[intro]] if intro else []
+    partes.append(body)
+    if outro: partes.append(segs_cache[outro])
+    lista.write_text("".join(f"file '{p}'\n" for p in partes), encoding="utf-8")
+    run_cmd(ffmpeg_base() + ["-f", "concat", "-safe", "0", "-i", str(lista),
+                             "-map", "0", "-c", "copy", "-movflags", "+faststart", str(salida)])
+
+# =========================
+#  Procesamiento de un archivo (por etapas)
+# =========================
+def nuevo_job(nombre: str) -> Optional[dict]:
+    """Estado de un clip a lo largo de las etapas; None si el nombre no es válido."""
     m = PATRON_VIDEO.match(nombre)
     if not m:
-        return nombre, False, "nombre inválido"
-
+        return None
     loc  = m.group("loc"); can  = m.group("can"); lado = m.group("lado")
+    if BITACORA:
+        workdir = BITACORA.workdir(nombre)
+    else:
+        workdir = Path(tempfile.mkdtemp(prefix="ffmpeg_plus_")).resolve()
+    return {
+        "nombre": nombre, "loc": loc, "can": can, "lado": lado,
+        "ruta_origen":  f"{CARPETA_ENTRANTES}/{nombre}",
+        "ruta_destino": f"{CARPETA_RAIZ}/{loc}/{can}/{lado}/{nombre}",
+        "workdir": workdir,
+        "entrada": workdir / "input.mp4",
+        "salida":  workdir / "output.mp4",
+        "tele":    {"etapas": {}},
+        "cola":    COLA.get(nombre),
+    }
+
+def limpiar_job(job: dict, ok: bool = True) -> None:
+    """
+    Sin bitácora: borra el workdir. Con bitácora: un clip terminado sale de ella;
+    uno fallido conserva su output.mp4 si ya estaba renderizado (la próxima corrida
+    solo reintenta subida/borrado) y, si el original no se pudo borrar, queda
+    marcado como subido para no volver a procesarlo.
+    """
+    nombre = job["nombre"]
+    if BITACORA is None:
+        shutil.rmtree(job["workdir"], ignore_errors=True)
+    elif not ok and BITACORA.alcanzo(nombre, "renderizado"):
+        pass
+    elif ok and BITACORA.alcanzo(nombre, "subido") and not BITACORA.alcanzo(nombre, "borrado"):
+        BITACORA.limpiar_artefactos(nombre)
+    else:
+        BITACORA.cerrar(nombre)
+
+def registrar_clip(job: dict, ok: bool, msg: str) -> None:
+    """Registro de telemetría del clip (duraciones por etapa, bytes, velocidad)."""
+    if TELEMETRIA is None:
+        return
+    t = job["tele"]
+    etapas = t["etapas"]
+    def mbps(b, etapa):
+        s = (etapas.get(etapa) or {}).get("s")
+        return round(b / 1e6 / s, 2) if b and s else None
+    TELEMETRIA.registrar({
+        "ts": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "run": os.environ.get("GITHUB_RUN_ID", ""),
+        "clip": job["nombre"], "loc": job["loc"], "can": job["can"], "lado": job["lado"],
+        "ok": ok, "msg": msg, "reanudado": job.get("reanudado"),
+        "vivo": bool(job["cola"] and job["cola"].vivo),
+        "puntaje": job["cola"].puntaje if job["cola"] else None,
+        **t,
+        "descarga_mbps": mbps(t.get("bytes_entrada"), "descarga"),
+        "subida_mbps": mbps(t.get("bytes_salida"), "subida"),
+    })
 
-    ruta_origen  = f"{CARPETA_ENTRANTES}/{nombre}"
-    ruta_destino = f"{CARPETA_RAIZ}/{loc}/{can}/{lado}/{nombre}"
+def medir_etapa(job: dict, etapa: str, t0: float, t1: float, t_encolado: float) -> None:
+    job["tele"]["etapas"][etapa] = {"s": round(t1 - t0, 3), "espera": round(max(0.0, t0 - t_encolado), 3)}
+
+def _artefacto_ok(p: Path, sha: Optional[str]) -> bool:
+    return bool(sha) and p.exists() and sha256_file(p) == sha
+
+def reanudar(job: dict) -> Optional[str]:
+    """Etapa ya completada en una corrida anterior y cuyo artefacto sigue válido (o None)."""
+    if BITACORA is None:
+        return None
+    nombre = job["nombre"]; e = BITACORA.get(nombre)
+    if BITACORA.alcanzo(nombre, "subido"):
+        return "subido"
+    if BITACORA.alcanzo(nombre, "renderizado") and _artefacto_ok(job["salida"], e.get("sha_salida")):
+        return "renderizado"
+    if BITACORA.alcanzo(nombre, "descargado") and _artefacto_ok(job["entrada"], e.get("sha_entrada")):
+        return "descargado"
+    return None
 
-    log(f"▶️  START: {nombre}  ({loc}/{can}/{lado})")
-    workdir = Path(tempfile.mkdtemp(prefix="ffmpeg_plus_")).resolve()
+def etapa_descarga(job: dict, st) -> tuple[bool, str]:
+    nombre = job["nombre"]
+    log(f"▶️  START: {nombre}  ({job['loc']}/{job['can']}/{job['lado']})")
+    job["reanudado"] = reanudar(job)
+    if job["reanudado"]:
+        log(f"♻️  [{nombre}] Reanuda: ya {job['reanudado']} en una corrida anterior")
+        return True, "ok"
+    if DRY_RUN:
+        if not LOCAL_INPUT.exists():
+            return False, f"LOCAL_INPUT no existe: {LOCAL_INPUT}"
+        shutil.copy2(LOCAL_INPUT, job["entrada"])
+    else:
+        try:
+            st.descargar(job["ruta_origen"], job["entrada"])
+        except Exception as e:
+            return False, f"descarga falló: {e}"
+    job["tele"]["bytes_entrada"] = job["entrada"].stat().st_size
+    job["tele"]["dur_entrada"] = get_duration(job["entrada"])
+    if BITACORA:
+        BITACORA.marcar(nombre, "descargado", sha_entrada=sha256_file(job["entrada"]))
+    return True, "ok"
 
+def etapa_render(job: dict, st) -> tuple[bool, str]:
+    if job.get("reanudado") in ("renderizado", "subido"):
+        return True, "ok"
+    if PLAN is None:
+        return _etapa_render(job)
+    d = media(job["entrada"]) or {}
+    dur = d.get("duration") or 0.0
+    num, _, den = (d.get("fps") or "30").partition("/")
+    frames = dur * float(num) / float(den or 1)
+    _render_ctx.hilos = PLAN.adquirir()
     try:
-        # 1) Obtener input
-        if DRY_RUN:
-            if not LOCAL_INPUT.exists():
-                return nombre, False, f"LOCAL_INPUT no existe: {LOCAL_INPUT}"
-            shutil.copy2(LOCAL_INPUT, workdir / "input.mp4")
-        else:
-            try:
-                md, resp = dbx.files_download(ruta_origen)
-                (workdir / "input.mp4").write_bytes(resp.content)
-            except Exception as e:
-                return nombre, False, f"descarga falló: {e}"
-
-        # 2) Recursos por club
-        club_dir = CLUBS_ROOT / loc
-        logo1 = LOGO1_PATH
-        logo2 = club_dir / "logo.png"
-        logo3 = club_dir / "tercer_logo.png"
-        intro = club_dir / "intro.mp4"
-        outro = club_dir / "outro.mp4"
-
-        existe_logo2 = logo2.exists()
-        existe_logo3 = logo3.exists() and THIRD_LOGO_ON
-        existe_intro = intro.exists()
-        existe_outro = outro.exists()
-
-        log(f"   • Logo1 OK | Logo2 {'OK' if existe_logo2 else 'NO'} | 3erLogo {'ON' if THIRD_LOGO_ON else 'OFF'}→{'OK' if logo3.exists() else 'NO'} aplicado={'SÍ' if existe_logo3 else 'NO'}")
-        log(f"   • Intro {'OK' if existe_intro else 'NO'} | Outro {'OK' if existe_outro else 'NO'}")
-
-        # 3) Overlays → output_con_logo.mp4
-        inputs = ["ffmpeg", "-y", "-hide_banner", "-loglevel", "error", "-fflags", "+genpts"]
-        if DEBUG:
-            inputs.append("-report")
-        inputs.extend(["-i", str(workdir / "input.mp4")])  # 0
-        inputs.extend(["-i", str(logo1)])                  # 1
-        in_idx = 2
-        idx_logo2 = None
-        idx_logo3 = None
-        if existe_logo2:
-            inputs.extend(["-i", str(logo2)]); idx_logo2 = in_idx; in_idx += 1
-        if existe_logo3:
-            inputs.extend(["-i", str(logo3)]); idx_logo3 = in_idx; in_idx += 1
-
-        filters = []; current = "[0:v]"; nxt = 1
-        filters.append(f"[1:v]scale=300:-1[l1]"); filters.append(f"{current}[l1]overlay=30:30[v{nxt}]"); current=f"[v{nxt}]"; nxt+=1
-        if idx_logo2 is not None:
-            filters.append(f"[{idx_logo2}:v]scale=200:-1[l2]"); filters.append(f"{current}[l2]overlay=W-w-15:15[v{nxt}]"); current=f"[v{nxt}]"; nxt+=1
-        if idx_logo3 is not None:
-            filters.append(f"[{idx_logo3}:v]scale=240:-1[l3]"); filters.append(f"{current}[l3]overlay=(W-w)/2:H-h-30[v{nxt}]"); current=f"[v{nxt}]"; nxt+=1
-        filter_complex = ";".join(filters)
-
-        cmd_logos = [
-            *inputs,
-            "-filter_complex", filter_complex,
-            "-map", current, "-map", "0:a?",
-            "-c:v", "libx264", "-threads", str(THREADS_PER_FFMPEG),
-            "-c:a", "aac", "-movflags", "+faststart",
-            str(workdir / "output_con_logo.mp4"),
-        ]
+        return _etapa_render(job)
+    finally:
+        PLAN.liberar(frames, dur)
+        del _render_ctx.hilos
+
+def _etapa_render(job: dict) -> tuple[bool, str]:
+    loc = job["loc"]; workdir = job["workdir"]
+
+    # Recursos por club
+    club_dir = CLUBS_ROOT / loc
+    logo1 = LOGO1_PATH
+    logo2 = club_dir / "logo.png"
+    logo3 = club_dir / "tercer_logo.png"
+    intro = club_dir / "intro.mp4"
+    outro = club_dir / "outro.mp4"
+
+    existe_logo2 = logo2.exists()
+    existe_logo3 = logo3.exists() and THIRD_LOGO_ON
+    existe_intro = intro.exists()
+    existe_outro = outro.exists()
+
+    log(f"   • [{job['nombre']}] Logo1 OK | Logo2 {'OK' if existe_logo2 else 'NO'} | 3erLogo {'ON' if THIRD_LOGO_ON else 'OFF'}→{'OK' if logo3.exists() else 'NO'} aplicado={'SÍ' if existe_logo3 else 'NO'}")
+    log(f"   • [{job['nombre']}] Intro {'OK' if existe_intro else 'NO'} | Outro {'OK' if existe_outro else 'NO'}")
+
+    logos = [(logo1, 300, "30:30")]
+    if existe_logo2: logos.append((logo2, 200, "W-w-15:15"))
+    if existe_logo3: logos.append((logo3, 240, "(W-w)/2:H-h-30"))
+    entrada = job["entrada"]
+    final_path = job["salida"]
+    intro_seg = intro if existe_intro else None
+    outro_seg = outro if existe_outro else None
+
+    if OVERLAY_PLATE:
+        W,H = ffprobe_dims(entrada)
         try:
-            run_cmd(cmd_logos)
+            logos = [(placa_logos(loc, logos, W, H), None, "0:0")]
         except subprocess.CalledProcessError as e:
-            return nombre, False, f"ffmpeg(logo) falló: {e}"
-
-        # 4) Concat
-        body = workdir / "output_con_logo.mp4"
-        segs = []
-        if (CLUBS_ROOT / loc / "intro.mp4").exists(): segs.append(CLUBS_ROOT / loc / "intro.mp4")
-        segs.append(body)
-        if (CLUBS_ROOT / loc / "outro.mp4").exists(): segs.append(CLUBS_ROOT / loc / "outro.mp4")
-
-        if len(segs) == 1:
-            final_path = workdir / "output.mp4"
-            shutil.move(body, final_path)
-        else:
-            W,H = ffprobe_dims(body)
-            cmd = ["ffmpeg","-y","-hide_banner","-loglevel","error","-fflags","+genpts"]
-            if DEBUG: cmd.append("-report")
-            for p in segs: cmd.extend(["-i", str(p)])
-
-            seg_has_audio = [has_audio(p) for p in segs]
-            seg_durations = [get_duration(p) or 0.0 for p in segs]
-
-            fparts = []; pairs = []
-            for i,_ in enumerate(segs):
-                fparts.append(
-                    f"[{i}:v]scale={W}:{H}:force_original_aspect_ratio=decrease,"
-                    f"pad={W}:{H}:(ow-iw)/2:(oh-ih)/2,setsar=1,setpts=PTS-STARTPTS[v{i}]"
-                )
-                if seg_has_audio[i]:
-                    fparts.append(
-                        f"[{i}:a]aformat=channel_layouts=stereo,aresample=sample_rate=48000:async=1:first_pts=0,asetpts=PTS-STARTPTS[a{i}]"
-                    )
-                else:
-                    dur = max(seg_durations[i], 0.01)
-                    fparts.append(f"anullsrc=r=48000:cl=stereo,atrim=0:{dur},asetpts=PTS-STARTPTS[a{i}]")
-                pairs.append(f"[v{i}]"); pairs.append(f"[a{i}]")
-
-            fparts.append("".join(pairs) + f"concat=n={len(segs)}:v=1:a=1[v][a]")
-            fgraph = ";".join(fparts)
-
-            cmd += [
-                "-filter_complex", fgraph,
-                "-map", "[v]", "-map", "[a]",
-                "-c:v","libx264","-threads",str(THREADS_PER_FFMPEG),
-                "-pix_fmt","yuv420p","-c:a","aac","-movflags","+faststart",
-                str(workdir / "output.mp4")
-            ]
-            try:
-                run_cmd(cmd)
-            except subprocess.CalledProcessError as e:
-                return nombre, False, f"ffmpeg(concat) falló: {e}"
-
-        # 5) Subir / Borrar
-        final_path = workdir / "output.mp4"
-        if DRY_RUN:
-            dest = LOCAL_OUTDIR / loc / can / lado
-            dest.mkdir(parents=True, exist_ok=True)
-            shutil.copy2(final_path, dest / nombre)
-            log(f"✅ [DRY_RUN] Guardado en {dest / nombre}")
-        else:
+            log(f"⚠️ No se pudo generar la placa de logos ({e}); overlays por logo")
+
+    # Render → output.mp4: caché + stream copy si hay intro/outro; si no (o si
+    # falla), un paso o dos etapas según RENDER_MODE
+    modo = RENDER_MODE
+    con_segs = bool(intro_seg or outro_seg)
+    t0 = time.monotonic()
+    if SEGMENT_CACHE and con_segs:
+        copia, audio = decidir_audio(entrada, concat=True)
+        try:
+            render_con_cache(loc, entrada, logos, intro_seg, outro_seg, final_path, workdir, PREVIEWS, copia)
+            modo = "cache"
+        except subprocess.CalledProcessError as e:
+            log(f"⚠️ Render con caché falló ({e}); se usa {RENDER_MODE}")
+            t0 = time.monotonic()
+    if modo != "cache":
+        copia, audio = decidir_audio(entrada, concat=False)
+        if con_segs and copia:
+            # el concat por filtro necesita el audio decodificado: single no puede copiar;
+            # two_stage copia en la 1ª etapa y transcodifica solo en el concat
+            copia = RENDER_MODE != "single"
+            audio = f"{audio.rsplit(' → ', 1)[0]} → AAC (concat por filtro)"
+        render = render_un_paso if RENDER_MODE == "single" else render_dos_etapas
+        try:
+            render(entrada, logos, intro_seg, outro_seg, final_path, workdir, PREVIEWS, copia)
+        except subprocess.CalledProcessError as e:
+            return False, f"ffmpeg({RENDER_MODE}) falló: {e}"
+    t_render = time.monotonic() - t0
+    log(f"   • [{job['nombre']}] Render {modo}: {t_render:.1f}s | audio {audio}")
+    d = media(final_path) or {}
+    dur_salida = d.get("duration")
+    num, _, den = (d.get("fps") or "30").partition("/")
+    medible = bool(dur_salida and t_render)
+    job["tele"].update({
+        "modo_render": modo, "hilos": hilos_ffmpeg(), "render_s": round(t_render, 3),
+        "audio": audio,
+        "dur_salida": dur_salida,
+        "fps_encode": round(dur_salida * float(num) / float(den or 1) / t_render, 1) if medible else None,
+        "speed": round(dur_salida / t_render, 2) if medible else None,
+    })
+
+    # Benchmark opcional: mide el flujo de dos etapas sobre el mismo clip
+    if RENDER_BENCHMARK and modo != "two_stage" and (intro_seg or outro_seg):
+        bench_dir = workdir / "bench"; bench_dir.mkdir()
+        t0 = time.monotonic()
+        try:
+            render_dos_etapas(entrada, logos, intro_seg, outro_seg, bench_dir / "output.mp4", bench_dir)
+            t_dos = time.monotonic() - t0
+            ahorro = t_dos - t_render
+            log(f"   • [{job['nombre']}] Benchmark two_stage: {t_dos:.1f}s → ahorro {ahorro:.1f}s "
+                f"({(ahorro / t_dos * 100) if t_dos else 0:.0f}%)")
+        except subprocess.CalledProcessError as e:
+            log(f"⚠️ Benchmark two_stage falló: {e}")
+        finally:
+            shutil.rmtree(bench_dir, ignore_errors=True)
+
+    if BITACORA:
+        BITACORA.marcar(job["nombre"], "renderizado", sha_salida=sha256_file(final_path))
+    # El original ya no hace falta en disco mientras espera la subida
+    entrada.unlink(missing_ok=True)
+    return True, "ok"
+
+def etapa_subida(job: dict, st) -> tuple[bool, str]:
+    nombre = job["nombre"]; final_path = job["salida"]
+    # Preview y poster van antes que el clip: cuando el índice ve el .mp4 ya los tiene
+    hermanos = [(p, nombre[:-len(".mp4")] + suf)
+                for p, suf in zip(rutas_derivados(job["workdir"]), (".preview.mp4", ".jpg")) if p.exists()]
+    if DRY_RUN:
+        dest = LOCAL_OUTDIR / job["loc"] / job["can"] / job["lado"]
+        dest.mkdir(parents=True, exist_ok=True)
+        for p, n in hermanos:
+            shutil.copy2(p, dest / n)
+        shutil.copy2(final_path, dest / nombre)
+        log(f"✅ [DRY_RUN] Guardado en {dest / nombre}")
+    else:
+        if job.get("reanudado") != "subido":
+            carpeta = job["ruta_destino"].rsplit("/", 1)[0]
+            for p, n in hermanos:
+                try:
+                    st.subir(p, f"{carpeta}/{n}")
+                except Exception as e:
+                    log(f"⚠️ No se pudo subir {n}: {e}")
             try:
-                with final_path.open("rb") as f:
-                    dropbox.Dropbox(ACCESS_TOKEN).files_upload(
-                        f.read(), ruta_destino, mode=dropbox.files.WriteMode.overwrite
-                    )
-                log(f"✅ Subido a {ruta_destino}")
+                st.subir(final_path, job["ruta_destino"])
+                log(f"✅ Subido a {job['ruta_destino']}")
             except Exception as e:
-                return nombre, False, f"upload falló: {e}"
+                return False, f"upload falló: {e}"
+            job["tele"]["bytes_salida"] = final_path.stat().st_size
+            prio: Optional[Prioridad] = job["cola"]
+            if prio and prio.llegada:
+                latencia = (datetime.now(timezone.utc) - prio.llegada).total_seconds()
+                job["tele"]["latencia_s"] = round(latencia, 1)
+                log(f"⏱️  [{nombre}] Publicado {latencia / 60:.1f} min después de llegar"
+                    f"{' (cancha en vivo)' if prio.vivo else ''}")
+            if BITACORA:
+                BITACORA.marcar(nombre, "subido")
+        if BORRADOS is not None:
+            # sale con el resto del lote en files_delete_batch (borrar_originales)
+            BORRADOS.borrar(job["ruta_origen"])
+        else:
             try:
-                dropbox.Dropbox(ACCESS_TOKEN).files_delete_v2(ruta_origen)
-                log("🗑️  Eliminado original de Entrantes")
+                st.borrar(job["ruta_origen"])
+                if BITACORA:
+                    BITACORA.marcar(nombre, "borrado")
+                log(f"🗑️  Eliminado original de Entrantes: {nombre}")
             except Exception as e:
-                log(f"⚠️ No se pudo borrar el original {ruta_origen}: {e}")
+                log(f"⚠️ No se pudo borrar el original {job['ruta_origen']}: {e}")
 
-        log(f"✅ DONE: {nombre}")
-        return nombre, True, "ok"
+    log(f"✅ DONE: {nombre}")
+    return True, "ok"
 
-    finally:
+ETAPAS = [("descarga", etapa_descarga), ("render", etapa_render), ("subida", etapa_subida)]
+
+def procesar_uno(nombre: str) -> tuple[str, bool, str]:
+    """
+    Procesa un archivo con las etapas en serie y devuelve (nombre, ok, msg).
+    """
+    st = None if DRY_RUN else get_storage()
+    job = nuevo_job(nombre)
+    if job is None:
+        return nombre, False, "nombre inválido"
+    for etapa, fn in ETAPAS:
+        t0 = time.monotonic()
+        try:
+            ok, msg = fn(job, st)
+        except Exception as e:
+            ok, msg = False, f"{etapa}: {e}"
+        medir_etapa(job, etapa, t0, time.monotonic(), t0)
+        if not ok:
+            break
+    registrar_clip(job, ok, msg)
+    limpiar_job(job, ok)
+    return nombre, ok, msg
+
+# =========================
+#  Pipeline: descarga → render → subida
+# =========================
+_FIN = object()
+
+class Etapa:
+    """Pool de workers de una etapa con su cola de entrada acotada y sus contadores."""
+    def __init__(self, nombre: str, fn, workers: int):
+        self.nombre  = nombre
+        self.fn      = fn
+        self.workers = max(1, workers)
+        self.cola    = queue.Queue(maxsize=PIPELINE_QUEUE)
+        self.lock    = Lock()
+        self.vivos   = self.workers
+        self.trabajos = 0
+        self.ocupado  = 0.0   # segundos ejecutando fn
+        self.espera   = 0.0   # segundos que los clips esperaron en la cola
+
+def correr_pipeline(nombres: list, st) -> list:
+    """
+    Corre los clips por las tres etapas, cada una con su pool y una cola acotada
+    (PIPELINE_QUEUE) entre etapas. MAX_CLIPS_EN_DISCO limita cuántos clips tienen
+    workdir vivo a la vez. Devuelve [(nombre, ok, msg)].
+    """
+    render_workers = PLAN.maximo if PLAN else ENCODE_WORKERS
+    max_en_disco = min(MAX_CLIPS_EN_DISCO, PLAN.max_en_disco) if PLAN else MAX_CLIPS_EN_DISCO
+    workers = {"descarga": DOWNLOAD_WORKERS, "render": render_workers, "subida": UPLOAD_WORKERS}
+    etapas = [Etapa(n, fn, workers[n]) for n, fn in ETAPAS]
+    en_disco = threading.Semaphore(max_en_disco)
+    resultados = []; res_lock = Lock()
+
+    def terminar(job: dict, ok: bool, msg: str):
+        # Pase lo que pase al registrar/limpiar, el clip libera su lugar en disco y deja resultado
+        try:
+            registrar_clip(job, ok, msg)
+            limpiar_job(job, ok)
+        except Exception as e:
+            log(f"⚠️ {job['nombre']}: error al cerrar el job: {e}")
+        finally:
+            en_disco.release()
+            with res_lock:
+                resultados.append((job["nombre"], ok, msg))
+        if not ok:
+            log(f"❌ FAIL: {job['nombre']} → {msg}")
+
+    def worker(i: int):
+        etapa = etapas[i]
+        siguiente = etapas[i + 1] if i + 1 < len(etapas) else None
+        try:
+            while True:
+                job, t_encolado = etapa.cola.get()
+                if job is _FIN:
+                    break
+                cerrado = False   # terminar() ya corrió para este job
+                try:
+                    t0 = time.monotonic()
+                    try:
+                        ok, msg = etapa.fn(job, st)
+                    except Exception as e:
+                        ok, msg = False, f"{etapa.nombre}: {e}"
+                    t1 = time.monotonic()
+                    medir_etapa(job, etapa.nombre, t0, t1, t_encolado)
+                    with etapa.lock:
+                        etapa.trabajos += 1
+                        etapa.ocupado  += t1 - t0
+                        etapa.espera   += t0 - t_encolado
+                    if not ok:
+                        cerrado = True
+                        terminar(job, False, msg)
+                    elif siguiente:
+                        siguiente.cola.put((job, time.monotonic()))   # bloquea si la siguiente va atrasada
+                    else:
+                        cerrado = True
+                        terminar(job, True, "ok")
+                except Exception as e:
+                    log(f"⚠️ {etapa.nombre}: error inesperado con {job['nombre']}: {e}")
+                    if not cerrado:
+                        terminar(job, False, f"{etapa.nombre}: {e}")
+        finally:
+            # Siempre: si el último worker de la etapa no avisa, la siguiente y join() quedan colgados
+            with etapa.lock:
+                etapa.vivos -= 1
+                ultimo = etapa.vivos == 0
+            if ultimo and siguiente:
+                for _ in range(siguiente.workers):
+                    siguiente.cola.put((_FIN, 0.0))
+
+    log(f"⚙️ Pipeline: descarga={etapas[0].workers} render={etapas[1].workers} "
+        f"subida={etapas[2].workers} | cola={PIPELINE_QUEUE} | máx. en disco={max_en_disco}")
+    t_inicio = time.monotonic()
+    hilos = [threading.Thread(target=worker, args=(i,), name=f"{e.nombre}-{k}", daemon=True)
+             for i, e in enumerate(etapas) for k in range(e.workers)]
+    for h in hilos: h.start()
+
+    for nombre in nombres:
+        en_disco.acquire()
+        job = nuevo_job(nombre)
+        if job is None:
+            en_disco.release()
+            with res_lock:
+                resultados.append((nombre, False, "nombre inválido"))
+            log(f"❌ FAIL: {nombre} → nombre inválido")
+            continue
+        etapas[0].cola.put((job, time.monotonic()))
+    for _ in range(etapas[0].workers):
+        etapas[0].cola.put((_FIN, 0.0))
+    for h in hilos: h.join()
+
+    wall = time.monotonic() - t_inicio
+    log(f"\n📊 Utilización por etapa (pared {wall:.1f}s):")
+    for e in etapas:
+        util = e.ocupado / (e.workers * wall) * 100 if wall else 0.0
+        prom = e.ocupado / e.trabajos if e.trabajos else 0.0
+        esp  = e.espera / e.trabajos if e.trabajos else 0.0
+        log(f"   • {e.nombre:<8} workers={e.workers}  clips={e.trabajos}  ocupado={e.ocupado:.1f}s  "
+            f"util={util:.0f}%  prom/clip={prom:.1f}s  espera cola prom={esp:.1f}s")
+    return resultados
+
+# =========================
+#  Listado incremental de Entrantes
+# =========================
+ESTADO_SUBIDO = None   # (cursor, pendientes) tal como quedaron en el storage; evita resubir lo mismo
+
+def _huella_estado(estado: dict) -> str:
+    return json.dumps([estado.get("cursor"), estado["pendientes"]], sort_keys=True)
+
+def cargar_estado(st) -> dict:
+    global ESTADO_SUBIDO
+    vacio = {"v": 1, "cursor": None, "pendientes": {}}
+    if not (ESTADO_ENTRANTES or ESTADO_ENTRANTES_LOCAL):
+        return vacio
+    try:
+        if ESTADO_ENTRANTES_LOCAL:
+            data = json.loads(Path(ESTADO_ENTRANTES_LOCAL).read_text(encoding="utf-8"))
+        else:
+            data = json.loads(st.leer_bytes(ESTADO_ENTRANTES).decode("utf-8"))
+        if data.get("v") == 1 and isinstance(data.get("pendientes"), dict):
+            ESTADO_SUBIDO = _huella_estado(data)
+            return data
+    except FileNotFoundError:
+        pass   # todavía no existe
+    except Exception as e:
+        log(f"⚠️ Estado de Entrantes ilegible ({e}); se hace listado completo")
+    return vacio
+
+def guardar_estado(st, estado: dict) -> None:
+    """Sube el estado solo si cambiaron el cursor o los pendientes desde la última subida."""
+    global ESTADO_SUBIDO
+    if not (ESTADO_ENTRANTES or ESTADO_ENTRANTES_LOCAL):
+        return
+    huella = _huella_estado(estado)
+    if huella == ESTADO_SUBIDO:
+        return
+    estado["actualizado"] = datetime.now(timezone.utc).isoformat()
+    content = json.dumps(estado, ensure_ascii=False, indent=1).encode("utf-8")
+    try:
+        if ESTADO_ENTRANTES_LOCAL:
+            Path(ESTADO_ENTRANTES_LOCAL).parent.mkdir(parents=True, exist_ok=True)
+            Path(ESTADO_ENTRANTES_LOCAL).write_bytes(content)
+        else:
+            st.subir_bytes(content, ESTADO_ENTRANTES)
+        ESTADO_SUBIDO = huella
+    except Exception as e:
+        log(f"⚠️ No se pudo guardar el estado de Entrantes: {e}")
+
+def _aplicar_entradas(pendientes: dict, entries) -> int:
+    cambios = 0
+    for e in entries:
+        if isinstance(e, Archivo):
+            if e.name.endswith(".mp4"):
+                pendientes[e.name] = {"size": e.size, "modificado": e.server_modified.isoformat()}
+                cambios += 1
+        elif isinstance(e, Borrado):
+            if pendientes.pop(e.name, None) is not None:
+                cambios += 1
+    return cambios
+
+def listar_entrantes(st, estado: dict) -> tuple:
+    """
+    Pendientes de Entrantes y cuántos .mp4 cambiaron (None si fue listado completo).
+    Con cursor guardado solo pide los cambios desde la corrida anterior
+    (storage.cambios); sin cursor, o si el storage lo invalidó (reset), rehace el
+    listado completo. Actualiza `estado` in-place.
+    """
+    pendientes = estado["pendientes"]
+    if estado.get("cursor"):
         try:
-            shutil.rmtree(workdir, ignore_errors=True)
-        except Exception:
-            pass
+            entries, estado["cursor"] = st.cambios(estado["cursor"])
+            cambios = _aplicar_entradas(pendientes, entries)
+            if cambios or not DAEMON:   # en el daemon, un delta de solo heartbeats no se loguea
+                log(f"🔁 Listado incremental: {cambios} cambios desde la última corrida")
+            return list(pendientes), cambios
+        except CursorInvalido as e:
+            log(f"⚠️ Cursor de Entrantes inválido ({e}); listado completo")
+
+    pendientes.clear()
+    entries, estado["cursor"] = st.listar(CARPETA_ENTRANTES)
+    _aplicar_entradas(pendientes, entries)
+    log("🔭 Listado completo de Entrantes")
+    return list(pendientes), None
+
+def ordenar_plan(files: list, limite: int = BATCH_LIMIT) -> list:
+    """Orden por timestamp del nombre (parseado una sola vez por archivo) + límite del lote."""
+    con_ts = []; sin_ts = []
+    for f in files:
+        t = parse_ts_from_name(f)
+        if t is None: sin_ts.append(f)
+        else: con_ts.append((t, f))
+    con_ts.sort(reverse=NEWEST_FIRST)
+    return ([f for _, f in con_ts] + sin_ts)[:limite]
 
 # =========================
 #  Flujo principal
 # =========================
+PARAR = threading.Event()   # SIGTERM en modo daemon: terminar el lote actual y salir
+
+def planificar(st, estado: dict, limite: int, excluir=(), solo_si_cambia: bool = False):
+    """
+    Actualiza pendientes (listado incremental), los ordena según PRIORIDAD y arma
+    el plan del próximo lote (lo ya renderizado/subido según la bitácora primero).
+    Con solo_si_cambia, si el delta no trajo ningún .mp4 (p. ej. solo heartbeats.txt)
+    devuelve None sin replanificar, sin subir estado ni leer heartbeats.
+    """
+    global COLA
+    files, cambios = listar_entrantes(st, estado)
+    if solo_si_cambia and cambios == 0:
+        return None
+    files = [f for f in files if f not in excluir]
+    guardar_estado(st, estado)
+    if PRIORIDAD == "deadline":
+        vivos = leer_lados_vivos(st)
+        pend = {n: i for n, i in estado["pendientes"].items() if n not in excluir}
+        COLA = {p.nombre: p for p in priorizar(pend, PATRON_VIDEO, vivos, limite)}
+        plan = list(COLA)
+        sin_patron = [n for n in pend if not PATRON_VIDEO.match(n)]
+        if sin_patron:
+            log(f"⚠️ {len(sin_patron)} pendientes sin patrón loc_can_lado_fecha_hora (van al final): "
+                + ", ".join(sorted(sin_patron)[:10]))
+        log(f"💓 Lados en vivo: {', '.join('/'.join(v) for v in sorted(vivos)) or 'ninguno'}")
+    else:
+        plan = ordenar_plan(files, limite)
+    if BITACORA:
+        # Lo que ya quedó renderizado/subido va primero: es casi gratis terminarlo
+        hechos = [f for f in files if BITACORA.alcanzo(f, "renderizado")]
+        plan = (hechos + [f for f in plan if f not in hechos])[:limite]
+
+    log(f"🔭 Encontrados: {len(files)} en {CARPETA_ENTRANTES}")
+    orden = ("prioridad (vivo/edad/costo/justicia)" if PRIORIDAD == "deadline"
+             else "más recientes primero" if NEWEST_FIRST else "más antiguos primero")
+    log(f"🗂️  Orden: {orden}  |  Límite lote: {limite}")
+    if plan:
+        log("📋 Plan de procesamiento (en orden):")
+        for i,f in enumerate(plan,1):
+            p = COLA.get(f)
+            log(f"  {i:02d}. {f}" + (f"  [p={p.puntaje:.1f}{' VIVO' if p.vivo else ''}]" if p else ""))
+    return plan
+
+def borrar_originales() -> set:
+    """
+    Borra en un solo lote los originales de Entrantes ya publicados y devuelve los
+    nombres que no se pudieron borrar. El que falla queda en la bitácora como
+    "subido" (la próxima vuelta solo reintenta el borrado) y en pendientes.
+    """
+    if not BORRADOS:
+        return set()
+    encolados = list(BORRADOS.borrados)
+    try:
+        resultados = BORRADOS.enviar()
+    except Exception as e:
+        resultados = {r: e for r in encolados}
+    fallidos = set()
+    for ruta, err in sorted(resultados.items()):
+        nombre = ruta.rsplit("/", 1)[-1]
+        if err and not isinstance(err, NoEncontrado):   # ya no está: cuenta como borrado
+            log(f"⚠️ No se pudo borrar el original {ruta}: {err}")
+            fallidos.add(nombre)
+            continue
+        if BITACORA:
+            BITACORA.marcar(nombre, "borrado")
+            BITACORA.cerrar(nombre)
+    log(f"🗑️  Eliminados {len(resultados) - len(fallidos)}/{len(resultados)} originales de Entrantes (en lote)")
+    return fallidos
+
+def correr_lote(nombres: list, st, estado: Optional[dict]) -> list:
+    """Procesa `nombres` (pipeline o un clip por worker) y actualiza pendientes. [(nombre, ok, msg)]."""
+    if PLAN:   # el planificador manda: MAX_PARALLEL/THREADS_PER_FFMPEG no se usan
+        with PLAN.cond:
+            log(f"⚙️ Plan ({PARALLEL_PLAN}): encodes={PLAN.limite} (máx {PLAN.maximo}), "
+                f"hilos/ffmpeg={PLAN.hilos()}")
+    else:
+        log(f"⚙️ Paralelo={MAX_PARALLEL}, hilos/ffmpeg={THREADS_PER_FFMPEG}")
+    resultados = []
+    if PIPELINE:
+        resultados = correr_pipeline(nombres, st)
+    else:
+        with ThreadPoolExecutor(max_workers=MAX_PARALLEL) as ex:
+            futs = {ex.submit(procesar_uno, n): n for n in nombres}
+            for fut in as_completed(futs):
+                nombre = futs[fut]
+                try:
+                    resultados.append(fut.result())
+                    if not resultados[-1][1]:
+                        log(f"❌ FAIL: {nombre} → {resultados[-1][2]}")
+                except Exception as e:
+                    resultados.append((nombre, False, str(e)))
+                    log(f"❌ EXC: {nombre} → {e}")
+
+    sin_borrar = borrar_originales()
+
+    # Lo ya publicado sale de pendientes (el delta de la próxima corrida lo confirmará);
+    # si el original no se pudo borrar sigue pendiente: el cursor no lo va a volver a
+    # listar, así que es la única forma de reintentar (solo el borrado, con bitácora)
+    if estado is not None and any(ok for _, ok, _ in resultados):
+        for nombre, ok, _ in resultados:
+            if ok and nombre not in sin_borrar:
+                estado["pendientes"].pop(nombre, None)
+        guardar_estado(st, estado)
+    return resultados
+
+def correr_daemon(st) -> list:
+    """
+    Lotes de hasta DAEMON_BATCH_LIMIT clips mientras haya pendientes; sin trabajo,
+    espera cambios en Entrantes con longpoll (DAEMON_POLL). Un clip que falla se
+    aparta DAEMON_REINTENTO segundos para no reintentarlo en cada vuelta. Si lo que
+    despertó al longpoll no toca ningún .mp4 (heartbeats.txt vive en Entrantes) se
+    vuelve a esperar sin replanificar. SIGTERM (PARAR) deja terminar el lote en curso y sale.
+    """
+    global PLAN
+    inicio = time.monotonic()
+    estado = cargar_estado(st)
+    PLAN = Planificador(DAEMON_BATCH_LIMIT) if PIPELINE else None
+    resultados = []; en_pausa = {}; lotes = 0
+    replanificar = True   # primera vuelta y tras cada lote: plan completo aunque no haya .mp4 nuevos
+    ultimo_trabajo = time.monotonic()
+    log(f"🛰️  Daemon: presupuesto {DAEMON_MAX_RUNTIME}s (margen {DAEMON_MARGEN}s) | "
+        f"longpoll {DAEMON_POLL}s | lote {DAEMON_BATCH_LIMIT} | "
+        f"sale tras {DAEMON_IDLE_EXIT or '∞'}s ocioso")
+    while not PARAR.is_set():
+        restante = DAEMON_MAX_RUNTIME - (time.monotonic() - inicio)
+        if restante < DAEMON_MARGEN:
+            log(f"⏰ Quedan {restante:.0f}s de presupuesto (< margen {DAEMON_MARGEN}s); no se arranca otro lote")
+            break
+        ahora = time.monotonic()
+        vencidos = any(t <= ahora for t in en_pausa.values())
+        en_pausa = {n: t for n, t in en_pausa.items() if t > ahora}
+        try:
+            plan = planificar(st, estado, DAEMON_BATCH_LIMIT, excluir=en_pausa,
+                              solo_si_cambia=not (replanificar or vencidos))
+            replanificar = False
+        except Exception as e:
+            log(f"⚠️ No se pudo listar {CARPETA_ENTRANTES}: {e}; reintento en {DAEMON_POLL}s")
+            PARAR.wait(DAEMON_POLL)
+            continue
+
+        if plan:
+            lotes += 1
+            log(f"\n🚚 Lote {lotes} ({len(plan)} clips, {time.monotonic() - inicio:.0f}s de daemon)")
+            lote = correr_lote(plan, st, estado)
+            resultados += lote
+            for nombre, ok, _ in lote:
+                # fallido, o publicado con el original sin borrar: no reintentar en la próxima vuelta
+                if not ok or nombre in estado["pendientes"]:
+                    en_pausa[nombre] = time.monotonic() + DAEMON_REINTENTO
+            ultimo_trabajo = time.monotonic()
+            replanificar = True
+            continue
+
+        ocioso = time.monotonic() - ultimo_trabajo
+        if DAEMON_IDLE_EXIT and ocioso >= DAEMON_IDLE_EXIT and not leer_lados_vivos(st):
+            log(f"💤 {ocioso:.0f}s sin clips ni canchas en vivo; el supervisor relanza cuando haga falta")
+            break
+        espera = max(1.0, min(DAEMON_POLL, restante - DAEMON_MARGEN))
+        if en_pausa:
+            espera = min(espera, max(1.0, min(en_pausa.values()) - time.monotonic()))
+        if plan is not None:
+            log(f"⏳ Sin clips para procesar; esperando cambios en Entrantes (≤ {espera:.0f}s)")
+        try:
+            st.esperar_cambios(estado["cursor"], espera)
+        except Exception as e:
+            log(f"⚠️ Longpoll falló ({e}); pausa de {DAEMON_POLL}s")
+            PARAR.wait(DAEMON_POLL)
+
+    guardar_estado(st, estado)   # el cursor que solo avanzaron los heartbeats se sube una vez, al salir
+    if PARAR.is_set():
+        log("🛑 SIGTERM: daemon detenido tras terminar el lote en curso")
+    log(f"🛰️  Daemon: {lotes} lotes en {time.monotonic() - inicio:.0f}s")
+    if PLAN:
+        PLAN.resumen()
+    return resultados
+
 def main():
+    global PLAN, BITACORA, TELEMETRIA, BORRADOS
     if not LOGO1_PATH.exists():
         log(f"❌ Falta el logo base (Puntazo): {LOGO1_PATH}")
         sys.exit(1)
 
-    ACCESS_TOKEN = None
-    dbx = None
+    st = None
+    estado = None
     if not DRY_RUN:
         try:
-            ACCESS_TOKEN = get_access_token()
-            dbx = dropbox.Dropbox(ACCESS_TOKEN)
+            st = get_storage()
+            st.verificar()
         except Exception as e:
-            log(f"❌ Error autenticando con Dropbox: {e}")
+            log(f"❌ Error conectando con el storage: {e}")
             sys.exit(1)
 
+    if JOURNAL and not DRY_RUN:
+        BITACORA = Journal(JOURNAL_DIR, JOURNAL_TTL_H)
+        viejos = BITACORA.purgar_viejos()
+        if viejos:
+            log(f"🧹 Bitácora: {len(viejos)} entradas vencidas (> {JOURNAL_TTL_H:g}h) descartadas")
+        previos = BITACORA.pendientes()
+        if previos:
+            log(f"♻️  Bitácora: {len(previos)} clips de una corrida anterior → "
+                + ", ".join(f"{n} ({e})" for n, e in sorted(previos.items())))
+
+    if TELEMETRIA_PATH:
+        TELEMETRIA = Telemetry(TELEMETRIA_PATH)
+    if not DRY_RUN:
+        BORRADOS = LoteStorage(st)
+
     only = os.environ.get("FILE_NAME")
-    if only:
-        nombres = [only]
-        log(f"🔎 Modo archivo único: {only}")
+    if DAEMON and not (DRY_RUN or only):
+        signal.signal(signal.SIGTERM, lambda *_: PARAR.set())
+        resultados = correr_daemon(st)
     else:
-        if DRY_RUN:
+        if only:
+            nombres = [only]
+            log(f"🔎 Modo archivo único: {only}")
+        elif DRY_RUN:
             if LOCAL_INPUT.exists():
                 nombre = LOCAL_INPUT.name
                 if not PATRON_VIDEO.match(nombre):
@@ -320,64 +1326,31 @@ def main():
                 return
         else:
             try:
-                res = dbx.files_list_folder(CARPETA_ENTRANTES)
-                files = [e.name for e in res.entries if isinstance(e, dropbox.files.FileMetadata) and e.name.endswith(".mp4")]
-                while res.has_more:
-                    res = dbx.files_list_folder_continue(res.cursor)
-                    files += [e.name for e in res.entries if isinstance(e, dropbox.files.FileMetadata) and e.name.endswith(".mp4")]
-
-                def ts(n):
-                    m=PATRON_VIDEO.match(n)
-                    if not m: return None
-                    d=m.group("date"); t=m.group("time")
-                    try: return (int(d[0:4]),int(d[4:6]),int(d[6:8]),int(t[0:2]),int(t[2:4]),int(t[4:6]))
-                    except: return None
-
-                with_ts=[f for f in files if ts(f) is not None]
-                no_ts=[f for f in files if ts(f) is None]
-
-                with_ts=sorted(with_ts, key=lambda n: ts(n))
-                if NEWEST_FIRST:
-                    with_ts=list(reversed(with_ts))
-
-                plan=(with_ts+no_ts)[:BATCH_LIMIT]
-
-                log(f"🔭 Encontrados: {len(files)} en {CARPETA_ENTRANTES}")
-                log(f"🗂️  Orden: {'más recientes primero' if NEWEST_FIRST else 'más antiguos primero'}  |  Límite lote: {BATCH_LIMIT}")
-                if not plan:
-                    log("✅ Nada que procesar.")
-                    return
-                log("📋 Plan de procesamiento (en orden):")
-                for i,f in enumerate(plan,1):
-                    log(f"  {i:02d}. {f}")
-
-                nombres = plan
-
+                estado = cargar_estado(st)
+                nombres = planificar(st, estado, BATCH_LIMIT)
             except Exception as e:
                 log(f"❌ No se pudo listar {CARPETA_ENTRANTES}: {e}")
                 sys.exit(1)
+            if not nombres:
+                log("✅ Nada que procesar.")
+                return
 
-    log(f"⚙️ Paralelo={MAX_PARALLEL}, hilos/ffmpeg={THREADS_PER_FFMPEG}")
-    ok_count = 0
-    fail_count = 0
-
-    with ThreadPoolExecutor(max_workers=MAX_PARALLEL) as ex:
-        futs = {ex.submit(procesar_uno, n, ACCESS_TOKEN): n for n in nombres}
-        for fut in as_completed(futs):
-            nombre = futs[fut]
-            try:
-                _, ok, msg = fut.result()
-                if ok:
-                    ok_count += 1
-                else:
-                    fail_count += 1
-                    log(f"❌ FAIL: {nombre} → {msg}")
-            except Exception as e:
-                fail_count += 1
-                log(f"❌ EXC: {nombre} → {e}")
+        if PIPELINE:
+            PLAN = Planificador(len(nombres))
+        resultados = correr_lote(nombres, st, estado)
+        if PLAN:
+            PLAN.resumen()
+    ok_count = sum(1 for _, ok, _ in resultados if ok)
+    fail_count = len(resultados) - ok_count
 
     total = ok_count + fail_count
     log(f"\n🏁 Resumen: TOTAL={total}  OK={ok_count}  FALLIDOS={fail_count}")
+    if TELEMETRIA and TELEMETRIA.registros:
+        log(f"⏱️  Telemetría por clip → {TELEMETRIA.path}")
+        for linea in TELEMETRIA.resumen():
+            log(f"   • {linea}")
+    if not DRY_RUN:
+        log(f"📡 {st.resumen()}")
     if ok_count == 0 and fail_count > 0:
         sys.exit(1)
 
@@ -0,0 +1,542 @@
+#!/usr/bin/env python3
+"""
+storage.py — Almacenamiento intercambiable para los pipelines (ingesta, índice,
+métricas): Dropbox en producción o un árbol de carpetas local para correr todo
+de punta a punta sin red (benchmarks con cientos de clips sintéticos).
+
+Las rutas son siempre estilo Dropbox ("/Puntazo/Entrantes/x.mp4"); el backend
+local las resuelve bajo STORAGE_LOCAL_ROOT.
+
+Operaciones: listar (con cursor), cursor actual sin listar, cambios desde un cursor, esperar cambios
+(longpoll), descargar, subir, leer/subir bytes, borrar, link público y
+listado masivo de links ya compartidos. Borrados/copias/movidas en lote
+(borrar_lote/copiar_lote/mover_lote, y LoteStorage para encolarlos durante
+la corrida): una llamada por cada LOTE_MAX rutas y un solo sondeo de los
+jobs asíncronos.
+
+Env:
+  STORAGE_BACKEND     -> "dropbox" (default) | "local"
+  STORAGE_LOCAL_ROOT  -> raíz del árbol local (default _storage)
+"""
+import os
+import json
+import zlib
+import base64
+import shutil
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+from threading import Lock
+from typing import NamedTuple, Optional
+from urllib.parse import urlparse, parse_qsl, urlencode, urlunparse
+
+import dropbox
+
+from dropbox_client import get_client, api_usage_summary
+from dropbox_transfer import download_to_file, upload_file, dropbox_content_hash
+
+STORAGE_BACKEND    = os.environ.get("STORAGE_BACKEND", "dropbox").lower()
+STORAGE_LOCAL_ROOT = Path(os.environ.get("STORAGE_LOCAL_ROOT", "_storage")).resolve()
+
+# Límites de files/list_folder/longpoll de Dropbox (segundos)
+LONGPOLL_MIN, LONGPOLL_MAX = 30, 480
+# files/*_batch: máximo de entradas por llamada y pausa entre sondeos del job asíncrono
+LOTE_MAX     = 1000
+LOTE_POLL    = float(os.environ.get("STORAGE_LOTE_POLL_SECONDS", "1"))
+
+
+class StorageError(RuntimeError):
+    pass
+
+
+class NoEncontrado(StorageError, FileNotFoundError):
+    pass
+
+
+class CursorInvalido(StorageError):
+    pass
+
+
+class Archivo(NamedTuple):
+    name: str
+    ruta: str                      # ruta del backend (en Dropbox, path_lower)
+    size: int
+    server_modified: datetime      # UTC naive, como el SDK de Dropbox
+    client_modified: datetime
+    version: Optional[str] = None  # cambia si cambia el contenido (Dropbox: rev)
+    content_hash: Optional[str] = None  # content_hash de Dropbox (local: solo .json)
+
+
+class Borrado(NamedTuple):
+    name: str
+    ruta: str
+
+
+def to_direct_dropbox_url(url: str, mode: str = "raw") -> str:
+    u = urlparse(url)
+    q = dict(parse_qsl(u.query, keep_blank_values=True))
+    if mode == "dl":
+        q.pop("raw", None); q["dl"] = "1"
+    else:
+        q.pop("dl", None); q["raw"] = "1"
+    return urlunparse((u.scheme, u.netloc, u.path, u.params, urlencode(q), u.fragment))
+
+
+# ──────────────────────────────────────────
+# Dropbox
+# ──────────────────────────────────────────
+class DropboxStorage:
+    nombre = "dropbox"
+
+    def __init__(self, dbx=None):
+        self.dbx = dbx or get_client()
+
+    @staticmethod
+    def _archivo(md) -> Archivo:
+        return Archivo(md.name, md.path_lower, md.size, md.server_modified, md.client_modified, md.rev,
+                       md.content_hash)
+
+    def _convertir(self, entries) -> list:
+        out = []
+        for e in entries:
+            if isinstance(e, dropbox.files.FileMetadata):
+                out.append(self._archivo(e))
+            elif isinstance(e, dropbox.files.DeletedMetadata):
+                out.append(Borrado(e.name, e.path_lower))
+        return out
+
+    @staticmethod
+    def _error(e, ruta: str) -> StorageError:
+        # ListFolderError/DownloadError → .path; DeleteError → .path_lookup
+        err = getattr(e, "error", e)
+        for tipo in ("path", "path_lookup"):
+            if getattr(err, f"is_{tipo}", lambda: False)():
+                if getattr(err, f"get_{tipo}")().is_not_found():
+                    return NoEncontrado(ruta)
+        return StorageError(f"{ruta}: {e}")
+
+    def verificar(self) -> None:
+        self.dbx.check_and_refresh_access_token()
+
+    def listar(self, carpeta: str, recursivo: bool = False) -> tuple[list, str]:
+        """Archivos de `carpeta` (paginado completo) y el cursor para pedir cambios después."""
+        try:
+            res = self.dbx.files_list_folder(carpeta, recursive=recursivo)
+            entries = self._convertir(res.entries)
+            while res.has_more:
+                res = self.dbx.files_list_folder_continue(res.cursor)
+                entries += self._convertir(res.entries)
+        except dropbox.exceptions.ApiError as e:
+            raise self._error(e, carpeta) from e
+        return entries, res.cursor
+
+    def cursor_actual(self, carpeta: str, recursivo: bool = False) -> str:
+        """Cursor de `carpeta` al día de hoy, sin listar nada (para esperar/pedir solo cambios futuros)."""
+        try:
+            return self.dbx.files_list_folder_get_latest_cursor(carpeta, recursive=recursivo).cursor
+        except dropbox.exceptions.ApiError as e:
+            raise self._error(e, carpeta) from e
+
+    def cambios(self, cursor: str) -> tuple[list, str]:
+        """Archivos nuevos/modificados y Borrado desde `cursor`. CursorInvalido si hay reset."""
+        entries = []; res = None
+        try:
+            while res is None or res.has_more:
+                res = self.dbx.files_list_folder_continue(cursor)
+                entries += self._convertir(res.entries)
+                cursor = res.cursor
+        except dropbox.exceptions.ApiError as e:
+            if getattr(e.error, "is_reset", lambda: False)():
+                raise CursorInvalido("reset") from e
+            raise CursorInvalido(str(e)) from e
+        return entries, cursor
+
+    def esperar_cambios(self, cursor: str, segundos: float) -> bool:
+        """
+        Bloquea hasta que haya cambios desde `cursor` o pasen `segundos` (longpoll:
+        no consume cuota ni descarga nada). True = hay algo para pedir con cambios();
+        un cursor reseteado también devuelve True para que cambios() lo reporte.
+        """
+        if segundos < LONGPOLL_MIN:
+            time.sleep(max(0.0, segundos))
+            return True
+        try:
+            res = self.dbx.files_list_folder_longpoll(cursor, timeout=int(min(segundos, LONGPOLL_MAX)))
+        except dropbox.exceptions.ApiError:
+            return True
+        if res.backoff:
+            time.sleep(res.backoff)
+        return res.changes
+
+    def descargar(self, ruta: str, dest: Path) -> Archivo:
+        return self._archivo(download_to_file(self.dbx, ruta, dest))
+
+    def subir(self, local: Path, ruta: str) -> Archivo:
+        return self._archivo(upload_file(self.dbx, local, ruta))
+
+    def leer_bytes(self, ruta: str) -> bytes:
+        try:
+            _, resp = self.dbx.files_download(ruta)
+        except dropbox.exceptions.ApiError as e:
+            raise self._error(e, ruta) from e
+        return resp.content
+
+    def subir_bytes(self, data: bytes, ruta: str) -> None:
+        self.dbx.files_upload(data, ruta, mode=dropbox.files.WriteMode.overwrite)
+
+    def borrar(self, ruta: str) -> None:
+        try:
+            self.dbx.files_delete_v2(ruta)
+        except dropbox.exceptions.ApiError as e:
+            raise self._error(e, ruta) from e
+
+    def _lote(self, items: list, lanzar, chequear) -> dict:
+        """
+        Manda `items` en tandas de LOTE_MAX (una llamada por tanda) y después sondea
+        todos los jobs asíncronos juntos cada LOTE_POLL s hasta que terminen.
+        Devuelve {ruta (u origen): None si salió bien, o StorageError}.
+        """
+        clave = lambda it: it if isinstance(it, str) else it[0]
+        resultados = {}
+
+        def fallar(tanda, err):
+            for it in tanda:
+                resultados[clave(it)] = StorageError(f"{clave(it)}: {err}")
+
+        def aplicar(tanda, res):
+            for it, e in zip(tanda, res.entries):
+                resultados[clave(it)] = None if e.is_success() else self._error(e.get_failure(), clave(it))
+
+        jobs = []
+        for i in range(0, len(items), LOTE_MAX):
+            tanda = items[i:i + LOTE_MAX]
+            try:
+                lanzado = lanzar(tanda)
+            except dropbox.exceptions.ApiError as e:
+                fallar(tanda, e); continue
+            if lanzado.is_complete():
+                aplicar(tanda, lanzado.get_complete())
+            elif lanzado.is_async_job_id():
+                jobs.append((tanda, lanzado.get_async_job_id()))
+            else:
+                fallar(tanda, "respuesta inesperada del lote")
+        while jobs:
+            time.sleep(LOTE_POLL)
+            siguen = []
+            for tanda, job in jobs:
+                try:
+                    estado = chequear(job)
+                except dropbox.exceptions.ApiError as e:
+                    fallar(tanda, e); continue
+                if estado.is_in_progress():
+                    siguen.append((tanda, job))
+                elif estado.is_complete():
+                    aplicar(tanda, estado.get_complete())
+                else:
+                    fallar(tanda, estado.get_failed() if hasattr(estado, "get_failed") else "job fallido")
+            jobs = siguen
+        return resultados
+
+    def borrar_lote(self, rutas: list) -> dict:
+        return self._lote(list(rutas),
+                          lambda t: self.dbx.files_delete_batch([dropbox.files.DeleteArg(r) for r in t]),
+                          self.dbx.files_delete_batch_check)
+
+    def copiar_lote(self, pares: list) -> dict:
+        """pares = [(origen, destino)]; el resultado va por origen."""
+        return self._lote(list(pares),
+                          lambda t: self.dbx.files_copy_batch_v2([dropbox.files.RelocationPath(o, d) for o, d in t]),
+                          self.dbx.files_copy_batch_check_v2)
+
+    def mover_lote(self, pares: list) -> dict:
+        """pares = [(origen, destino)]; el resultado va por origen."""
+        return self._lote(list(pares),
+                          lambda t: self.dbx.files_move_batch_v2([dropbox.files.RelocationPath(o, d) for o, d in t]),
+                          self.dbx.files_move_batch_check_v2)
+
+    def link_publico(self, ruta: str) -> Optional[str]:
+        """Link público permanente (reutiliza el existente), en forma directa ?raw=1."""
+        try:
+            link = self.dbx.sharing_create_shared_link_with_settings(ruta)
+        except dropbox.exceptions.ApiError as e:
+            if (hasattr(e, "error")
+                    and hasattr(e.error, "is_shared_link_already_exists")
+                    and e.error.is_shared_link_already_exists()):
+                resp = self.dbx.sharing_list_shared_links(path=ruta, direct_only=True)
+                if resp.links:
+                    link = resp.links[0]
+                else:
+                    print(f"[WARN] No hay links existentes para {ruta}")
+                    return None
+            else:
+                print(f"[ERROR] al generar URL pública para {ruta}: {e}")
+                return None
+        return to_direct_dropbox_url(link.url, mode="raw")
+
+    def links_compartidos(self):
+        """
+        Todos los links compartidos de archivos de la cuenta (paginado, ~1 llamada
+        cada 200 links) → (ruta, url directa ?raw=1, rev).
+        """
+        res = None
+        while res is None or res.has_more:
+            res = (self.dbx.sharing_list_shared_links(cursor=res.cursor) if res
+                   else self.dbx.sharing_list_shared_links())
+            for link in res.links:
+                if isinstance(link, dropbox.sharing.FileLinkMetadata) and link.path_lower:
+                    yield link.path_lower, to_direct_dropbox_url(link.url, mode="raw"), link.rev
+
+    def resumen(self) -> str:
+        return api_usage_summary()
+
+
+# ──────────────────────────────────────────
+# Local (árbol de carpetas)
+# ──────────────────────────────────────────
+class LocalStorage:
+    """
+    Mismo contrato que DropboxStorage sobre `root`. El cursor lleva adentro la foto
+    (ruta → tamaño, mtime) del listado, comprimida, así que no hay estado aparte.
+    """
+    nombre = "local"
+
+    def __init__(self, root: Path = STORAGE_LOCAL_ROOT):
+        self.root = Path(root).resolve()
+        self.ops = Counter()
+        self.lock = Lock()
+
+    def _contar(self, op: str) -> None:
+        with self.lock:
+            self.ops[op] += 1
+
+    def _local(self, ruta: str) -> Path:
+        return self.root / ruta.lstrip("/")
+
+    def _archivo(self, p: Path) -> Archivo:
+        st = p.stat()
+        t = datetime.fromtimestamp(st.st_mtime, tz=timezone.utc).replace(tzinfo=None)
+        return Archivo(p.name, "/" + p.relative_to(self.root).as_posix(), st.st_size, t, t,
+                       f"{st.st_size}-{st.st_mtime_ns}",
+                       dropbox_content_hash(p) if p.suffix == ".json" else None)
+
+    def _foto(self, carpeta: str, recursivo: bool) -> dict:
+        base = self._local(carpeta)
+        if not base.is_dir():
+            raise NoEncontrado(carpeta)
+        it = base.rglob("*") if recursivo else base.iterdir()
+        foto = {}
+        for p in it:
+            if p.is_file() and not p.name.endswith(".tmp"):
+                st = p.stat()
+                foto["/" + p.relative_to(self.root).as_posix()] = [st.st_size, st.st_mtime_ns]
+        return foto
+
+    @staticmethod
+    def _cursor(carpeta: str, recursivo: bool, foto: dict) -> str:
+        raw = json.dumps({"c": carpeta, "r": recursivo, "f": foto}, separators=(",", ":"))
+        return "local:" + base64.urlsafe_b64encode(zlib.compress(raw.encode("utf-8"))).decode("ascii")
+
+    def verificar(self) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def listar(self, carpeta: str, recursivo: bool = False) -> tuple[list, str]:
+        self._contar("listar")
+        foto = self._foto(carpeta, recursivo)
+        return [self._archivo(self._local(r)) for r in sorted(foto)], self._cursor(carpeta, recursivo, foto)
+
+    def cursor_actual(self, carpeta: str, recursivo: bool = False) -> str:
+        self._contar("cursor_actual")
+        return self._cursor(carpeta, recursivo, self._foto(carpeta, recursivo))
+
+    @staticmethod
+    def _leer_cursor(cursor: str) -> tuple[str, bool, dict]:
+        try:
+            raw = json.loads(zlib.decompress(base64.urlsafe_b64decode(cursor[len("local:"):])))
+            return raw["c"], raw["r"], raw["f"]
+        except Exception as e:
+            raise CursorInvalido(f"cursor local ilegible: {e}") from e
+
+    def cambios(self, cursor: str) -> tuple[list, str]:
+        self._contar("cambios")
+        carpeta, recursivo, antes = self._leer_cursor(cursor)
+        try:
+            ahora = self._foto(carpeta, recursivo)
+        except NoEncontrado as e:
+            raise CursorInvalido(f"{carpeta} ya no existe") from e
+        entries = [Borrado(r.rsplit("/", 1)[-1], r) for r in sorted(antes) if r not in ahora]
+        entries += [self._archivo(self._local(r)) for r in sorted(ahora) if antes.get(r) != ahora[r]]
+        return entries, self._cursor(carpeta, recursivo, ahora)
+
+    def esperar_cambios(self, cursor: str, segundos: float, cada: float = 1.0) -> bool:
+        """Como el longpoll de Dropbox, comparando la foto del cursor cada `cada` segundos."""
+        self._contar("esperar_cambios")
+        try:
+            carpeta, recursivo, antes = self._leer_cursor(cursor)
+        except CursorInvalido:
+            return True
+        limite = time.monotonic() + max(0.0, segundos)
+        while True:
+            try:
+                if self._foto(carpeta, recursivo) != antes:
+                    return True
+            except NoEncontrado:
+                return True
+            resta = limite - time.monotonic()
+            if resta <= 0:
+                return False
+            time.sleep(min(cada, resta))
+
+    def descargar(self, ruta: str, dest: Path) -> Archivo:
+        self._contar("descargar")
+        src = self._local(ruta)
+        if not src.is_file():
+            raise NoEncontrado(ruta)
+        Path(dest).parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(src, dest)
+        return self._archivo(src)
+
+    def _escribir(self, ruta: str, escribir) -> Path:
+        dst = self._local(ruta)
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        tmp = dst.with_name(dst.name + ".tmp")
+        escribir(tmp)
+        os.replace(tmp, dst)
+        return dst
+
+    def subir(self, local: Path, ruta: str) -> Archivo:
+        self._contar("subir")
+        return self._archivo(self._escribir(ruta, lambda tmp: shutil.copyfile(local, tmp)))
+
+    def leer_bytes(self, ruta: str) -> bytes:
+        self._contar("leer_bytes")
+        try:
+            return self._local(ruta).read_bytes()
+        except FileNotFoundError as e:
+            raise NoEncontrado(ruta) from e
+
+    def subir_bytes(self, data: bytes, ruta: str) -> None:
+        self._contar("subir_bytes")
+        self._escribir(ruta, lambda tmp: tmp.write_bytes(data))
+
+    def borrar(self, ruta: str) -> None:
+        self._contar("borrar")
+        try:
+            self._local(ruta).unlink()
+        except FileNotFoundError as e:
+            raise NoEncontrado(ruta) from e
+
+    def _lote(self, op: str, items: list, fn) -> dict:
+        self._contar(op)
+        resultados = {}
+        for it in items:
+            ruta = it if isinstance(it, str) else it[0]
+            try:
+                fn(it)
+                resultados[ruta] = None
+            except FileNotFoundError:
+                resultados[ruta] = NoEncontrado(ruta)
+            except OSError as e:
+                resultados[ruta] = StorageError(f"{ruta}: {e}")
+        return resultados
+
+    def borrar_lote(self, rutas: list) -> dict:
+        return self._lote("borrar_lote", list(rutas), lambda r: self._local(r).unlink())
+
+    def copiar_lote(self, pares: list) -> dict:
+        return self._lote("copiar_lote", list(pares),
+                          lambda p: self._escribir(p[1], lambda tmp: shutil.copy2(self._local(p[0]), tmp)))
+
+    def mover_lote(self, pares: list) -> dict:
+        def mover(p):
+            if not self._local(p[0]).exists():
+                raise FileNotFoundError(p[0])
+            self._local(p[1]).parent.mkdir(parents=True, exist_ok=True)
+            os.replace(self._local(p[0]), self._local(p[1]))
+        return self._lote("mover_lote", list(pares), mover)
+
+    def link_publico(self, ruta: str) -> Optional[str]:
+        self._contar("link_publico")
+        p = self._local(ruta)
+        return p.as_uri() if p.exists() else None
+
+    def links_compartidos(self):
+        """En local el link es la ruta misma: no hay nada que precargar."""
+        return iter(())
+
+    def resumen(self) -> str:
+        with self.lock:
+            total = sum(self.ops.values())
+            top = ", ".join(f"{k}={v}" for k, v in self.ops.most_common())
+        return f"Storage local ({self.root}): {total} operaciones ({top or '—'})"
+
+
+class LoteStorage:
+    """
+    Cola de borrados/copias/movidas que se acumulan durante la corrida y salen
+    juntos con enviar() (borrar_lote/copiar_lote/mover_lote del backend). Seguro
+    entre hilos.
+    """
+
+    def __init__(self, st):
+        self.st = st
+        self.lock = Lock()
+        self.borrados, self.copias, self.movidas = [], [], []
+        self.stats = {"operaciones": 0, "fallidas": 0}
+
+    def borrar(self, ruta: str) -> None:
+        with self.lock:
+            if ruta not in self.borrados:
+                self.borrados.append(ruta)
+
+    def copiar(self, origen: str, destino: str) -> None:
+        with self.lock:
+            self.copias.append((origen, destino))
+
+    def mover(self, origen: str, destino: str) -> None:
+        with self.lock:
+            self.movidas.append((origen, destino))
+
+    def __len__(self) -> int:
+        with self.lock:
+            return len(self.borrados) + len(self.copias) + len(self.movidas)
+
+    def enviar(self) -> dict:
+        """Envía todo lo encolado. {ruta (u origen): None si salió bien, o StorageError}."""
+        with self.lock:
+            borrados, copias, movidas = self.borrados, self.copias, self.movidas
+            self.borrados, self.copias, self.movidas = [], [], []
+        resultados = {}
+        # copias antes que movidas y borrados: pueden leer lo que los otros sacan
+        if copias:
+            resultados.update(self.st.copiar_lote(copias))
+        if movidas:
+            resultados.update(self.st.mover_lote(movidas))
+        if borrados:
+            resultados.update(self.st.borrar_lote(borrados))
+        with self.lock:
+            self.stats["operaciones"] += len(resultados)
+            self.stats["fallidas"] += sum(1 for e in resultados.values() if e)
+        return resultados
+
+    def resumen(self) -> str:
+        s = self.stats
+        return f"Operaciones en lote: {s['operaciones']} ({s['fallidas']} fallidas)"
+
+
+_lock = Lock()
+_storage = None
+
+
+def get_storage():
+    """Backend del proceso según STORAGE_BACKEND (se crea en la primera llamada)."""
+    global _storage
+    with _lock:
+        if _storage is None:
+            if STORAGE_BACKEND == "local":
+                _storage = LocalStorage()
+            elif STORAGE_BACKEND == "dropbox":
+                _storage = DropboxStorage()
+            else:
+                raise ValueError(f"STORAGE_BACKEND desconocido: {STORAGE_BACKEND}")
+        return _storage
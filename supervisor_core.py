@@ -1,38 +1,35 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import os, sys, time, json, datetime, subprocess
+import os, sys, time, json, subprocess
 import requests
 import dropbox
 
-# === Entorno ===
-DROPBOX_APP_KEY       = os.environ["DROPBOX_APP_KEY"]
-DROPBOX_APP_SECRET    = os.environ["DROPBOX_APP_SECRET"]
-DROPBOX_REFRESH_TOKEN = os.environ["DROPBOX_REFRESH_TOKEN"]
+from dropbox_client import get_client, api_usage_summary
+from ingest_scheduler import lados_vivos
 
+# === Entorno ===
 PAT_GITHUB        = os.environ.get("PAT_GITHUB", "")
 REPO              = os.environ.get("GITHUB_REPOSITORY", "")
 PROC_WORKFLOW     = os.environ.get("PROC_WORKFLOW_NAME", "Procesar videos con FFmpeg")
 GESTION_SCRIPT    = os.environ.get("GESTION_SCRIPT", "gestion_indice_ci.py")
+# true: el índice corre como daemon (longpoll, reindexa solo lo que cambia, en segundos);
+# false: reindexar los lados activos en cada vuelta del supervisor
+GESTION_DAEMON    = os.environ.get("GESTION_DAEMON", "true").lower() == "true"
 
 HB_PATH           = os.environ.get("HB_PATH", "/PUNTAZO/ENTRANTES/heartbeats.txt")
-HB_TTL_SECONDS    = int(os.environ.get("HB_TTL_SECONDS", "300"))  # 5 min
 SLEEP_SECONDS     = int(os.environ.get("LOOP_SLEEP_SECONDS", "60"))
-MAX_RUNTIME       = int(os.environ.get("MAX_RUNTIME_SECONDS", "34800"))  # ~5h48m
+MAX_RUNTIME       = int(os.environ.get("MAX_RUNTIME_SECONDS", "19800"))  # 5h30m, por debajo del timeout del job
 
 def log(msg: str):
     print(msg, flush=True)
 
 def dbx_client():
-    return dropbox.Dropbox(
-        app_key=DROPBOX_APP_KEY,
-        app_secret=DROPBOX_APP_SECRET,
-        oauth2_refresh_token=DROPBOX_REFRESH_TOKEN
-    )
+    return get_client()
 
 def read_heartbeat(dbx: dropbox.Dropbox):
     """
-    Devuelve (active: bool, activos: list[(loc,can,lado)] ) según HB_TTL_SECONDS.
+    Devuelve (active: bool, activos: list[(loc,can,lado)] ) según HB_TTL_SECONDS (env, ver ingest_scheduler.py).
     Formato esperado en heartbeats.txt:
     {"v":1,"updated":"...Z","pis":{"piid":{"start":"...Z","last":"...Z","beats":N,"loc":"...","can":"...","lado":"..."}, ...}}
     """
@@ -48,22 +45,8 @@ def read_heartbeat(dbx: dropbox.Dropbox):
         log(f"⚠️  No se pudo leer/parsing heartbeat: {e}")
         return False, []
 
-    now = datetime.datetime.utcnow()
-    activos = []
-    pis = data.get("pis") or {}
-    for _, v in pis.items():
-        last = v.get("last")
-        loc  = v.get("loc"); can = v.get("can"); lado = v.get("lado")
-        if not last:
-            continue
-        try:
-            dt = datetime.datetime.fromisoformat(last.replace("Z",""))
-        except Exception:
-            continue
-        if (now - dt).total_seconds() <= HB_TTL_SECONDS:
-            if loc and can and lado:
-                activos.append((loc, can, lado))
-    return (len(activos) > 0), sorted(set(activos))
+    activos = sorted(lados_vivos(data))   # mismo criterio que la prioridad de la ingesta
+    return (len(activos) > 0), activos
 
 def procesar_running() -> bool:
     """
@@ -106,20 +89,47 @@ def trigger_procesar():
     except Exception as e:
         log(f"⚠️  Error disparando procesar: {e}")
 
-def run_gestion(loc: str, can: str, lado: str):
+def run_gestion(activos):
     """
-    Ejecuta tu script de gestión para un trio (loc,can,lado).
+    Ejecuta el script de gestión UNA vez para todos los trios (loc,can,lado) activos
+    (--lados: cliente compartido, lados en paralelo, una sola publicación).
     No falla el supervisor si este paso da error: registramos y seguimos.
     """
-    cmd = [sys.executable, GESTION_SCRIPT, "--loc", loc, "--can", can, "--lado", lado]
-    log(f"🗂️  Gestionando índice → {loc}/{can}/{lado}")
+    activos = sorted(set(activos))
+    if not activos:
+        return
+    cmd = [sys.executable, GESTION_SCRIPT, "--lados", *[f"{l}/{c}/{s}" for l, c, s in activos]]
+    log(f"🗂️  Gestionando índice → {len(activos)} lados: "
+        + ", ".join(f"{l}/{c}/{s}" for l, c, s in activos))
     try:
         subprocess.run(cmd, check=True)
     except subprocess.CalledProcessError as e:
-        log(f"⚠️  Gestion falló para {loc}/{can}/{lado}: {e}")
+        log(f"⚠️  Gestion falló para {len(activos)} lados: {e}")
+
+def asegurar_daemon_gestion(proc, activos):
+    """Lanza (o relanza si murió) gestion_indice_ci.py --daemon; arranca indexando los lados activos."""
+    if proc and proc.poll() is None:
+        return proc
+    if proc:
+        log(f"⚠️  Daemon de índice terminó (rc={proc.returncode}); relanzando")
+    cmd = [sys.executable, GESTION_SCRIPT, "--daemon"]
+    if activos:
+        cmd += ["--lados", *[f"{l}/{c}/{s}" for l, c, s in sorted(set(activos))]]
+    log("🗂️  Daemon de índice iniciado (longpoll sobre Locaciones)")
+    return subprocess.Popen(cmd)
+
+def detener_daemon_gestion(proc):
+    if not proc or proc.poll() is not None:
+        return
+    proc.terminate()   # SIGTERM: termina la vuelta en curso y sale
+    try:
+        proc.wait(timeout=600)
+    except subprocess.TimeoutExpired:
+        proc.kill()
 
 def main():
     start = time.time()
+    daemon = None
     dbx = dbx_client()
     log("🚀 Supervisor Puntazo iniciado")
 
@@ -143,13 +153,17 @@ def main():
         else:
             log("⏭️  Ya hay 'Procesar videos con FFmpeg' en progreso.")
 
-        # 3) Gestionar índice para locaciones activas (ligero, 1 vez por minuto)
-        for (loc, can, lado) in activos:
-            run_gestion(loc, can, lado)
+        # 3) Gestionar índice: daemon por cambios, o los lados activos 1 vez por minuto
+        if GESTION_DAEMON:
+            daemon = asegurar_daemon_gestion(daemon, activos)
+        else:
+            run_gestion(activos)
 
         # 4) Espera 60s y repite
         time.sleep(SLEEP_SECONDS)
 
+    detener_daemon_gestion(daemon)
+    log(f"📡 {api_usage_summary()}")
     log("✅ Supervisor Puntazo terminó.")
 
 if __name__ == "__main__":
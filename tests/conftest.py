@@ -0,0 +1,11 @@
+"""
+conftest.py — Los scripts viven en la raíz del repo (sin paquete): se agregan al
+path para que `pytest tests/` funcione desde cualquier directorio. Las pruebas de
+Python corren sin red ni credenciales (storage local, cola de dispatch a archivo).
+
+Correr:  python -m pytest -q tests/
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,70 @@
+"""Replanificación del daemon de ingesta: un delta de solo heartbeats no cuesta nada."""
+import json
+
+import pytest
+
+import ingest_scheduler
+import procesar_videos_ffmpeg as pvf
+from storage import LocalStorage
+
+ENTRANTES = "/Puntazo/Entrantes"
+ESTADO = "/Puntazo/Estado/entrantes.json"
+
+
+@pytest.fixture
+def st(tmp_path, monkeypatch):
+    st = LocalStorage(tmp_path / "storage")
+    (st.root / "Puntazo" / "Entrantes").mkdir(parents=True)
+    monkeypatch.setattr(pvf, "DAEMON", True)
+    monkeypatch.setattr(pvf, "PRIORIDAD", "deadline")
+    monkeypatch.setattr(pvf, "CARPETA_ENTRANTES", ENTRANTES)
+    monkeypatch.setattr(pvf, "ESTADO_ENTRANTES", ESTADO)
+    monkeypatch.setattr(pvf, "ESTADO_ENTRANTES_LOCAL", "")
+    monkeypatch.setattr(pvf, "ESTADO_SUBIDO", None)
+    monkeypatch.setattr(pvf, "BITACORA", None)
+    monkeypatch.setattr(pvf, "COLA", {})
+    monkeypatch.setattr(ingest_scheduler, "HB_PATH", f"{ENTRANTES}/heartbeats.txt")
+    return st
+
+
+def escribir(st: LocalStorage, nombre: str, datos: bytes) -> None:
+    (st.root / "Puntazo" / "Entrantes" / nombre).write_bytes(datos)
+
+
+def latido(st: LocalStorage, ts: str) -> None:
+    hb = {"pis": {"pi1": {"loc": "clubA", "can": "1", "lado": "izq", "last": ts}}}
+    escribir(st, "heartbeats.txt", json.dumps(hb).encode())
+
+
+def test_delta_de_solo_heartbeats_no_replanifica_ni_sube_estado(st):
+    escribir(st, "clubA_1_izq_20261018_100000.mp4", b"video")
+    latido(st, "2026-10-18T10:00:00Z")
+    estado = pvf.cargar_estado(st)
+    assert pvf.planificar(st, estado, 6) == ["clubA_1_izq_20261018_100000.mp4"]
+    assert st.ops["subir_bytes"] == 1
+
+    latido(st, "2026-10-18T10:00:30Z")
+    lecturas = st.ops["leer_bytes"]
+    assert pvf.planificar(st, estado, 6, solo_si_cambia=True) is None
+    assert st.ops["subir_bytes"] == 1            # el cursor nuevo no se sube todavía
+    assert st.ops["leer_bytes"] == lecturas      # ni se leen los latidos
+
+    escribir(st, "clubA_1_izq_20261018_100100.mp4", b"video 2")
+    plan = pvf.planificar(st, estado, 6, solo_si_cambia=True)
+    assert sorted(plan) == ["clubA_1_izq_20261018_100000.mp4", "clubA_1_izq_20261018_100100.mp4"]
+    assert st.ops["subir_bytes"] == 2
+
+
+def test_guardar_estado_sin_cambios_no_sube(st):
+    escribir(st, "clubA_1_izq_20261018_100000.mp4", b"video")
+    estado = pvf.cargar_estado(st)
+    pvf.planificar(st, estado, 6)
+    pvf.guardar_estado(st, estado)
+    pvf.guardar_estado(st, estado)
+    assert st.ops["subir_bytes"] == 1
+
+    # la corrida siguiente arranca con lo subido: tampoco lo resube
+    pvf.ESTADO_SUBIDO = None
+    estado = pvf.cargar_estado(st)
+    pvf.guardar_estado(st, estado)
+    assert st.ops["subir_bytes"] == 1
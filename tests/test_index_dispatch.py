@@ -0,0 +1,102 @@
+"""Pedidos de reindexación agrupados (index_dispatch.Despachador) en modo cola a archivo."""
+import json
+
+import pytest
+
+import index_dispatch
+from index_dispatch import CLIPS_MAX, Despachador
+
+
+class Reloj:
+    def __init__(self, t: float = 1000.0):
+        self.t = t
+
+    def __call__(self) -> float:
+        return self.t
+
+
+@pytest.fixture
+def reloj(monkeypatch):
+    r = Reloj()
+    monkeypatch.setattr(index_dispatch.time, "time", r)
+    return r
+
+
+def emitidos(cola) -> list:
+    if not cola.exists():
+        return []
+    return [json.loads(l)["client_payload"] for l in cola.read_text(encoding="utf-8").splitlines()]
+
+
+def test_ventana_deduplica_y_sale_con_vaciar(tmp_path, reloj):
+    cola = tmp_path / "cola.jsonl"
+    d = Despachador("org/repo", ventana=60, cola_path=str(cola))
+    assert d.pedir("clubA", "1", "izq", "a.mp4") == []
+    assert d.pedir("clubA", "1", "izq", "b.mp4") == []
+    assert d.pedir("clubB", "2", "der", "c.mp4") == []
+    assert emitidos(cola) == []
+
+    assert d.vaciar() == ["clubA/1/izq", "clubB/2/der"]
+    assert emitidos(cola) == [{"lados": ["clubA/1/izq", "clubB/2/der"], "pedidos": 3,
+                               "clips": ["a.mp4", "b.mp4", "c.mp4"]}]
+    assert d.vaciar() == []
+    assert d.resumen() == "Reindexación: 3 pedidos → 1 dispatches"
+
+
+def test_la_tanda_sale_con_el_primer_pedido_tras_la_ventana(tmp_path, reloj):
+    cola = tmp_path / "cola.jsonl"
+    d = Despachador("org/repo", ventana=60, cola_path=str(cola))
+    d.pedir("clubA", "1", "izq")
+    reloj.t += 59
+    assert d.pedir("clubA", "1", "der") == []
+    reloj.t += 1
+    assert d.pedir("clubA", "1", "izq") == ["clubA/1/der", "clubA/1/izq"]
+    assert len(emitidos(cola)) == 1
+
+    # la siguiente tanda abre su propia ventana
+    assert d.pedir("clubB", "2", "izq") == []
+    reloj.t += 60
+    assert d.vaciar() == ["clubB/2/izq"]
+    assert len(emitidos(cola)) == 2
+
+
+def test_ventana_cero_un_dispatch_por_pedido(tmp_path, reloj):
+    cola = tmp_path / "cola.jsonl"
+    d = Despachador("org/repo", ventana=0, cola_path=str(cola))
+    assert d.pedir("clubA", "1", "izq") == ["clubA/1/izq"]
+    assert d.pedir("clubA", "1", "izq") == ["clubA/1/izq"]
+    assert [p["pedidos"] for p in emitidos(cola)] == [1, 1]
+
+
+def test_pendientes_compartidos_entre_procesos(tmp_path, reloj):
+    cola, pendientes = tmp_path / "cola.jsonl", tmp_path / "pendientes.json"
+    for i, lado in enumerate(("izq", "der", "izq")):   # un CLI por clip
+        Despachador("org/repo", ventana=60, pendientes_path=str(pendientes),
+                    cola_path=str(cola)).pedir("clubA", "1", lado, f"{i}.mp4")
+    assert emitidos(cola) == []
+
+    flush = Despachador("org/repo", ventana=60, pendientes_path=str(pendientes), cola_path=str(cola))
+    assert flush.vaciar() == ["clubA/1/der", "clubA/1/izq"]
+    assert emitidos(cola) == [{"lados": ["clubA/1/der", "clubA/1/izq"], "pedidos": 3,
+                               "clips": ["0.mp4", "1.mp4", "2.mp4"]}]
+    assert json.loads(pendientes.read_text(encoding="utf-8"))["lados"] == {}
+
+
+def test_clips_del_payload_acotados(tmp_path, reloj):
+    cola = tmp_path / "cola.jsonl"
+    d = Despachador("org/repo", ventana=60, cola_path=str(cola))
+    for i in range(CLIPS_MAX + 10):
+        d.pedir("clubA", "1", "izq", f"{i}.mp4")
+    d.vaciar()
+    (payload,) = emitidos(cola)
+    assert payload["pedidos"] == CLIPS_MAX + 10 and len(payload["clips"]) == CLIPS_MAX
+
+
+def test_sin_token_los_lados_quedan_pendientes(tmp_path, reloj, monkeypatch):
+    monkeypatch.delenv("PAT_GITHUB", raising=False)
+    monkeypatch.delenv("GH_PAT", raising=False)
+    pendientes = tmp_path / "pendientes.json"
+    d = Despachador("org/repo", ventana=60, pendientes_path=str(pendientes), cola_path="")
+    d.pedir("clubA", "1", "izq")
+    assert d.vaciar() == []
+    assert json.loads(pendientes.read_text(encoding="utf-8"))["lados"] == {"clubA/1/izq": 1}
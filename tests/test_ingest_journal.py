@@ -0,0 +1,67 @@
+"""Bitácora del lote de ingesta (ingest_journal.Journal)."""
+import time
+
+from ingest_journal import Journal
+
+CLIP = "clubA_1_izq_20261018_100000.mp4"
+
+
+def artefacto(j: Journal, nombre: str, mb: float) -> None:
+    (j.workdir(nombre) / "output.mp4").write_bytes(b"\0" * int(mb * 1e6))
+
+
+def envejecer(j: Journal, nombre: str, horas: float) -> None:
+    j.data[nombre]["ts"] = time.time() - horas * 3600
+
+
+def test_etapas_avanzan_y_sobreviven_a_un_reinicio(tmp_path):
+    j = Journal(tmp_path)
+    assert not j.alcanzo(CLIP, "descargado")
+    j.marcar(CLIP, "descargado", input_sha="aaa")
+    j.marcar(CLIP, "renderizado", output_sha="bbb")
+    assert j.alcanzo(CLIP, "descargado") and j.alcanzo(CLIP, "renderizado")
+    assert not j.alcanzo(CLIP, "subido")
+
+    otra = Journal(tmp_path)   # la corrida siguiente lee lo mismo de disco
+    assert otra.get(CLIP)["etapa"] == "renderizado"
+    assert otra.get(CLIP)["input_sha"] == "aaa" and otra.get(CLIP)["output_sha"] == "bbb"
+    assert not (tmp_path / "journal.tmp").exists()
+
+
+def test_cerrar_quita_entrada_y_artefactos(tmp_path):
+    j = Journal(tmp_path)
+    j.marcar(CLIP, "subido")
+    artefacto(j, CLIP, 0.01)
+    j.cerrar(CLIP)
+    assert j.pendientes() == {}
+    assert not (tmp_path / "trabajo" / "clubA_1_izq_20261018_100000").exists()
+
+
+def test_purgar_viejos_respeta_el_ttl(tmp_path):
+    j = Journal(tmp_path, ttl_hours=1)
+    viejo, nuevo = "viejo_1_izq_20261016_100000.mp4", CLIP
+    for n in (viejo, nuevo):
+        j.marcar(n, "renderizado")
+        artefacto(j, n, 0.01)
+    envejecer(j, viejo, 2)
+    assert j.purgar_viejos() == [viejo]
+    assert j.pendientes() == {nuevo: "renderizado"}
+    assert not (tmp_path / "trabajo" / "viejo_1_izq_20261016_100000").exists()
+    assert (j.workdir(nuevo) / "output.mp4").exists()
+
+
+def test_podar_saca_huerfanos_y_acota_los_mb(tmp_path):
+    j = Journal(tmp_path)
+    a, b, c = (f"club{x}_1_izq_20261018_10000{i}.mp4" for i, x in enumerate("ABC"))
+    for i, n in enumerate((a, b, c)):
+        j.marcar(n, "renderizado")
+        envejecer(j, n, 3 - i)   # a es el más viejo
+        artefacto(j, n, 1)
+    j.data[b]["etapa"] = "subido"   # ya no depende de su output: se queda
+    (tmp_path / "trabajo" / "huerfano").mkdir()
+    (tmp_path / "trabajo" / "huerfano" / "input.mp4").write_bytes(b"\0" * 1_000_000)
+
+    antes, despues = j.podar(max_mb=2)
+    assert round(antes) == 4 and round(despues) == 2
+    assert not (tmp_path / "trabajo" / "huerfano").exists()
+    assert set(j.pendientes()) == {b, c}
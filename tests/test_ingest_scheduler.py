@@ -0,0 +1,74 @@
+"""Prioridad del backlog de Entrantes (ingest_scheduler.priorizar)."""
+import re
+from datetime import datetime, timedelta, timezone
+
+from ingest_scheduler import W_JUSTICIA, priorizar
+
+PATRON = re.compile(
+    r"^(?P<loc>[^_]+)_(?P<can>[^_]+)_(?P<lado>[^_]+)_(?P<date>\d{8})_(?P<time>\d{6})\.mp4$"
+)
+AHORA = datetime(2026, 10, 18, 12, 0, tzinfo=timezone.utc)
+
+
+def pendiente(minutos: float, size: int = 50_000_000) -> dict:
+    return {"size": size, "modificado": (AHORA - timedelta(minutes=minutos)).isoformat()}
+
+
+def nombres(prios) -> list:
+    return [p.nombre for p in prios]
+
+
+def test_lado_vivo_va_primero_aunque_sea_nuevo_y_pesado():
+    pend = {
+        "clubA_1_izq_20261018_100000.mp4": pendiente(120),
+        "clubB_1_der_20261018_115900.mp4": pendiente(1, size=900_000_000),
+    }
+    out = priorizar(pend, PATRON, {("clubB", "1", "der")}, limite=2, ahora=AHORA)
+    assert nombres(out) == ["clubB_1_der_20261018_115900.mp4", "clubA_1_izq_20261018_100000.mp4"]
+    assert out[0].vivo and not out[1].vivo
+
+
+def test_otro_lado_de_la_cancha_viva_sube_a_medias():
+    pend = {
+        "clubA_1_izq_20261018_114000.mp4": pendiente(20),   # cancha viva, otro lado
+        "clubB_2_izq_20261018_114000.mp4": pendiente(20),   # cancha sin latido
+    }
+    out = priorizar(pend, PATRON, {("clubA", "1", "der")}, limite=2, ahora=AHORA)
+    assert nombres(out)[0] == "clubA_1_izq_20261018_114000.mp4"
+    assert not out[0].vivo
+
+
+def test_justicia_un_club_con_mucho_backlog_no_acapara_el_lote():
+    pend = {f"clubA_1_izq_20261018_10{i:02d}00.mp4": pendiente(60) for i in range(5)}
+    pend["clubB_1_izq_20261018_113000.mp4"] = pendiente(30)
+    out = priorizar(pend, PATRON, set(), limite=2, ahora=AHORA)
+    assert [n.split("_", 1)[0] for n in nombres(out)] == ["clubA", "clubB"]
+
+
+def test_justicia_baja_el_puntaje_de_cada_clip_siguiente_del_club():
+    pend = {f"clubA_1_izq_20261018_10{i:02d}00.mp4": pendiente(60) for i in range(3)}
+    out = priorizar(pend, PATRON, set(), limite=3, ahora=AHORA)
+    assert [round(b.puntaje - a.puntaje, 2) for a, b in zip(out, out[1:])] == [-W_JUSTICIA, -W_JUSTICIA]
+
+
+def test_lados_vivos_no_pagan_justicia():
+    pend = {f"clubA_1_izq_20261018_11{i:02d}00.mp4": pendiente(5) for i in range(3)}
+    pend["clubB_1_izq_20261018_090000.mp4"] = pendiente(180)
+    out = priorizar(pend, PATRON, {("clubA", "1", "izq")}, limite=3, ahora=AHORA)
+    assert all(p.vivo for p in out)
+    assert "clubB_1_izq_20261018_090000.mp4" not in nombres(out)
+
+
+def test_sin_patron_van_al_final_y_solo_si_sobra_lugar():
+    pend = {
+        "clubA_1_izq_20261018_100000.mp4": pendiente(120),
+        "subida-rara.mp4": pendiente(600),
+        "clubA_1_izq_sin_hora.mp4": pendiente(600),
+    }
+    out = priorizar(pend, PATRON, set(), limite=5, ahora=AHORA)
+    assert nombres(out)[0] == "clubA_1_izq_20261018_100000.mp4"
+    assert set(nombres(out)[1:]) == {"subida-rara.mp4", "clubA_1_izq_sin_hora.mp4"}
+    assert all(p.puntaje == float("-inf") for p in out[1:])
+
+    out = priorizar(pend, PATRON, set(), limite=1, ahora=AHORA)
+    assert nombres(out) == ["clubA_1_izq_20261018_100000.mp4"]
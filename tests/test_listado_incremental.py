@@ -0,0 +1,82 @@
+"""Listado incremental de Entrantes (cursor de LocalStorage) y borrado en lote de originales."""
+import os
+
+import pytest
+
+import procesar_videos_ffmpeg as pvf
+from ingest_journal import Journal
+from storage import Archivo, Borrado, CursorInvalido, LocalStorage, LoteStorage
+
+ENTRANTES = "/Puntazo/Entrantes"
+
+
+@pytest.fixture
+def st(tmp_path):
+    st = LocalStorage(tmp_path / "storage")
+    (st.root / "Puntazo" / "Entrantes").mkdir(parents=True)
+    return st
+
+
+def clip(st: LocalStorage, nombre: str, datos: bytes = b"video") -> None:
+    (st.root / "Puntazo" / "Entrantes" / nombre).write_bytes(datos)
+
+
+def test_cursor_local_trae_solo_lo_que_cambio(st):
+    clip(st, "a.mp4"); clip(st, "b.mp4"); clip(st, "c.mp4")
+    entries, cursor = st.listar(ENTRANTES)
+    assert [e.name for e in entries] == ["a.mp4", "b.mp4", "c.mp4"]
+
+    entries, cursor = st.cambios(cursor)
+    assert entries == []
+
+    clip(st, "d.mp4")
+    os.remove(st.root / "Puntazo" / "Entrantes" / "b.mp4")
+    clip(st, "c.mp4", b"otro contenido")
+    entries, cursor = st.cambios(cursor)
+    assert [(type(e), e.name) for e in entries] == [(Borrado, "b.mp4"), (Archivo, "c.mp4"), (Archivo, "d.mp4")]
+    assert st.cambios(cursor)[0] == []
+
+
+def test_cursor_local_invalido(st):
+    with pytest.raises(CursorInvalido):
+        st.cambios("local:basura")
+    _, cursor = st.listar(ENTRANTES)
+    (st.root / "Puntazo" / "Entrantes").rename(st.root / "Puntazo" / "Viejos")
+    with pytest.raises(CursorInvalido):
+        st.cambios(cursor)
+
+
+def test_listar_entrantes_usa_el_cursor_y_se_recupera_si_es_invalido(st, monkeypatch):
+    monkeypatch.setattr(pvf, "CARPETA_ENTRANTES", ENTRANTES)
+    clip(st, "a.mp4"); clip(st, "notas.txt")
+    estado = {"v": 1, "cursor": None, "pendientes": {}}
+    files, cambios = pvf.listar_entrantes(st, estado)
+    assert files == ["a.mp4"] and cambios is None
+
+    clip(st, "b.mp4")
+    files, cambios = pvf.listar_entrantes(st, estado)
+    assert sorted(files) == ["a.mp4", "b.mp4"] and cambios == 1
+    assert st.ops["listar"] == 1 and st.ops["cambios"] == 1
+
+    estado["cursor"] = "local:basura"
+    files, cambios = pvf.listar_entrantes(st, estado)
+    assert sorted(files) == ["a.mp4", "b.mp4"] and cambios is None
+    assert st.ops["listar"] == 2
+
+
+def test_borrar_originales_con_falla_parcial(st, tmp_path, monkeypatch):
+    clip(st, "ok.mp4")
+    (st.root / "Puntazo" / "Entrantes" / "falla.mp4").mkdir()   # unlink falla con OSError
+    bitacora = Journal(tmp_path / "journal")
+    lote = LoteStorage(st)
+    for n in ("ok.mp4", "ya_no_esta.mp4", "falla.mp4"):
+        bitacora.marcar(n, "subido")
+        lote.borrar(f"{ENTRANTES}/{n}")
+    monkeypatch.setattr(pvf, "BITACORA", bitacora)
+    monkeypatch.setattr(pvf, "BORRADOS", lote)
+
+    assert pvf.borrar_originales() == {"falla.mp4"}
+    # el que falló queda "subido": la próxima vuelta solo reintenta el borrado
+    assert bitacora.pendientes() == {"falla.mp4": "subido"}
+    assert not (st.root / "Puntazo" / "Entrantes" / "ok.mp4").exists()
+    assert len(lote) == 0
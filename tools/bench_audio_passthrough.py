@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+bench_audio_passthrough.py — CPU de render con y sin copia del audio original
+(AUDIO_PASSTHROUGH de procesar_videos_ffmpeg.py) sobre clips reales.
+
+Por cada clip corre el mismo render que la ingesta (placa de logos del club +
+intro/outro cacheados si el club los tiene, o solo logos) dos veces: audio
+transcodificado a AAC y audio según decidir_audio(). Mide CPU de los ffmpeg
+hijos (user+sys, getrusage) y tiempo de pared, más la parte de audio aislada
+(-vn: AAC vs copia). Se queda con la mediana de --reps repeticiones. Los clips
+cuyo audio no admite copia se miden una sola vez y no entran en el total.
+
+Uso:
+    python tools/bench_audio_passthrough.py --loc Scorpion clips/*.mp4
+    python tools/bench_audio_passthrough.py --loc Scorpion --reps 5 --no-previews x.mp4
+"""
+import argparse
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import procesar_videos_ffmpeg as pv   # noqa: E402
+
+
+def cpu_hijos() -> float:
+    r = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return r.ru_utime + r.ru_stime
+
+
+def medir(fn) -> tuple[float, float]:
+    """(segundos de CPU de los subprocesos, segundos de pared) de fn()."""
+    c0, t0 = cpu_hijos(), time.monotonic()
+    fn()
+    return cpu_hijos() - c0, time.monotonic() - t0
+
+
+def logos_club(loc: str, entrada: Path) -> list:
+    club = pv.CLUBS_ROOT / loc
+    logos = [(pv.LOGO1_PATH, 300, "30:30")]
+    if (club / "logo.png").exists():
+        logos.append((club / "logo.png", 200, "W-w-15:15"))
+    if pv.OVERLAY_PLATE:
+        W, H = pv.ffprobe_dims(entrada)
+        logos = [(pv.placa_logos(loc, logos, W, H), None, "0:0")]
+    return logos
+
+
+def render(loc: str, entrada: Path, logos: list, workdir: Path, previews: bool, copia: bool) -> None:
+    club = pv.CLUBS_ROOT / loc
+    intro = club / "intro.mp4" if (club / "intro.mp4").exists() else None
+    outro = club / "outro.mp4" if (club / "outro.mp4").exists() else None
+    salida = workdir / "output.mp4"
+    if intro or outro:
+        pv.render_con_cache(loc, entrada, logos, intro, outro, salida, workdir, previews, copia)
+    else:
+        pv.render_logos(entrada, logos, salida, workdir if previews else None, copia)
+
+
+def solo_audio(entrada: Path, copia: bool) -> None:
+    codec = ["-c:a", "copy"] if copia else ["-c:a", "aac", "-ar", "48000", "-ac", "2"]
+    subprocess.run(["ffmpeg", "-hide_banner", "-loglevel", "error", "-y", "-i", str(entrada),
+                    "-vn", *codec, "-f", "mp4", "/dev/null"], check=True)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("clips", nargs="+", type=Path)
+    ap.add_argument("--loc", default="Scorpion", help="club (logos, intro/outro) del render")
+    ap.add_argument("--reps", type=int, default=3)
+    ap.add_argument("--no-previews", action="store_true")
+    args = ap.parse_args()
+
+    print(f"{'clip':<40} {'audio':<38} {'cpu AAC':>8} {'cpu copia':>9} {'ahorro':>7} "
+          f"{'pared AAC':>9} {'pared copia':>11} {'audio AAC':>9} {'audio copia':>11}")
+    totales = [0.0, 0.0]
+    for clip in args.clips:
+        entrada = clip.resolve()
+        club = pv.CLUBS_ROOT / args.loc
+        concat = (club / "intro.mp4").exists() or (club / "outro.mp4").exists()
+        copia, desc = pv.decidir_audio(entrada, concat=concat)
+        logos = logos_club(args.loc, entrada)
+        # una pasada en frío: normaliza intro/outro en la caché y no cuenta
+        with tempfile.TemporaryDirectory() as tmp:
+            render(args.loc, entrada, logos, Path(tmp), not args.no_previews, False)
+
+        med = {}
+        for etiqueta, c in (("aac", False), ("copia", True))[:2 if copia else 1]:
+            cpu, pared, cpu_a = [], [], []
+            for _ in range(args.reps):
+                with tempfile.TemporaryDirectory() as tmp:
+                    ct, wt = medir(lambda: render(args.loc, entrada, logos, Path(tmp), not args.no_previews, c))
+                cpu.append(ct); pared.append(wt)
+                cpu_a.append(medir(lambda: solo_audio(entrada, c))[0])
+            med[etiqueta] = (statistics.median(cpu), statistics.median(pared), statistics.median(cpu_a))
+        c_aac, w_aac, a_aac = med["aac"]
+        if not copia:
+            print(f"{clip.name[:40]:<40} {desc[:38]:<38} {c_aac:8.2f} {'-':>9} {'-':>7} "
+                  f"{w_aac:9.2f} {'-':>11} {a_aac:9.2f} {'-':>11}")
+            continue
+        c_cp, w_cp, a_cp = med["copia"]
+        totales[0] += c_aac; totales[1] += c_cp
+        ahorro = (c_aac - c_cp) / c_aac * 100 if c_aac else 0.0
+        print(f"{clip.name[:40]:<40} {desc[:38]:<38} {c_aac:8.2f} {c_cp:9.2f} {ahorro:6.1f}% "
+              f"{w_aac:9.2f} {w_cp:11.2f} {a_aac:9.2f} {a_cp:11.2f}")
+
+    if totales[0]:
+        print(f"\n[OK] CPU total: AAC={totales[0]:.2f}s copia={totales[1]:.2f}s "
+              f"→ ahorro {(totales[0] - totales[1]) / totales[0] * 100:.1f}% (clips con copia, {args.reps} reps)")
+
+
+if __name__ == "__main__":
+    main()
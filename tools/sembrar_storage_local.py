@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+sembrar_storage_local.py — Llena un árbol de storage local con clips sintéticos
+para correr la ingesta de punta a punta sin red (STORAGE_BACKEND=local).
+
+Genera UN clip base con ffmpeg (testsrc + tono) y lo copia N veces a
+<root>/Puntazo/Entrantes con nombres válidos loc_can_lado_YYYYMMDD_HHMMSS.mp4,
+repartidos entre los clubs/canchas/lados pedidos y con timestamps separados 1 min.
+
+Uso:
+    python tools/sembrar_storage_local.py --root _storage -n 300 --dur 20
+    STORAGE_BACKEND=local STORAGE_LOCAL_ROOT=_storage BATCH_LIMIT=300 \\
+        python procesar_videos_ffmpeg.py
+    STORAGE_BACKEND=local STORAGE_LOCAL_ROOT=_storage \\
+        python gestion_indice_ci.py --loc Scorpion --can Cancha1 --lado LadoA
+"""
+import argparse
+import shutil
+import subprocess
+import tempfile
+from datetime import datetime, timedelta
+from itertools import cycle
+from pathlib import Path
+
+
+def clip_base(dest: Path, dur: int, size: str, fps: int) -> None:
+    subprocess.run([
+        "ffmpeg", "-hide_banner", "-loglevel", "error", "-y",
+        "-f", "lavfi", "-i", f"testsrc2=size={size}:rate={fps}:duration={dur}",
+        "-f", "lavfi", "-i", f"sine=frequency=440:sample_rate=48000:duration={dur}",
+        "-c:v", "libx264", "-preset", "veryfast", "-pix_fmt", "yuv420p",
+        "-c:a", "aac", "-shortest", str(dest),
+    ], check=True)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--root", default="_storage")
+    ap.add_argument("-n", type=int, default=100, help="cantidad de clips")
+    ap.add_argument("--dur", type=int, default=20, help="segundos por clip")
+    ap.add_argument("--size", default="1920x1080")
+    ap.add_argument("--fps", type=int, default=30)
+    ap.add_argument("--lados", nargs="+", default=["Scorpion/Cancha1/LadoA", "Scorpion/Cancha1/LadoB"],
+                    help="loc/can/lado de destino (se reparten en ronda)")
+    args = ap.parse_args()
+
+    entrantes = Path(args.root).resolve() / "Puntazo" / "Entrantes"
+    entrantes.mkdir(parents=True, exist_ok=True)
+    with tempfile.TemporaryDirectory() as tmp:
+        base = Path(tmp) / "base.mp4"
+        clip_base(base, args.dur, args.size, args.fps)
+        t = datetime.now() - timedelta(minutes=args.n)
+        for i, lado in zip(range(args.n), cycle(args.lados)):
+            loc, can, ld = lado.split("/")
+            nombre = f"{loc}_{can}_{ld}_{(t + timedelta(minutes=i)).strftime('%Y%m%d_%H%M%S')}.mp4"
+            shutil.copyfile(base, entrantes / nombre)
+    print(f"[OK] {args.n} clips sintéticos en {entrantes}")
+
+
+if __name__ == "__main__":
+    main()